@@ -0,0 +1,144 @@
+"""Microbenchmark of SPOKE property -> TRAPI Attribute conversion over
+a synthetic result set
+
+Compares the per-property lookup chain that `_make_result_attribute`
+used to run (list membership checks, two map lookups, a special-handler
+lookup and a logged warning per unmapped property) against the
+precompiled dispatch table in `result_handling.make_result_attribute`.
+
+Usage (from app/):
+    python -m benchmarks.attribute_mapping [--n-edges 10000]
+"""
+import argparse
+import logging
+import random
+import time
+
+from improving_agent.models import Attribute
+from improving_agent.src.biolink.spoke_biolink_constants import (
+    KNOWN_UNMAPPED_ATTRS,
+    MAX_PHASE_FDA_APPROVAL_MAP,
+    PHASE_BL_CT_PHASE_ENUM_MAP,
+    SPOKE_BIOLINK_EDGE_ATTRIBUTE_MAPPINGS,
+)
+from improving_agent.src.provenance import SPOKE_PUBLICATION_FIELDS, make_publications_attribute
+from improving_agent.src.result_handling import (
+    ATTRIBUTE_MAPS,
+    SPECIAL_ATTRIBUTE_HANDLERS,
+    SPOKE_GRAPH_TYPE_EDGE,
+    UNMAPPED_ATTRIBUTE_WARNINGS,
+    make_result_attribute,
+)
+
+_legacy_logger = logging.getLogger('benchmarks.attribute_mapping.legacy')
+
+SPECIAL_VALUES = {
+    'max_phase': list(PHASE_BL_CT_PHASE_ENUM_MAP),
+    'phase': list(PHASE_BL_CT_PHASE_ENUM_MAP),
+}
+UNMAPPED_PROPERTIES = ['unmapped_score', 'unmapped_note']
+
+
+def legacy_make_result_attribute(property_type, property_value, edge_or_node, spoke_object_type):
+    """The attribute conversion as implemented before the dispatch table"""
+    if edge_or_node not in ATTRIBUTE_MAPS:
+        raise ValueError(f'Got {edge_or_node=} but it must be one of "edge" or "node"')
+    if property_type in KNOWN_UNMAPPED_ATTRS:
+        return
+    if property_type in SPOKE_PUBLICATION_FIELDS:
+        return make_publications_attribute(property_type, property_value)
+    object_properties = ATTRIBUTE_MAPS[edge_or_node].get(spoke_object_type)
+    if not object_properties:
+        _legacy_logger.warning(f'Could not find any properties in the attribute map for {spoke_object_type=}')
+        return
+    attribute_mapping = object_properties.get(property_type)
+    if not attribute_mapping:
+        _legacy_logger.warning(f'Could not find an attribute mapping for {spoke_object_type=} and {property_type=}')
+        return
+    attribute_type_id = attribute_mapping.biolink_type
+    attr_transformer = SPECIAL_ATTRIBUTE_HANDLERS.get(attribute_type_id)
+    if attr_transformer:
+        property_value = attr_transformer(property_value)
+    attribute = Attribute(
+        attribute_type_id=attribute_type_id,
+        original_attribute_name=property_type,
+        value=property_value,
+    )
+    if attribute_mapping.attribute_source:
+        attribute.attribute_source = attribute_mapping.attribute_source
+    if attribute_mapping.attributes:
+        attribute.attributes = attribute_mapping.attributes
+    return attribute
+
+
+def _get_property_value(attribute_mapping, property_type, rng):
+    if attribute_mapping is not None:
+        if attribute_mapping.biolink_type in SPECIAL_ATTRIBUTE_HANDLERS:
+            if property_type in SPECIAL_VALUES:
+                return rng.choice(SPECIAL_VALUES[property_type])
+            return rng.choice(list(MAX_PHASE_FDA_APPROVAL_MAP))
+    return rng.random()
+
+
+def make_synthetic_edges(n_edges, seed=0):
+    """Returns a list of (edge type, {property: value}) pairs drawn from
+    the SPOKE edge attribute mappings, with a few unmapped properties"""
+    rng = random.Random(seed)
+    edge_types = [
+        edge_type for edge_type, properties in SPOKE_BIOLINK_EDGE_ATTRIBUTE_MAPPINGS.items()
+        if properties and not any(p in SPOKE_PUBLICATION_FIELDS for p in properties)
+    ]
+    edges = []
+    for _ in range(n_edges):
+        edge_type = rng.choice(edge_types)
+        mappings = SPOKE_BIOLINK_EDGE_ATTRIBUTE_MAPPINGS[edge_type]
+        properties = {
+            property_type: _get_property_value(mapping, property_type, rng)
+            for property_type, mapping in mappings.items()
+        }
+        properties[rng.choice(UNMAPPED_PROPERTIES)] = rng.random()
+        edges.append((edge_type, properties))
+    return edges
+
+
+def convert(edges, attribute_func):
+    start = time.perf_counter()
+    n_attributes = 0
+    for edge_type, properties in edges:
+        for property_type, property_value in properties.items():
+            if attribute_func(property_type, property_value, SPOKE_GRAPH_TYPE_EDGE, edge_type):
+                n_attributes += 1
+    return time.perf_counter() - start, n_attributes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n-edges', type=int, default=10_000)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    # keep warnings out of the timings' output, but not out of the timings
+    _legacy_logger.addHandler(logging.NullHandler())
+    _legacy_logger.propagate = False
+    UNMAPPED_ATTRIBUTE_WARNINGS.logger = _legacy_logger
+
+    edges = make_synthetic_edges(args.n_edges)
+    n_properties = sum(len(properties) for _, properties in edges)
+    print(f'{args.n_edges} edges, {n_properties} properties')
+    for label, attribute_func in (
+        ('legacy', legacy_make_result_attribute),
+        ('dispatch table', make_result_attribute),
+    ):
+        timings = []
+        for _ in range(args.repeats):
+            elapsed, n_attributes = convert(edges, attribute_func)
+            timings.append(elapsed)
+        best = min(timings)
+        print(
+            f'{label:>15}: {n_attributes} attributes, best of {args.repeats}: '
+            f'{best * 1000:.1f} ms ({best / n_properties * 1e9:.0f} ns/property)'
+        )
+
+
+if __name__ == '__main__':
+    main()
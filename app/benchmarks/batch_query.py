@@ -0,0 +1,189 @@
+"""Compares the throughput of a batch of one-hop queries submitted one
+by one to /query and together to /api/batch-query
+
+Against a running service, `--url` POSTs `--queries` one-hop Disease ->
+Gene queries (each for a different disease, bypassing the result cache)
+to /query sequentially, then all of them to /api/batch-query.
+
+Without a running service, `--demo` runs the same queries in process,
+with core.process_query and batch_query.process_batch_query, against
+stand-ins for neo4j, the SRI node normalizer, and the psev-service that
+wait a simulated round trip per request (and neo4j, per query of a
+transaction), to show the effect of sharing normalization and database
+round trips; the requests made to each are counted.
+
+Usage (from app/):
+    python -m benchmarks.batch_query --url http://localhost:3031 [--queries 500]
+    python -m benchmarks.batch_query --demo [--queries 500 --service-latency 0.05 --db-latency 0.02]
+"""
+import argparse
+import logging
+import time
+from collections import Counter
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from improving_agent.src.basic_query import BATCH_QUERY_INDEX
+
+N_GENES_PER_DISEASE = 5
+
+
+def make_queries(n_queries):
+    return [
+        {
+            'message': {
+                'query_graph': {
+                    'nodes': {
+                        'n0': {'ids': [f'DOID:{i + 1}'], 'categories': ['biolink:Disease']},
+                        'n1': {'categories': ['biolink:Gene']},
+                    },
+                    'edges': {'e0': {'subject': 'n0', 'object': 'n1'}},
+                }
+            },
+            'max_results': 100,
+            'bypass_cache': True,
+        }
+        for i in range(n_queries)
+    ]
+
+
+def run_against_service(url, queries, timeout=600):
+    session = requests.Session()
+    start = time.perf_counter()
+    for query in queries:
+        session.post(f'{url}/api/v1.5/query', json=query, timeout=timeout).raise_for_status()
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    session.post(f'{url}/api/batch-query', json={'queries': queries}, timeout=timeout).raise_for_status()
+    batched = time.perf_counter() - start
+    return sequential, batched
+
+
+class _Record:
+    def __init__(self, batch_index, values):
+        self._batch_index = batch_index
+        self._values = values
+
+    def __getitem__(self, key):
+        assert key == BATCH_QUERY_INDEX
+        return self._batch_index
+
+    def values(self, *names):
+        return self._values
+
+
+class DemoSession:
+    """Stands in for a neo4j session, answering each query with
+    N_GENES_PER_DISEASE genes after `latency` seconds per transaction
+    and `query_time` seconds per query of the transaction"""
+    def __init__(self, latency, query_time, requests_made):
+        from neo4j.graph import Graph
+        self.latency = latency
+        self.query_time = query_time
+        self.requests_made = requests_made
+        self.hydrator = Graph.Hydrator(Graph())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def _make_records(self, row, batch_index=None):
+        disease_id = row['a_identifiers'][0]
+        disease_number = int(disease_id.split(':')[1])
+        disease = self.hydrator.hydrate_node(disease_number, ['Disease'], {'identifier': disease_id})
+        records = []
+        for i in range(N_GENES_PER_DISEASE):
+            gene_id = 1_000_000 + disease_number * N_GENES_PER_DISEASE + i
+            gene = self.hydrator.hydrate_node(gene_id, ['Gene'], {'identifier': gene_id})
+            rel = self.hydrator.hydrate_relationship(
+                gene_id, disease_number, gene_id, 'ASSOCIATES_DaG', {'sources': ['DISEASES']}
+            )
+            records.append(_Record(batch_index, (disease, rel, gene)))
+        return records
+
+    def read_transaction(self, fn, query_string, parameters, *args):
+        self.requests_made['neo4j'] += 1
+        rows = parameters.get('batch', [parameters])
+        time.sleep(self.latency + self.query_time * len(rows))
+        records = []
+        for row in rows:
+            records.extend(self._make_records(row, row.get(BATCH_QUERY_INDEX)))
+        tx = MagicMock()
+        tx.run.return_value = iter(records)
+        return fn(tx, query_string, parameters, *args)
+
+
+def run_demo(queries, service_latency, db_latency, db_query_time):
+    import improving_agent.__main__  # noqa: F401 - core imports get_db from it
+    from improving_agent.src import batch_query, core
+    from improving_agent.src.caching import LruTtlCache
+    from improving_agent.src.normalization import node_normalization
+    from improving_agent.src.normalization.sri_node_normalizer import SriNodeNormalizer
+    from improving_agent.src.psev import PSEV_SCORE_CACHE, PsevClient
+    logging.disable(logging.WARNING)  # queries log each request
+
+    def run(label, process):
+        requests_made = Counter()
+
+        def sri_post(url, json):
+            requests_made['sri'] += 1
+            time.sleep(service_latency)
+            return MagicMock(status_code=404)
+
+        def psev_call(self, url, params, req_body, headers={}):
+            requests_made['psev'] += 1
+            time.sleep(service_latency)
+            concept = url.rsplit('/', 1)[1]
+            return {concept: {i: 0.5 for i in req_body['node_identifiers']}, 'more_available': False}
+
+        PSEV_SCORE_CACHE.clear()
+        normalizer = SriNodeNormalizer(LruTtlCache(), session=MagicMock(post=sri_post))
+        session = DemoSession(db_latency, db_query_time, requests_made)
+        with patch.object(core, 'get_db', return_value=session), \
+                patch.object(batch_query, 'get_db', return_value=session), \
+                patch.object(node_normalization, 'SRI_NODE_NORMALIZER', normalizer), \
+                patch.object(PsevClient, '_call', psev_call):
+            start = time.perf_counter()
+            responses = process()
+            elapsed = time.perf_counter() - start
+        n_ok = sum(1 for response in responses if not isinstance(response, tuple))
+        print(
+            f'{label:<12}{elapsed:>8.2f} s{len(queries) / elapsed:>9.1f} queries/s   ok {n_ok:>4}   '
+            f'requests: neo4j {requests_made["neo4j"]:>4}, SRI {requests_made["sri"]:>4}, '
+            f'PSEV {requests_made["psev"]:>4}'
+        )
+        return elapsed
+
+    sequential = run('sequential', lambda: [core.process_query(query) for query in make_queries(len(queries))])
+    batched = run('batched', lambda: batch_query.process_batch_query(make_queries(len(queries))))
+    return sequential, batched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--demo', action='store_true')
+    parser.add_argument('--service-latency', type=float, default=0.05)
+    parser.add_argument('--db-latency', type=float, default=0.02)
+    parser.add_argument('--db-query-time', type=float, default=0.002)
+    args = parser.parse_args()
+
+    queries = make_queries(args.queries)
+    if args.demo:
+        sequential, batched = run_demo(queries, args.service_latency, args.db_latency, args.db_query_time)
+    elif args.url:
+        sequential, batched = run_against_service(args.url, queries)
+        for label, elapsed in (('sequential', sequential), ('batched', batched)):
+            print(f'{label:<12}{elapsed:>8.2f} s{len(queries) / elapsed:>9.1f} queries/s')
+    else:
+        parser.error('one of --url or --demo is required')
+    print(f'batched throughput is {sequential / batched:.1f}x sequential')
+
+
+if __name__ == '__main__':
+    main()
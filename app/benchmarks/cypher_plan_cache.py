@@ -0,0 +1,106 @@
+"""Compares inlined and parameterized BasicQuery Cypher over a recorded
+query corpus
+
+Without a neo4j connection, this reports the number of distinct Cypher
+strings generated for the corpus (an upper bound on the number of plans
+neo4j must compile) and the time spent building them. If a neo4j URI is
+given, each distinct string is also planned with EXPLAIN so that the
+server-side compile time can be compared.
+
+Usage (from app/):
+    python -m benchmarks.cypher_plan_cache [--neo4j-uri bolt://host:7687 --user u --password p]
+"""
+import argparse
+import json
+import os
+import time
+
+from improving_agent.models import QEdge, QNode
+from improving_agent.src.basic_query import BasicQuery
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'data', 'query_corpus.json')
+
+
+def load_corpus(path=CORPUS_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def make_basic_query(entry, parameterize_cypher):
+    qnodes = {}
+    for qnode_id, node in entry['nodes'].items():
+        qnode = QNode(categories=node['categories'], constraints=[])
+        setattr(qnode, 'qnode_id', qnode_id)
+        setattr(qnode, 'spoke_labels', node['spoke_labels'])
+        setattr(qnode, 'spoke_identifiers', {_id: _id.strip("'") for _id in node['spoke_identifiers']})
+        qnodes[qnode_id] = qnode
+
+    qedges = {}
+    for qedge_id, edge in entry['edges'].items():
+        qedge = QEdge(subject=edge['subject'], object=edge['object'], attribute_constraints=[])
+        setattr(qedge, 'qedge_id', qedge_id)
+        setattr(qedge, 'spoke_edge_types', set(edge['spoke_edge_types']))
+        qedges[qedge_id] = qedge
+
+    query = BasicQuery(
+        qnodes, qedges, n_results=entry['max_results'], parameterize_cypher=parameterize_cypher
+    )
+    query.make_query_order()
+    return query
+
+
+def compile_corpus(corpus, parameterize_cypher, repeats):
+    compiled = []
+    start = time.perf_counter()
+    for _ in range(repeats):
+        compiled = []
+        for entry in corpus:
+            query = make_basic_query(entry, parameterize_cypher)
+            compiled.append((query.make_cypher_query_string(), query.query_parameters))
+    elapsed = (time.perf_counter() - start) / repeats
+    return compiled, elapsed
+
+
+def explain_corpus(driver, compiled):
+    """Returns total wall time to EXPLAIN each compiled query, in order,
+    so that repeated query strings hit the server's plan cache"""
+    start = time.perf_counter()
+    with driver.session() as session:
+        for query_string, parameters in compiled:
+            session.run(f'EXPLAIN {query_string}', parameters).consume()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--corpus', default=CORPUS_PATH)
+    parser.add_argument('--repeats', type=int, default=200)
+    parser.add_argument('--neo4j-uri')
+    parser.add_argument('--user', default='neo4j')
+    parser.add_argument('--password', default='')
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    driver = None
+    if args.neo4j_uri:
+        import neo4j
+        driver = neo4j.GraphDatabase.driver(args.neo4j_uri, auth=(args.user, args.password))
+
+    print(f'{len(corpus)} queries in corpus')
+    for label, parameterize_cypher in (('inline', False), ('parameterized', True)):
+        compiled, elapsed = compile_corpus(corpus, parameterize_cypher, args.repeats)
+        n_distinct = len({query_string for query_string, _ in compiled})
+        line = (
+            f'{label:>14}: {n_distinct} distinct cypher strings, '
+            f'{elapsed * 1000:.3f} ms to build corpus'
+        )
+        if driver is not None:
+            line += f', {explain_corpus(driver, compiled) * 1000:.1f} ms to EXPLAIN corpus'
+        print(line)
+
+    if driver is not None:
+        driver.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""Microbenchmark of qedge predicate and qualifier resolution over every
+predicate mapped to SPOKE
+
+Compares the per-qedge resolution that `_get_compatible_spoke_edges`
+used to run (descendant lookup, then re-parsing the qualifier
+constraints for each candidate SPOKE edge type) against the
+precomputed indices and memoized resolution in `edge_normalization`.
+Each predicate is resolved without qualifiers, with each of the
+qualifier sets used by SPOKE edge types, and with object aspects that
+are only part of a SPOKE value, e.g. activity for activity_or_abundance,
+as a qedge of a query would be.
+
+Usage (from app/):
+    python -m benchmarks.edge_normalization [--repeats 200]
+"""
+import argparse
+import time
+
+from improving_agent.models import QEdge
+from improving_agent.src.biolink.biolink import EDGE, get_supported_biolink_descendants
+from improving_agent.src.biolink.spoke_biolink_constants import (
+    BIOLINK_SPOKE_EDGE_MAPPINGS,
+    BL_QUALIFIER_TYPE_OBJECT_ASPECT,
+    BL_QUALIFIER_TYPE_OBJECT_DIRECTION,
+    BL_QUALIFIER_TYPE_QUALIFIED_PREDICATE,
+    QUALIFIERS,
+    SPOKE_BIOLINK_EDGE_MAPPINGS,
+)
+from improving_agent.src.normalization.edge_normalization import (
+    PREDICATE_DESCENDANTS,
+    _get_compatible_spoke_edges,
+)
+
+
+def _legacy_are_qualifiers_compatible(qedge, spoke_edge):
+    query_qualifiers = qedge.qualifier_constraints
+    if not query_qualifiers:
+        return True
+
+    spoke_edge_qualifiers = SPOKE_BIOLINK_EDGE_MAPPINGS[spoke_edge].get(QUALIFIERS)
+    if not spoke_edge_qualifiers:
+        return False
+
+    for qualifier_set in query_qualifiers:
+        query_data = {'aspects': [], 'directions': [], 'qualified_predicates': []}
+        for qualifier in qualifier_set['qualifier_set']:
+            qualifier_type = qualifier['qualifier_type_id']
+            if qualifier_type == BL_QUALIFIER_TYPE_OBJECT_ASPECT:
+                query_data['aspects'].append(qualifier['qualifier_value'])
+            elif qualifier_type == BL_QUALIFIER_TYPE_OBJECT_DIRECTION:
+                query_data['directions'].append(qualifier['qualifier_value'])
+            elif qualifier_type == BL_QUALIFIER_TYPE_QUALIFIED_PREDICATE:
+                query_data['qualified_predicates'].append(qualifier['qualifier_value'])
+            else:
+                raise ValueError(qualifier_type)
+
+    if not all(
+        aspect in spoke_edge_qualifiers.get(BL_QUALIFIER_TYPE_OBJECT_ASPECT, '')
+        for aspect in query_data['aspects']
+    ):
+        return False
+    if not all(
+        direction in spoke_edge_qualifiers.get(BL_QUALIFIER_TYPE_OBJECT_DIRECTION, '')
+        for direction in query_data['directions']
+    ):
+        return False
+    if not all(
+        predicate in spoke_edge_qualifiers.get(BL_QUALIFIER_TYPE_QUALIFIED_PREDICATE, '')
+        for predicate in query_data['qualified_predicates']
+    ):
+        return False
+    return True
+
+
+def legacy_get_compatible_spoke_edges(qedge):
+    compatible_edges = []
+    for predicate in get_supported_biolink_descendants(qedge.predicates, EDGE):
+        for spoke_edge_type in BIOLINK_SPOKE_EDGE_MAPPINGS[predicate]:
+            if _legacy_are_qualifiers_compatible(qedge, spoke_edge_type):
+                compatible_edges.append(spoke_edge_type)
+    return compatible_edges
+
+
+def make_qedges():
+    """Returns a qedge for each mapped predicate, alone, with each
+    qualifier set found on SPOKE edge types, and with each partial
+    object aspect"""
+    qualifier_sets = {
+        tuple(sorted(
+            (qualifier_type, value)
+            for qualifier_type, value in mapping[QUALIFIERS].items()
+            if qualifier_type in (
+                BL_QUALIFIER_TYPE_OBJECT_ASPECT,
+                BL_QUALIFIER_TYPE_OBJECT_DIRECTION,
+                BL_QUALIFIER_TYPE_QUALIFIED_PREDICATE,
+            )
+        ))
+        for mapping in SPOKE_BIOLINK_EDGE_MAPPINGS.values()
+        if mapping.get(QUALIFIERS)
+    }
+    qualifier_sets |= {
+        ((BL_QUALIFIER_TYPE_OBJECT_ASPECT, aspect),) for aspect in ('activity', 'abundance', 'express')
+    }
+    qualifier_constraints = [None] + [
+        [{'qualifier_set': [
+            {'qualifier_type_id': qualifier_type, 'qualifier_value': value}
+            for qualifier_type, value in qualifier_set
+        ]}]
+        for qualifier_set in qualifier_sets
+    ]
+    return [
+        QEdge(subject='n0', object='n1', predicates=[predicate], qualifier_constraints=qualifiers)
+        for predicate in PREDICATE_DESCENDANTS
+        for qualifiers in qualifier_constraints
+    ]
+
+
+def time_resolver(resolve, qedges, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for qedge in qedges:
+            resolve(qedge)
+    return (time.perf_counter() - start) / (repeats * len(qedges))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeats', type=int, default=200)
+    args = parser.parse_args()
+
+    qedges = make_qedges()
+    resolvable_qedges = []
+    for qedge in qedges:
+        # unmatched qedges raise, e.g. KeyError for related_to with
+        # qualifiers before, and UnsupportedTypeError now
+        resolved = []
+        for resolve in (legacy_get_compatible_spoke_edges, _get_compatible_spoke_edges):
+            try:
+                resolved.append(sorted(resolve(qedge)))
+            except Exception:
+                resolved.append([])
+        assert resolved[0] == resolved[1], qedge
+        if resolved[0]:
+            resolvable_qedges.append(qedge)
+
+    print(
+        f'{len(PREDICATE_DESCENDANTS)} predicates, {len(qedges)} qedges, '
+        f'{len(resolvable_qedges)} resolvable and timed'
+    )
+    for label, resolve in (
+        ('legacy', legacy_get_compatible_spoke_edges),
+        ('indexed', _get_compatible_spoke_edges),
+    ):
+        elapsed = time_resolver(resolve, resolvable_qedges, args.repeats)
+        print(f'{label:<10}{elapsed * 1e6:>8.2f} us per qedge')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""Measures request throughput and latency under concurrent load
+
+Against a running service, this POSTs a TRAPI query (by default the
+one-hop example from the OpenAPI spec) to `--url` from `--concurrency` client
+threads and reports throughput, latency percentiles, and the number of
+503s returned by the back-pressure limiter.
+
+Without a running service, `--demo` serves a stand-in app whose
+requests wait on simulated I/O (as /query waits on neo4j and the
+normalizer), first with a single worker thread as in the original
+uwsgi.ini and then with `--threads` threads behind the same
+ConcurrencyLimiter that guards /query, to show the throughput gain.
+
+Usage (from app/):
+    python -m benchmarks.load_test --url http://localhost:3031/api/v1.5/query [--payload query.json]
+    python -m benchmarks.load_test --demo [--threads 8 --io-latency 0.2]
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import requests
+
+from improving_agent.src.request_limits import ConcurrencyLimiter
+
+DEFAULT_PAYLOAD = {
+    'message': {
+        'query_graph': {
+            'nodes': {
+                'n00': {'ids': ['DOID:1681'], 'categories': ['biolink:Disease']},
+                'n01': {'categories': ['biolink:Gene']},
+            },
+            'edges': {'e00': {'subject': 'n00', 'object': 'n01'}},
+        }
+    }
+}
+
+
+def load_payload(path=None):
+    if path is None:
+        return DEFAULT_PAYLOAD
+    with open(path) as f:
+        return json.load(f)
+
+
+def run_load(url, payload, concurrency, n_requests, timeout=120):
+    """POSTs `payload` to `url` `n_requests` times from `concurrency`
+    threads and returns a summary of the responses"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=concurrency)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    def send(_):
+        start = time.perf_counter()
+        try:
+            status_code = session.post(url, json=payload, timeout=timeout).status_code
+        except requests.RequestException:
+            status_code = None
+        return status_code, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        responses = list(executor.map(send, range(n_requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for status_code, latency in responses if status_code == 200)
+    return {
+        'ok': len(latencies),
+        'rejected': sum(1 for status_code, _ in responses if status_code == 503),
+        'failed': sum(1 for status_code, _ in responses if status_code not in (200, 503)),
+        'throughput': len(latencies) / elapsed,
+        'p50': statistics.median(latencies) if latencies else float('nan'),
+        'p95': latencies[int(0.95 * (len(latencies) - 1))] if latencies else float('nan'),
+    }
+
+
+def print_summary(label, summary):
+    print(
+        f'{label:<24}{summary["throughput"]:>8.1f} req/s   '
+        f'p50 {summary["p50"] * 1000:>7.1f} ms   p95 {summary["p95"] * 1000:>7.1f} ms   '
+        f'ok {summary["ok"]:>4}   503 {summary["rejected"]:>4}   failed {summary["failed"]:>4}'
+    )
+
+
+class _DemoWSGIServer(WSGIServer):
+    request_queue_size = 1024
+
+
+class _ThreadingDemoWSGIServer(ThreadingMixIn, _DemoWSGIServer):
+    daemon_threads = True
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def make_demo_app(io_latency, limiter):
+    def app(environ, start_response):
+        if not limiter.try_acquire():
+            start_response('503 Service Unavailable', [('Retry-After', '1')])
+            return [b'Server is busy; try again later']
+        try:
+            time.sleep(io_latency)
+        finally:
+            limiter.release()
+        start_response('200 OK', [('Content-Type', 'application/json')])
+        return [b'{"message": {}}']
+    return app
+
+
+def run_demo(threads, io_latency, concurrency, n_requests, acquire_timeout):
+    for label, n_threads in (('1 thread', 1), (f'{threads} threads', threads)):
+        # a single-threaded worker admits one request at a time, and
+        # others wait in the listen backlog
+        limiter = ConcurrencyLimiter(n_threads, acquire_timeout)
+        server_class = _DemoWSGIServer if n_threads == 1 else _ThreadingDemoWSGIServer
+        server = make_server(
+            '127.0.0.1', 0, make_demo_app(io_latency, limiter),
+            server_class=server_class, handler_class=_QuietHandler,
+        )
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        try:
+            summary = run_load(
+                f'http://127.0.0.1:{server.server_port}/query', {}, concurrency, n_requests
+            )
+        finally:
+            server.shutdown()
+            server.server_close()
+        print_summary(label, summary)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url')
+    parser.add_argument('--payload')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=64)
+    parser.add_argument('--demo', action='store_true')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--io-latency', type=float, default=0.2)
+    parser.add_argument('--acquire-timeout', type=float, default=30)
+    args = parser.parse_args()
+
+    if args.demo:
+        run_demo(args.threads, args.io_latency, args.concurrency, args.requests, args.acquire_timeout)
+    elif args.url:
+        summary = run_load(args.url, load_payload(args.payload), args.concurrency, args.requests)
+        print_summary(f'concurrency {args.concurrency}', summary)
+    else:
+        parser.error('one of --url or --demo is required')
+
+
+if __name__ == '__main__':
+    main()
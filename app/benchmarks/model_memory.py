@@ -0,0 +1,68 @@
+"""Compares the memory held by the knowledge graph objects of a TRAPI
+response built with the slotted Node, Edge, Attribute, and
+RetrievalSource models against the generated models they replaced
+
+The generated models kept an instance __dict__ holding a copy of their
+`openapi_types` and `attribute_map`; the legacy classes here restore
+that layout. The response is built as in benchmarks.trapi_serialization
+(one node, one edge with four attributes and two sources per result),
+and the memory allocated to build it is traced.
+
+Usage (from app/):
+    python -m benchmarks.model_memory [--results 1000]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from improving_agent import encoder, models
+from benchmarks.trapi_serialization import make_response
+
+
+def _make_legacy_model(model):
+    """Returns a subclass of `model` whose instances have a __dict__
+    with their own copies of the type maps, as generated"""
+    def __init__(self, *args, **kwargs):
+        self.openapi_types = dict(model.openapi_types)
+        self.attribute_map = dict(model.attribute_map)
+        model.__init__(self, *args, **kwargs)
+    return type(f'Legacy{model.__name__}', (model,), {'__init__': __init__})
+
+
+LEGACY_MODELS = SimpleNamespace(**{
+    model.__name__: _make_legacy_model(model)
+    for model in (models.Node, models.Edge, models.Attribute, models.RetrievalSource)
+})
+
+
+def measure(n_results, kg_models):
+    """Returns (bytes allocated, seconds) to build a response"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = make_response(n_results, kg_models)
+    elapsed = time.perf_counter() - start
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del response
+    return allocated, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--results', type=int, default=1000)
+    args = parser.parse_args()
+
+    slotted = make_response(args.results)
+    assert encoder.dumps(make_response(args.results, LEGACY_MODELS)) == encoder.dumps(slotted)
+    del slotted
+
+    for label, kg_models in (('generated models', LEGACY_MODELS), ('slotted models', models)):
+        allocated, elapsed = measure(args.results, kg_models)
+        print(f'{label:<18}{allocated / 1e6:>8.2f} MB{elapsed * 1000:>9.1f} ms to build')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+"""Compares the bidirectional pathfinder search with the variable-length
+Cypher it replaced on a synthetic scale-free graph
+
+The graph is grown by preferential attachment (Barabási–Albert), so a
+few hub nodes have most of the relationships, as in SPOKE, and a share
+of its relationships have the types that pathfinder excludes. Random
+pairs of nodes are searched for paths of 2 to 4 hops through a node of
+an intermediate label, stopping at the first number of hops with any.
+
+Without neo4j, both approaches run against an in-memory stand-in: the
+replaced Cypher as the depth-first expansion of every n-hop trail from
+the start node that neo4j runs for `(start)-[*n]-(end)`, with excluded
+types pruned but the end node and intermediate label checked only on
+complete paths, and the search as its batched frontier expansions. The
+relationships each traverses are counted and the paths each finds are
+checked to be the same. With `--max-fan-out` or `--max-node-degree`,
+the search is also run pruning hubs, by a table of the degrees of the
+graph's nodes, and the slowest search of each is reported as well.
+
+If a neo4j URI is given, the graph is loaded into that database, which
+is emptied first, and the replaced Cypher and the search are timed
+against it.
+
+Usage (from app/):
+    python -m benchmarks.path_search [--nodes 20000 --edges-per-node 4 --pairs 20]
+    python -m benchmarks.path_search --max-fan-out 50 --max-node-degree 200
+    python -m benchmarks.path_search --neo4j-uri bolt://localhost:7687 --user u --password p
+"""
+import argparse
+import random
+import time
+from collections import defaultdict
+
+from improving_agent.src.template_queries.node_degrees import NodeDegrees
+from improving_agent.src.template_queries.path_search import PathNode, search_paths
+
+EXCLUDED_TYPES = ['INTERACTS_PiP', 'NEGATIVELYCORRELATED_CaD', 'NEGATIVELYCORRELATED_DaD']
+INCLUDED_TYPES = ['ASSOCIATES_DaG', 'UPREGULATES_CuG', 'TREATS_CtD', 'EXPRESSES_AeG', 'PARTICIPATES_GpBP']
+LABELS = ['Gene', 'Protein', 'Compound', 'Disease', 'Anatomy', 'BiologicalProcess']
+INTERMEDIATE_LABEL = 'Compound'
+LIMIT = 1000
+
+
+def make_scale_free_graph(n_nodes, edges_per_node, excluded_share, seed=0):
+    """Returns ({node id: PathNode}, {rel id: (node id, type, node id)})
+    for a Barabási–Albert graph of `n_nodes`"""
+    rng = random.Random(seed)
+    nodes = {
+        node_id: PathNode(node_id, (rng.choice(LABELS),), f'node:{node_id}')
+        for node_id in range(n_nodes)
+    }
+    relationships = {}
+    # each node id appears here once per relationship, so sampling from
+    # it attaches new nodes preferentially to those with high degree
+    endpoints = list(range(edges_per_node))
+    for node_id in range(edges_per_node, n_nodes):
+        neighbors = set()
+        while len(neighbors) < edges_per_node:
+            neighbors.add(rng.choice(endpoints))
+        for neighbor in neighbors:
+            rel_type = rng.choice(EXCLUDED_TYPES if rng.random() < excluded_share else INCLUDED_TYPES)
+            relationships[len(relationships)] = (node_id, rel_type, neighbor)
+            endpoints.extend((node_id, neighbor))
+    return nodes, relationships
+
+
+class InMemoryGraph:
+    """Stands in for SPOKE in neo4j, counting the queries made and the
+    relationships traversed"""
+    def __init__(self, nodes, relationships):
+        self.nodes = nodes
+        self.adjacency = defaultdict(list)
+        for rel_id, (a, rel_type, b) in relationships.items():
+            self.adjacency[a].append((rel_id, rel_type, b))
+            self.adjacency[b].append((rel_id, rel_type, a))
+        self.reset_counts()
+
+    def reset_counts(self):
+        self.queries = 0
+        self.traversed = 0
+
+    def expand(self, node_ids, undesired_edges, targets=None):
+        self.queries += 1
+        undesired_edges = set(undesired_edges)
+        targets = set(targets) if targets is not None else None
+        rows = []
+        for node_id in node_ids:
+            for rel_id, rel_type, neighbor_id in self.adjacency[node_id]:
+                self.traversed += 1
+                if rel_type in undesired_edges or (targets is not None and neighbor_id not in targets):
+                    continue
+                rows.append((node_id, rel_id, self.nodes[neighbor_id]))
+        return rows
+
+
+def make_node_degrees(nodes, relationships, min_degree):
+    """Returns the NodeDegrees of the graph, as node_degrees.py would
+    compute them from SPOKE"""
+    counts = defaultdict(int)
+    for a, rel_type, b in relationships.values():
+        if rel_type not in EXCLUDED_TYPES:
+            counts[a] += 1
+            counts[b] += 1
+    degrees = defaultdict(dict)
+    for node_id, degree in counts.items():
+        if degree >= min_degree:
+            node = nodes[node_id]
+            degrees[node.labels[0]][str(node.identifier)] = degree
+    return NodeDegrees(dict(degrees), min_degree)
+
+
+def legacy_search(graph, start_id, end_id, undesired_edges, intermediate_label, limit=LIMIT):
+    """Emulates the replaced `MATCH p=(start)-[*n]-(end)` query for n
+    of 2, 3, then 4, as neo4j expands it: every trail of n hops from
+    the start, with the end and intermediate label checked on each"""
+    undesired_edges = set(undesired_edges)
+
+    def walk(node_id, nodes, rels, used, n_hops, paths):
+        if len(rels) == n_hops:
+            if node_id == end_id and any(intermediate_label in graph.nodes[n].labels for n in nodes):
+                paths.append((tuple(nodes), tuple(rels)))
+            return len(paths) >= limit
+        for rel_id, rel_type, neighbor_id in graph.adjacency[node_id]:
+            graph.traversed += 1
+            if rel_type in undesired_edges or rel_id in used:
+                continue
+            used.add(rel_id)
+            nodes.append(neighbor_id)
+            rels.append(rel_id)
+            done = walk(neighbor_id, nodes, rels, used, n_hops, paths)
+            rels.pop()
+            nodes.pop()
+            used.discard(rel_id)
+            if done:
+                return True
+        return False
+
+    for n_hops in (2, 3, 4):
+        graph.queries += 1
+        paths = []
+        walk(start_id, [start_id], [], set(), n_hops, paths)
+        if paths:
+            return paths
+    return []
+
+
+def run_in_memory(nodes, relationships, pairs, max_fan_out=None, max_node_degree=None):
+    graph = InMemoryGraph(nodes, relationships)
+    node_degrees = make_node_degrees(nodes, relationships, min_degree=10)
+    labels = ['legacy', 'search']
+    if max_fan_out or max_node_degree:
+        labels.append('pruned')
+    totals = defaultdict(float)
+    slowest = defaultdict(float)
+    for start_id, end_id in pairs:
+        graph.reset_counts()
+        start = time.perf_counter()
+        legacy_paths = legacy_search(graph, start_id, end_id, EXCLUDED_TYPES, INTERMEDIATE_LABEL)
+        slowest['legacy'] = max(slowest['legacy'], time.perf_counter() - start)
+        totals['legacy_time'] += time.perf_counter() - start
+        totals['legacy_traversed'] += graph.traversed
+        totals['legacy_queries'] += graph.queries
+        totals['legacy_paths'] += len(legacy_paths)
+
+        graph.reset_counts()
+        start = time.perf_counter()
+        paths = search_paths(
+            graph, [nodes[start_id]], [nodes[end_id]], EXCLUDED_TYPES, [INTERMEDIATE_LABEL], limit=LIMIT,
+        )
+        slowest['search'] = max(slowest['search'], time.perf_counter() - start)
+        totals['search_time'] += time.perf_counter() - start
+        totals['search_traversed'] += graph.traversed
+        totals['search_queries'] += graph.queries
+
+        # a limited result may be any LIMIT of the paths
+        if len(legacy_paths) < LIMIT:
+            assert set(paths) == set(legacy_paths), (start_id, end_id)
+        else:
+            assert len(paths) == LIMIT
+        totals['search_paths'] += len(paths)
+
+        if 'pruned' in labels:
+            graph.reset_counts()
+            start = time.perf_counter()
+            pruned_paths = search_paths(
+                graph, [nodes[start_id]], [nodes[end_id]], EXCLUDED_TYPES, [INTERMEDIATE_LABEL], limit=LIMIT,
+                node_degrees=node_degrees, max_fan_out=max_fan_out, max_node_degree=max_node_degree,
+            )
+            slowest['pruned'] = max(slowest['pruned'], time.perf_counter() - start)
+            totals['pruned_time'] += time.perf_counter() - start
+            totals['pruned_traversed'] += graph.traversed
+            totals['pruned_queries'] += graph.queries
+            totals['pruned_paths'] += len(pruned_paths)
+
+    print(f'{len(pairs)} searches')
+    print(f'{"":<10}{"time":>10}{"slowest":>10}{"relationships traversed":>26}{"queries":>10}{"paths":>8}')
+    for label in labels:
+        print(
+            f'{label:<10}{totals[label + "_time"]:>8.2f} s{slowest[label] * 1000:>7.1f} ms'
+            f'{int(totals[label + "_traversed"]):>26}{int(totals[label + "_queries"]):>10}'
+            f'{int(totals[label + "_paths"]):>8}'
+        )
+    print(
+        f'the search traverses {totals["legacy_traversed"] / max(totals["search_traversed"], 1):.1f}x '
+        f'fewer relationships and is {totals["legacy_time"] / totals["search_time"]:.1f}x faster'
+    )
+
+
+LEGACY_CYPHER = (
+    'MATCH p=(start)-[path*{n_hops}]-(end) '
+    'WHERE NONE(rel in relationships(p) WHERE type(rel) IN $undesired_edges) '
+    'AND start.identifier IN $start_identifiers AND end.identifier IN $end_identifiers '
+    'AND (ANY(i_node in nodes(p) WHERE (i_node:{label}))) '
+    'RETURN p LIMIT {limit};'
+)
+
+
+def load_neo4j(driver, nodes, relationships, batch_size=10000):
+    with driver.session() as session:
+        session.run('MATCH (n) DETACH DELETE n').consume()
+        for label in LABELS:
+            session.run(f'CREATE INDEX IF NOT EXISTS FOR (n:{label}) ON (n.identifier)').consume()
+        rows_by_label = defaultdict(list)
+        for node in nodes.values():
+            rows_by_label[node.labels[0]].append({'identifier': node.identifier})
+        for label, rows in rows_by_label.items():
+            for i in range(0, len(rows), batch_size):
+                session.run(
+                    f'UNWIND $rows AS row CREATE (:{label} {{identifier: row.identifier}})',
+                    rows=rows[i:i + batch_size],
+                ).consume()
+        rows_by_type = defaultdict(list)
+        for a, rel_type, b in relationships.values():
+            rows_by_type[rel_type].append({'a': nodes[a].identifier, 'b': nodes[b].identifier})
+        for rel_type, rows in rows_by_type.items():
+            for i in range(0, len(rows), batch_size):
+                session.run(
+                    'UNWIND $rows AS row MATCH (a {identifier: row.a}), (b {identifier: row.b}) '
+                    f'CREATE (a)-[:{rel_type}]->(b)',
+                    rows=rows[i:i + batch_size],
+                ).consume()
+
+
+def run_neo4j(driver, nodes, pairs):
+    from improving_agent.src.template_queries.path_search import Neo4jPathGraph
+
+    def run_legacy(tx, start_identifier, end_identifier):
+        for n_hops in (2, 3, 4):
+            cypher = LEGACY_CYPHER.format(n_hops=n_hops, label=INTERMEDIATE_LABEL, limit=LIMIT)
+            records = list(tx.run(
+                cypher,
+                undesired_edges=EXCLUDED_TYPES,
+                start_identifiers=[start_identifier],
+                end_identifiers=[end_identifier],
+            ))
+            if records:
+                return records
+        return []
+
+    legacy_time = search_time = 0
+    with driver.session() as session:
+        graph = Neo4jPathGraph(session)
+        for start_id, end_id in pairs:
+            start_identifier, end_identifier = nodes[start_id].identifier, nodes[end_id].identifier
+            start = time.perf_counter()
+            legacy_paths = session.read_transaction(run_legacy, start_identifier, end_identifier)
+            legacy_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            start_nodes, end_nodes = [
+                graph.get_nodes(name, f'{name}.identifier IN ${name}_identifiers', {f'{name}_identifiers': [identifier]})
+                for name, identifier in (('start', start_identifier), ('end', end_identifier))
+            ]
+            found = search_paths(graph, start_nodes, end_nodes, EXCLUDED_TYPES, [INTERMEDIATE_LABEL], limit=LIMIT)
+            paths = graph.get_paths(found) if found else []
+            search_time += time.perf_counter() - start
+            print(f'{start_identifier} - {end_identifier}: {len(legacy_paths)} / {len(paths)} paths')
+
+    print(f'legacy {legacy_time:.2f} s, search {search_time:.2f} s ({legacy_time / search_time:.1f}x)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nodes', type=int, default=20000)
+    parser.add_argument('--edges-per-node', type=int, default=4)
+    parser.add_argument('--excluded-share', type=float, default=0.2)
+    parser.add_argument('--pairs', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-fan-out', type=int)
+    parser.add_argument('--max-node-degree', type=int)
+    parser.add_argument('--neo4j-uri')
+    parser.add_argument('--user', default='neo4j')
+    parser.add_argument('--password', default='neo4j')
+    args = parser.parse_args()
+
+    nodes, relationships = make_scale_free_graph(args.nodes, args.edges_per_node, args.excluded_share, args.seed)
+    rng = random.Random(args.seed)
+    pairs = [tuple(rng.sample(range(args.nodes), 2)) for _ in range(args.pairs)]
+    print(f'{len(nodes)} nodes, {len(relationships)} relationships')
+
+    if args.neo4j_uri:
+        import neo4j
+        driver = neo4j.GraphDatabase.driver(args.neo4j_uri, auth=(args.user, args.password))
+        load_neo4j(driver, nodes, relationships)
+        run_neo4j(driver, nodes, pairs)
+        driver.close()
+    else:
+        run_in_memory(nodes, relationships, pairs, args.max_fan_out, args.max_node_degree)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,194 @@
+"""Times the assembly of pathfinder responses from found paths against
+the per-path assembly it replaced
+
+Pathfinder's paths between a pair of nodes share most of their nodes
+and relationships: every path has the same ends, and the paths of a
+page go through a small set of intermediate nodes. `--paths` paths of
+`--hops` hops are drawn from `--intermediates` intermediate nodes per
+hop, as neo4j objects, and made into a knowledge graph, results, and
+aux graphs both by pathfinder._consume_results, which decodes each
+node and relationship once, and by the replaced assembly, which decoded
+every node and relationship of every path and searched each path for
+its ends among the query's identifiers. Node normalization is stubbed,
+so only assembly is timed, and both are checked to make the same
+knowledge graph nodes and edges and the same number of results.
+
+Usage (from app/):
+    python -m benchmarks.pathfinder_assembly [--paths 1000 --hops 4 --intermediates 60 --repeat 5]
+"""
+import argparse
+import random
+import time
+from unittest.mock import patch
+from uuid import uuid4
+
+from neo4j.graph import Graph
+
+from improving_agent.models import AuxiliaryGraph, QNode
+from improving_agent.src import result_handling
+from improving_agent.src.biolink.spoke_biolink_constants import (
+    KNOWLEDGE_TYPE_LOOKUP,
+    SPOKE_SOURCE_BGEE,
+    SPOKE_SOURCE_CMAP_LINCS_COMPOUND,
+    SPOKE_SOURCE_DISEASES,
+    SPOKE_SOURCE_NCBI_GENE2GO,
+)
+from improving_agent.src.template_queries import pathfinder
+from improving_agent.src.template_queries.path_search import FoundPath
+
+LABELS = ['Gene', 'Compound', 'Anatomy', 'BiologicalProcess']
+REL_TYPE_SOURCES = [
+    ('ASSOCIATES_DaG', SPOKE_SOURCE_DISEASES),
+    ('UPREGULATES_CuG', SPOKE_SOURCE_CMAP_LINCS_COMPOUND),
+    ('EXPRESSES_AeG', SPOKE_SOURCE_BGEE),
+    ('PARTICIPATES_GpBP', SPOKE_SOURCE_NCBI_GENE2GO),
+]
+
+
+def make_paths(n_paths, n_hops, n_intermediates, seed):
+    """Returns `n_paths` distinct FoundPaths of `n_hops` hops from one
+    Disease to another, and their start and end query nodes"""
+    rng = random.Random(seed)
+    hydrator = Graph.Hydrator(Graph())
+    start = hydrator.hydrate_node(0, ['Disease'], {'identifier': 'DOID:9352', 'name': 'start'})
+    end = hydrator.hydrate_node(1, ['Disease'], {'identifier': 'DOID:1612', 'name': 'end'})
+    layers = [[start]]
+    for hop in range(1, n_hops):
+        layer = []
+        for i in range(n_intermediates):
+            node_id = 2 + (hop - 1) * n_intermediates + i
+            label = LABELS[node_id % len(LABELS)]
+            identifier = node_id if label == 'Gene' else f'{label.upper()}:{node_id}'
+            layer.append(hydrator.hydrate_node(node_id, [label], {'identifier': identifier, 'name': f'node {node_id}'}))
+        layers.append(layer)
+    layers.append([end])
+
+    relationships = {}
+
+    def get_relationship(a, b):
+        if (a.id, b.id) not in relationships:
+            rel_id = len(relationships)
+            rel_type, source = REL_TYPE_SOURCES[rel_id % len(REL_TYPE_SOURCES)]
+            relationships[(a.id, b.id)] = hydrator.hydrate_relationship(
+                rel_id, a.id, b.id, rel_type, {'sources': [source]}
+            )
+        return relationships[(a.id, b.id)]
+
+    paths, seen = [], set()
+    while len(paths) < n_paths:
+        nodes = [rng.choice(layer) for layer in layers]
+        key = tuple(node.id for node in nodes)
+        if key in seen:
+            continue
+        seen.add(key)
+        paths.append(FoundPath(nodes, [get_relationship(a, b) for a, b in zip(nodes, nodes[1:])]))
+
+    qnodes = []
+    for node in (start, end):
+        qnode = QNode(ids=[node['identifier']], categories=['biolink:Disease'])
+        setattr(qnode, 'spoke_identifiers', {node['identifier']: node['identifier']})
+        setattr(qnode, 'spoke_labels', ['Disease'])
+        qnodes.append(qnode)
+    return paths, qnodes[0], qnodes[1]
+
+
+def legacy_consume_results(paths, start_qnode, end_qnode):
+    """The replaced assembly: each path is decoded on its own, its ends
+    are found among the query's identifiers, and results are made with
+    SPOKE CURIEs and normalized afterwards"""
+    knowledge_graph = {'edges': {}, 'nodes': {}}
+    aux_graphs = {}
+    results = []
+    search_nodes = set()
+    for path in paths:
+        p_edges = {str(rel.id): result_handling.make_result_edge(rel, KNOWLEDGE_TYPE_LOOKUP) for rel in path.relationships}
+        p_nodes = {}
+        for node in path.nodes:
+            result_node, search_node = result_handling.make_result_node(node)
+            search_nodes.add(search_node)
+            p_nodes[node['identifier']] = result_node
+        knowledge_graph['edges'] |= p_edges
+        knowledge_graph['nodes'] |= p_nodes
+
+        start_curie, end_curie = '', ''
+        start_identifiers = pathfinder._get_spoke_identifiers(start_qnode)
+        end_identifiers = pathfinder._get_spoke_identifiers(end_qnode)
+        for p_node_id in p_nodes.keys():
+            if p_node_id in start_identifiers:
+                start_curie = p_node_id
+            if p_node_id in end_identifiers:
+                end_curie = p_node_id
+
+        aux_graph_id, edge_id = str(uuid4()), str(uuid4())
+        result, related_to, _ = pathfinder._make_pf_result(
+            list(p_edges.keys()),
+            start_curie,
+            end_curie,
+            start_curie,
+            end_curie,
+            edge_id,
+            aux_graph_id,
+            pathfinder.make_internal_retrieval_source([], pathfinder.INFORES_IMPROVING_AGENT.infores_id),
+        )
+        result.node_bindings = {qnode: bindings[0] for qnode, bindings in result.node_bindings.items()}
+        knowledge_graph['edges'][edge_id] = related_to
+        aux_graphs[aux_graph_id] = AuxiliaryGraph(edges=list(p_edges.keys()))
+        results.append(result)
+
+    normalized_curies = normalize_spoke_nodes(list(search_nodes))
+    knowledge_graph, results = result_handling.apply_normalization(normalized_curies, knowledge_graph, results)
+    return knowledge_graph, results, aux_graphs
+
+
+def normalize_spoke_nodes(search_nodes):
+    return {search_node.curie: f'NORM:{search_node.curie}' for search_node in search_nodes}
+
+
+def _time(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), output
+
+
+def _get_kg_keys(knowledge_graph):
+    return (
+        set(knowledge_graph['nodes']),
+        {edge_id for edge_id, edge in knowledge_graph['edges'].items() if edge.predicate != 'biolink:related_to'},
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--paths', type=int, default=1000)
+    parser.add_argument('--hops', type=int, default=4)
+    parser.add_argument('--intermediates', type=int, default=60)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    paths, start_qnode, end_qnode = make_paths(args.paths, args.hops, args.intermediates, args.seed)
+    n_nodes = len({node.id for path in paths for node in path.nodes})
+    n_rels = len({rel.id for path in paths for rel in path.relationships})
+    print(f'{len(paths)} paths of {args.hops} hops over {n_nodes} nodes and {n_rels} relationships')
+
+    with patch.object(pathfinder, 'normalize_spoke_nodes_for_translator', normalize_spoke_nodes):
+        legacy_time, (legacy_kg, legacy_results, _) = _time(
+            lambda: legacy_consume_results(paths, start_qnode, end_qnode), args.repeat
+        )
+        new_time, (new_kg, new_results, _, _) = _time(
+            lambda: pathfinder._consume_results(paths), args.repeat
+        )
+
+    assert _get_kg_keys(legacy_kg) == _get_kg_keys(new_kg)
+    assert len(legacy_results) == len(new_results) == len(paths)
+    print(f'{"assembly":<12}{"time (ms)":>12}')
+    print(f'{"per path":<12}{legacy_time * 1000:>12.1f}')
+    print(f'{"interned":<12}{new_time * 1000:>12.1f}')
+    print(f'{legacy_time / new_time:.1f}x faster')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Compares the peak memory of buffered and streamed TRAPI response
+serialization as the number of results grows
+
+Each measurement runs in a fresh process: a synthetic response (see
+benchmarks.trapi_serialization) is built, the peak resident set size is
+reset, and the response is serialized, either with `encoder.dumps` and
+written at once, or with `encoder.iter_dumps` and written chunk by
+chunk, as a chunked HTTP body would be. The increase in peak RSS over
+the RSS before serialization is reported, along with the peak of
+Python allocations traced during serialization. Peak RSS is reset via
+/proc/self/clear_refs, so this runs on Linux only.
+
+Usage (from app/):
+    python -m benchmarks.streaming_memory [--results 2000 10000 50000]
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tracemalloc
+
+from improving_agent import encoder
+from benchmarks.trapi_serialization import make_response
+
+MODES = ('buffered', 'streamed')
+
+
+def _read_status_kb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(f'{field}:'):
+                return int(line.split()[1])
+    raise KeyError(field)
+
+
+def measure(mode, n_results, trace):
+    """Returns (increase in peak RSS in kB, peak traced bytes, body
+    size) for serializing a response with `n_results` results"""
+    response = make_response(n_results)
+    encoder.dumps(make_response(1))  # generate the model encoders
+    gc.collect()
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')  # resets VmHWM to the current RSS
+    rss_before = _read_status_kb('VmRSS')
+    if trace:
+        tracemalloc.start()
+
+    body_size = 0
+    with open(os.devnull, 'wb') as sink:
+        if mode == 'buffered':
+            body = encoder.dumps(response)
+            sink.write(body)
+            body_size = len(body)
+            del body
+        else:
+            for chunk in encoder.iter_dumps(response):
+                sink.write(chunk)
+                body_size += len(chunk)
+
+    traced_peak = 0
+    if trace:
+        traced_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return _read_status_kb('VmHWM') - rss_before, traced_peak, body_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--results', type=int, nargs='+', default=[2000, 10000, 50000])
+    parser.add_argument('--child', nargs=2, metavar=('MODE', 'N_RESULTS'), help=argparse.SUPPRESS)
+    parser.add_argument('--trace', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mode, n_results = args.child
+        print(json.dumps(measure(mode, int(n_results), args.trace)))
+        return
+
+    print(f'{"results":>8}{"body MB":>9}  ' + ''.join(
+        f'{mode + " RSS MB":>18}{mode + " heap MB":>19}' for mode in MODES
+    ))
+    for n_results in args.results:
+        row = []
+        for mode in MODES:
+            # RSS and traced allocations are measured in separate runs
+            # since tracing inflates memory use
+            measurements = [
+                json.loads(subprocess.run(
+                    [sys.executable, '-m', 'benchmarks.streaming_memory', '--child', mode, str(n_results)]
+                    + (['--trace'] if trace else []),
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout)
+                for trace in (False, True)
+            ]
+            rss_kb, _, body_size = measurements[0]
+            row.append(f'{rss_kb / 1024:>18.1f}{measurements[1][1] / 1e6:>19.1f}')
+        print(f'{n_results:>8}{body_size / 1e6:>9.1f}  ' + ''.join(row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Compares TRAPI response serialization with the per-attribute
+JSONEncoder, Model.to_dict, and the generated per-class encoders
+
+A synthetic response is built with `--edges` knowledge graph edges, each
+carrying several attributes and retrieval sources, like a large
+BasicQuery response.
+
+Usage (from app/):
+    python -m benchmarks.trapi_serialization [--edges 5000 --repeats 5]
+"""
+import argparse
+import json
+import time
+
+import six
+
+from improving_agent import encoder, models
+from improving_agent.models.base_model import Model
+
+
+class LegacyJSONEncoder(json.JSONEncoder):
+    """The encoder as it was, iterating openapi_types for each Model"""
+    def default(self, o):
+        if isinstance(o, Model):
+            dikt = {}
+            for attr, _ in six.iteritems(o.openapi_types):
+                value = getattr(o, attr)
+                if value is None:
+                    continue
+                dikt[o.attribute_map[attr]] = value
+            return dikt
+        return super().default(o)
+
+
+def make_response(n_edges, kg_models=models):
+    """Returns a Response with `n_edges` results, building knowledge
+    graph objects with the Node, Edge, Attribute, and RetrievalSource
+    classes of `kg_models`"""
+    nodes, edges, results = {}, {}, []
+    for i in range(n_edges):
+        gene_id = f'NCBIGene:{i}'
+        nodes[gene_id] = kg_models.Node(
+            name=f'GENE{i}',
+            categories=['biolink:Gene'],
+            attributes=[
+                kg_models.Attribute(attribute_type_id='biolink:xref', value=[f'ENSEMBL:{i}'], original_attribute_name='ensembl'),
+                kg_models.Attribute(attribute_type_id='biolink:description', value=f'gene {i}', original_attribute_name='description'),
+            ],
+        )
+        edges[str(i)] = kg_models.Edge(
+            subject='DOID:9352',
+            object=gene_id,
+            predicate='biolink:genetically_associated_with',
+            attributes=[
+                kg_models.Attribute(
+                    attribute_type_id='biolink:p_value',
+                    value=0.001 * i,
+                    value_type_id='EDAM:data_1669',
+                    original_attribute_name='p_value',
+                    attribute_source='infores:spoke',
+                ),
+                kg_models.Attribute(attribute_type_id='biolink:publications', value=[f'PMID:{i}', f'PMID:{i + 1}']),
+                kg_models.Attribute(attribute_type_id='biolink:knowledge_level', value='knowledge_assertion'),
+                kg_models.Attribute(attribute_type_id='biolink:agent_type', value='manual_agent'),
+            ],
+            sources=[
+                kg_models.RetrievalSource(resource_id='infores:disgenet', resource_role='primary_knowledge_source'),
+                kg_models.RetrievalSource(
+                    resource_id='infores:spoke',
+                    resource_role='aggregator_knowledge_source',
+                    upstream_resource_ids=['infores:disgenet'],
+                ),
+            ],
+        )
+        results.append(models.Result(
+            node_bindings={
+                'n0': [models.NodeBinding(id='DOID:9352', attributes=[])],
+                'n1': [models.NodeBinding(id=gene_id, attributes=[])],
+            },
+            analyses=[models.Analysis(
+                resource_id='infores:improving-agent',
+                edge_bindings={'e0': [models.EdgeBinding(id=str(i), attributes=[])]},
+                score=i / n_edges,
+            )],
+        ))
+    message = models.Message(results=results, knowledge_graph={'nodes': nodes, 'edges': edges})
+    return models.Response(message=message, description='Success', logs=[])
+
+
+def time_serializer(serialize, response, repeats):
+    body = serialize(response)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        serialize(response)
+    return (time.perf_counter() - start) / repeats, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--edges', type=int, default=5000)
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    response = make_response(args.edges)
+    serializers = {
+        'legacy JSONEncoder': lambda r: json.dumps(r, cls=LegacyJSONEncoder).encode(),
+        'to_dict + JSONEncoder': lambda r: json.dumps(r.to_dict(), cls=LegacyJSONEncoder).encode(),
+        'generated encoders': encoder.dumps,
+    }
+    assert json.loads(serializers['legacy JSONEncoder'](response)) == json.loads(encoder.dumps(response))
+    for label, serialize in serializers.items():
+        elapsed, size = time_serializer(serialize, response, args.repeats)
+        print(f'{label:<24}{elapsed * 1000:>9.1f} ms   {size / 1e6:>6.2f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,8 @@ import neo4j
 from improving_agent import encoder
 from improving_agent.src.biolink.spoke_biolink_constants import BIOLINK_SPOKE_NODE_MAPPINGS
 from improving_agent.src.config import app_config
+from improving_agent.src.instrumentation import METRICS
+from improving_agent.src.request_limits import QUERY_LIMITER, RETRY_AFTER_SECONDS, is_limited_path
 from improving_agent.src.template_queries.pathfinder import try_pathfinder
 from improving_agent.util import get_evidara_logger
 
@@ -19,7 +21,9 @@ driver = neo4j.GraphDatabase.driver(
         app_config.NEO4J_SPOKE_USER,
         app_config.NEO4J_SPOKE_PASS,
     ),
-    max_connection_lifetime=200,
+    max_connection_lifetime=int(app_config.NEO4J_MAX_CONNECTION_LIFETIME),
+    max_connection_pool_size=int(app_config.NEO4J_MAX_CONNECTION_POOL_SIZE),
+    connection_acquisition_timeout=float(app_config.NEO4J_CONNECTION_ACQUISITION_TIMEOUT),
 )
 logger = get_evidara_logger(__name__)
 logger.info('Starting app with configs:\n%s', app_config)
@@ -38,11 +42,12 @@ def get_db():
     g.db (driver.session): active neo4j database session
     """
     if not hasattr(g, 'db'):
-        g.db = driver.session()
+        g.db = driver.session(fetch_size=int(app_config.NEO4J_FETCH_SIZE))
     return g.db
 
 
 from improving_agent.src import core # noqa: #E402, E401 
+from improving_agent.src import batch_query  # noqa: E402
 
 app = connexion.FlaskApp(__name__, specification_dir='./openapi/')
 app.app.json_encoder = encoder.JSONEncoder
@@ -120,6 +125,13 @@ def check_api():
     return 'OK'
 
 
+@app.route('/api/metrics')
+def get_metrics():
+    """Returns this worker's query pipeline metrics in the Prometheus
+    text format"""
+    return METRICS.render(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+
 @app.route('/api/hellodb')
 def check_db():
     """Checks for a working connection to the database"""
@@ -147,14 +159,67 @@ def run_pathfinder(start_curie: str, end_curie: str):
     include_labels = flask.request.args.getlist('include_categories')
     include_ids = flask.request.args.getlist('include_curies')
     with get_db() as session:
-        resp, code = try_pathfinder(
+        resp, code, next_cursor = try_pathfinder(
             session,
             start_curie,
             end_curie,
             include_labels,
             include_ids,
+            flask.request.args.get('max_fan_out'),
+            flask.request.args.get('max_node_degree'),
+            flask.request.args.get('page_size'),
+            flask.request.args.get('cursor'),
+        )
+    if next_cursor is not None:
+        # TRAPI Responses may have additional properties
+        resp = {**encoder.to_shallow_dict(resp), 'next_cursor': next_cursor}
+    if flask.request.args.get('stream') == 'true':
+        return flask.Response(encoder.iter_dumps(resp), status=code, mimetype='application/json')
+    return flask.Response(encoder.dumps(resp), status=code, mimetype='application/json')
+
+
+@app.route('/api/batch-query', methods=['POST'])
+def run_batch_query():
+    """Runs a batch of TRAPI queries, sent as {"queries": [Query]},
+    and returns {"responses": [Response]} in the same order; errors are
+    described by the `status` of the Response of the query that failed
+    """
+    body = flask.request.get_json(silent=True)
+    queries = body.get('queries') if isinstance(body, dict) else None
+    if not isinstance(queries, list):
+        return 'Request body must be {"queries": [TRAPI Query]}', HTTPStatus.BAD_REQUEST
+    if len(queries) > batch_query.BATCH_QUERY_MAX_QUERIES:
+        return (
+            f'A batch may have at most {batch_query.BATCH_QUERY_MAX_QUERIES} queries',
+            HTTPStatus.BAD_REQUEST,
         )
-        return jsonify(resp.to_dict()), code
+    responses = [
+        response[0] if isinstance(response, tuple) else response
+        for response in batch_query.try_batch_query(queries)
+    ]
+    return flask.Response(encoder.dumps({'responses': responses}), mimetype='application/json')
+
+
+@app.app.before_request
+def limit_concurrent_queries():
+    """Turns away SPOKE queries with a 503 when this worker is
+    saturated"""
+    if not is_limited_path(flask.request.path):
+        return None
+    if not QUERY_LIMITER.try_acquire():
+        logger.warning(f'Rejecting {flask.request.path}; {QUERY_LIMITER.in_flight} queries in flight')
+        return (
+            'Server is busy; try again later',
+            HTTPStatus.SERVICE_UNAVAILABLE,
+            {'Retry-After': str(RETRY_AFTER_SECONDS)},
+        )
+    g.holds_query_slot = True
+
+
+@app.app.teardown_request
+def release_query_slot(error):
+    if g.pop('holds_query_slot', False):
+        QUERY_LIMITER.release()
 
 
 @app.app.teardown_appcontext
@@ -1,7 +1,19 @@
 import connexion
-import six
+import flask
+from werkzeug.exceptions import BadRequest
 
-from improving_agent import util
+from improving_agent.models.async_query_response import AsyncQueryResponse  # noqa: E501
+from improving_agent.src import core
+from improving_agent.src.async_jobs import AsyncQueueFullError, get_async_query_engine
+
+
+def _make_query_runner(app):
+    # queries run in worker threads, outside of any request, but need
+    # an app context for the neo4j session in `get_db`
+    def run_query(raw_json):
+        with app.app_context():
+            return core.try_query(raw_json)
+    return run_query
 
 
 def asyncquery_post(request_body):  # noqa: E501
@@ -12,6 +24,26 @@ def asyncquery_post(request_body):  # noqa: E501
     :param request_body: Query information to be submitted
     :type request_body: Dict[str, ]
 
-    :rtype: str
+    :rtype: AsyncQueryResponse
     """
-    return "Not implemented", 501
+    if not connexion.request.is_json:
+        return ('Request was not json', 400)
+    request_json = connexion.request.get_json()
+    callback = request_json.get('callback')
+    if not callback or not isinstance(callback, str):
+        return ('`callback` must be present in AsyncQuery', 400)
+    try:
+        core.deserialize_query(request_json)
+    except BadRequest as e:
+        return (e.description, 400)
+
+    engine = get_async_query_engine(_make_query_runner(flask.current_app._get_current_object()))
+    try:
+        job_id = engine.submit(request_json, callback)
+    except AsyncQueueFullError as e:
+        return (str(e), 503)
+    return AsyncQueryResponse(
+        status='Accepted',
+        description='Query has been queued',
+        job_id=job_id,
+    )
@@ -1,10 +1,6 @@
-import connexion
-import six
-from typing import Dict
-from typing import Tuple
-from typing import Union
-
-from improving_agent import util
+from improving_agent.models.async_query_status_response import AsyncQueryStatusResponse  # noqa: E501
+from improving_agent.models.log_entry import LogEntry  # noqa: E501
+from improving_agent.src.async_jobs import ASYNC_JOB_STORE
 
 
 def asyncquery_status(job_id):  # noqa: E501
@@ -15,6 +11,13 @@ def asyncquery_status(job_id):  # noqa: E501
     :param job_id: Identifier of the job for status request
     :type job_id: str
 
-    :rtype: Union[None, Tuple[None, int], Tuple[None, int, Dict[str, str]]
+    :rtype: AsyncQueryStatusResponse
     """
-    return "Not implemented", 501
+    job = ASYNC_JOB_STORE.get(job_id)
+    if job is None:
+        return (f'No job found with job_id {job_id}', 404)
+    return AsyncQueryStatusResponse(
+        status=job['status'],
+        description=job['description'],
+        logs=[LogEntry(**log_entry) for log_entry in job['logs']],
+    )
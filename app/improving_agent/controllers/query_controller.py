@@ -1,24 +1,48 @@
 import connexion
+import flask
 import six
 
 from improving_agent import util
+from improving_agent import encoder
 from improving_agent.models.response import Response  # noqa: E501
 from improving_agent.models.query import Query  # noqa: E501
 from improving_agent.src import core
+from improving_agent.src.instrumentation import STAGE_SERIALIZATION, span
 
 
-def query_post(request_body):  # noqa: E501
+def _stream_serialization(response):
+    """Yields chunks of the serialized `response`, timing serialization
+    across the chunked body rather than just the call"""
+    with span(STAGE_SERIALIZATION):
+        yield from encoder.iter_dumps(response)
+
+
+def query_post(request_body, stream=False):  # noqa: E501
     """Query reasoner via one of several inputs
 
      # noqa: E501
 
     :param request_body: Query information to be submitted
     :type request_body: Dict[str, ]
+    :param stream: Stream the response as a chunked body
+    :type stream: bool
 
     :rtype: Response
     """
     if connexion.request.is_json:
         request_json = connexion.request.get_json()
-        return core.try_query(request_json)
+        response = core.try_query(request_json)
+        if isinstance(response, tuple):
+            response, status_code = response
+        else:
+            status_code = 200
+        if stream:
+            return flask.Response(
+                _stream_serialization(response), status=status_code, mimetype='application/json'
+            )
+        # serialized here, rather than by connexion, so that it is timed
+        with span(STAGE_SERIALIZATION):
+            body = encoder.dumps(response)
+        return flask.Response(body, status=status_code, mimetype='application/json')
     else:
         return ('Request was not json', 400)
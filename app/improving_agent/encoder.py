@@ -1,21 +1,158 @@
+import json
+from datetime import date
 from json import JSONEncoder
 
 import six
 
 from improving_agent.models.base_model import Model
 
+# Response > message > knowledge_graph > nodes > each node
+STREAM_DEPTH = 4
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# per-class functions that convert a Model to a shallow dict of its
+# non-None attributes, generated the first time an instance of the class
+# is encoded
+_MODEL_ENCODERS = {}
+
+
+def _make_model_encoder(model):
+    """Returns a function that converts instances of type(model) to a
+    dict of their non-None attributes, keyed as in `attribute_map`
+
+    The function is generated once per class so that encoding an
+    instance reads each attribute directly, rather than iterating
+    `openapi_types` and calling property getters. Nested values are
+    left to the json module's C encoder, which calls back into
+    `_encode_default` for nested Models.
+    """
+    cls = type(model)
+    # generated models store attributes as `_<attr>` behind a property,
+    # in the instance __dict__ or, for slotted models, in __slots__
+    stored_attrs = getattr(model, '__dict__', None) or getattr(cls, '__slots__', ())
+    lines = ['def encode(o):', '    d = {}']
+    for i, attr in enumerate(model.openapi_types):
+        if isinstance(getattr(cls, attr, None), property) and f'_{attr}' in stored_attrs:
+            lines.append(f'    v = o._{attr}')
+        else:
+            lines.append(f'    v = o.{attr}')
+        lines.append('    if v is not None:')
+        lines.append(f'        d[key_{i}] = v')
+    lines.append('    return d')
+
+    namespace = {f'key_{i}': model.attribute_map[attr] for i, attr in enumerate(model.openapi_types)}
+    exec('\n'.join(lines), namespace)
+    return namespace['encode']
+
+
+def _encode_default(value):
+    model_encoder = _MODEL_ENCODERS.get(value.__class__)
+    if model_encoder is not None:
+        return model_encoder(value)
+    if isinstance(value, Model):
+        model_encoder = _make_model_encoder(value)
+        _MODEL_ENCODERS[value.__class__] = model_encoder
+        return model_encoder(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f'Object of type {value.__class__.__name__} is not JSON serializable')
+
+
+_json_encoder = json.JSONEncoder(
+    ensure_ascii=False,
+    separators=(',', ':'),
+    default=_encode_default,
+)
+
+
+def dumps(value):
+    """Returns `value`, e.g. a TRAPI Response, serialized to compact
+    UTF-8 JSON bytes, skipping None attributes of Models"""
+    return _json_encoder.encode(value).encode('utf-8')
+
+
+def _iter_encode(value, depth):
+    """Yields `value` serialized as pieces of JSON text, encoding
+    Models, dicts, and lists item by item down to `depth` levels, and
+    anything below that, or any scalar, in one call to the C encoder"""
+    if value.__class__ in _MODEL_ENCODERS or isinstance(value, Model):
+        value = _encode_default(value)
+    if (
+        depth <= 0
+        or not value
+        or not isinstance(value, (dict, list))
+        # the C encoder's conversion of other keys, e.g. True to "true"
+        or isinstance(value, dict) and not all(isinstance(key, str) for key in value)
+    ):
+        yield _json_encoder.encode(value)
+        return
+
+    if isinstance(value, dict):
+        yield '{'
+        separator = ''
+        for key, item in value.items():
+            yield f'{separator}{_json_encoder.encode(key)}:'
+            yield from _iter_encode(item, depth - 1)
+            separator = ','
+        yield '}'
+    else:
+        yield '['
+        separator = ''
+        for item in value:
+            yield separator
+            yield from _iter_encode(item, depth - 1)
+            separator = ','
+        yield ']'
+
+
+def iter_dumps(value, depth=STREAM_DEPTH, chunk_size=STREAM_CHUNK_SIZE):
+    """Yields `value`, e.g. a TRAPI Response, serialized as by `dumps`
+    in UTF-8 chunks of about `chunk_size` bytes
+
+    The collections of a Response down to `depth`, i.e. results,
+    knowledge_graph.nodes, knowledge_graph.edges, and auxiliary_graphs,
+    are encoded item by item, so that the serialized body is never held
+    in memory at once, e.g. when it is streamed as a chunked HTTP
+    response.
+    """
+    buffer = []
+    buffered_size = 0
+    for piece in _iter_encode(value, depth):
+        buffer.append(piece)
+        buffered_size += len(piece)
+        if buffered_size >= chunk_size:
+            yield ''.join(buffer).encode('utf-8')
+            buffer = []
+            buffered_size = 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def to_shallow_dict(model):
+    """Returns the non-None attributes of `model`, a Model, as a dict
+    keyed as in its `attribute_map`, leaving nested values as they are,
+    e.g. to add properties to a TRAPI Response before it is encoded"""
+    return dict(_encode_default(model))
+
+
+def to_json_data(value):
+    """Returns `value` as plain JSON-able data, e.g. for caching"""
+    return json.loads(dumps(value))
+
 
 class JSONEncoder(JSONEncoder):
     include_nulls = False
 
     def default(self, o):
         if isinstance(o, Model):
+            if not self.include_nulls:
+                return _encode_default(o)
             dikt = {}
             for attr, _ in six.iteritems(o.openapi_types):
                 value = getattr(o, attr)
-                if value is None and not self.include_nulls:
-                    continue
                 attr = o.attribute_map[attr]
                 dikt[attr] = value
             return dikt
-        return JSONEncoder.default(self, o)
+        return super().default(o)
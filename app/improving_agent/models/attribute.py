@@ -13,6 +13,41 @@ class Attribute(Model):
     Do not edit the class manually.
     """
 
+    # edited after generation: knowledge graph objects are built in bulk,
+    # so instances are slotted and share class-level type maps
+    __slots__ = (
+        '_attribute_type_id',
+        '_original_attribute_name',
+        '_value',
+        '_value_type_id',
+        '_attribute_source',
+        '_value_url',
+        '_description',
+        '_attributes',
+    )
+
+    openapi_types = {
+        'attribute_type_id': str,
+        'original_attribute_name': str,
+        'value': AnyType,
+        'value_type_id': str,
+        'attribute_source': str,
+        'value_url': str,
+        'description': str,
+        'attributes': None  # set below, once Attribute is defined
+    }
+
+    attribute_map = {
+        'attribute_type_id': 'attribute_type_id',
+        'original_attribute_name': 'original_attribute_name',
+        'value': 'value',
+        'value_type_id': 'value_type_id',
+        'attribute_source': 'attribute_source',
+        'value_url': 'value_url',
+        'description': 'description',
+        'attributes': 'attributes'
+    }
+
     def __init__(self, attribute_type_id=None, original_attribute_name=None, value=None, value_type_id=None, attribute_source=None, value_url=None, description=None, attributes=None):  # noqa: E501
         """Attribute - a model defined in OpenAPI
 
@@ -33,28 +68,6 @@ class Attribute(Model):
         :param attributes: The attributes of this Attribute.  # noqa: E501
         :type attributes: List[Attribute]
         """
-        self.openapi_types = {
-            'attribute_type_id': str,
-            'original_attribute_name': str,
-            'value': AnyType,
-            'value_type_id': str,
-            'attribute_source': str,
-            'value_url': str,
-            'description': str,
-            'attributes': List[Attribute]
-        }
-
-        self.attribute_map = {
-            'attribute_type_id': 'attribute_type_id',
-            'original_attribute_name': 'original_attribute_name',
-            'value': 'value',
-            'value_type_id': 'value_type_id',
-            'attribute_source': 'attribute_source',
-            'value_url': 'value_url',
-            'description': 'description',
-            'attributes': 'attributes'
-        }
-
         self._attribute_type_id = attribute_type_id
         self._original_attribute_name = original_attribute_name
         self._value = value
@@ -260,3 +273,6 @@ class Attribute(Model):
         """
 
         self._attributes = attributes
+
+
+Attribute.openapi_types['attributes'] = List[Attribute]
@@ -8,6 +8,9 @@ T = typing.TypeVar('T')
 
 
 class Model:
+    # subclasses that declare __slots__ have no instance __dict__
+    __slots__ = ()
+
     # openapiTypes: The key is attribute name and the
     # value is attribute type.
     openapi_types: typing.Dict[str, type] = {}
@@ -61,7 +64,11 @@ class Model:
 
     def __eq__(self, other):
         """Returns true if both objects are equal"""
-        return self.__dict__ == other.__dict__
+        if hasattr(self, '__dict__'):
+            return self.__dict__ == getattr(other, '__dict__', None)
+        return type(self) is type(other) and all(
+            getattr(self, slot) == getattr(other, slot) for slot in self.__slots__
+        )
 
     def __ne__(self, other):
         """Returns true if both objects are not equal"""
@@ -14,6 +14,35 @@ class Edge(Model):
     Do not edit the class manually.
     """
 
+    # edited after generation: knowledge graph objects are built in bulk,
+    # so instances are slotted and share class-level type maps
+    __slots__ = (
+        '_predicate',
+        '_subject',
+        '_object',
+        '_attributes',
+        '_qualifiers',
+        '_sources',
+    )
+
+    openapi_types = {
+        'predicate': str,
+        'subject': str,
+        'object': str,
+        'attributes': List[Attribute],
+        'qualifiers': List[Qualifier],
+        'sources': List[RetrievalSource]
+    }
+
+    attribute_map = {
+        'predicate': 'predicate',
+        'subject': 'subject',
+        'object': 'object',
+        'attributes': 'attributes',
+        'qualifiers': 'qualifiers',
+        'sources': 'sources'
+    }
+
     def __init__(self, predicate=None, subject=None, object=None, attributes=None, qualifiers=None, sources=None):  # noqa: E501
         """Edge - a model defined in OpenAPI
 
@@ -30,24 +59,6 @@ class Edge(Model):
         :param sources: The sources of this Edge.  # noqa: E501
         :type sources: List[RetrievalSource]
         """
-        self.openapi_types = {
-            'predicate': str,
-            'subject': str,
-            'object': str,
-            'attributes': List[Attribute],
-            'qualifiers': List[Qualifier],
-            'sources': List[RetrievalSource]
-        }
-
-        self.attribute_map = {
-            'predicate': 'predicate',
-            'subject': 'subject',
-            'object': 'object',
-            'attributes': 'attributes',
-            'qualifiers': 'qualifiers',
-            'sources': 'sources'
-        }
-
         self._predicate = predicate
         self._subject = subject
         self._object = object
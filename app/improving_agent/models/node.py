@@ -14,6 +14,29 @@ class Node(Model):
     Do not edit the class manually.
     """
 
+    # edited after generation: knowledge graph objects are built in bulk,
+    # so instances are slotted and share class-level type maps
+    __slots__ = (
+        '_name',
+        '_categories',
+        '_attributes',
+        '_is_set',
+    )
+
+    openapi_types = {
+        'name': str,
+        'categories': List[str],
+        'attributes': List[Attribute],
+        'is_set': bool
+    }
+
+    attribute_map = {
+        'name': 'name',
+        'categories': 'categories',
+        'attributes': 'attributes',
+        'is_set': 'is_set'
+    }
+
     def __init__(self, name=None, categories=None, attributes=None, is_set=None):  # noqa: E501
         """Node - a model defined in OpenAPI
 
@@ -26,20 +49,6 @@ class Node(Model):
         :param is_set: The is_set of this Node.  # noqa: E501
         :type is_set: bool
         """
-        self.openapi_types = {
-            'name': str,
-            'categories': List[str],
-            'attributes': List[Attribute],
-            'is_set': bool
-        }
-
-        self.attribute_map = {
-            'name': 'name',
-            'categories': 'categories',
-            'attributes': 'attributes',
-            'is_set': 'is_set'
-        }
-
         self._name = name
         self._categories = categories
         self._attributes = attributes
@@ -14,6 +14,29 @@ class RetrievalSource(Model):
     Do not edit the class manually.
     """
 
+    # edited after generation: knowledge graph objects are built in bulk,
+    # so instances are slotted and share class-level type maps
+    __slots__ = (
+        '_resource_id',
+        '_resource_role',
+        '_upstream_resource_ids',
+        '_source_record_urls',
+    )
+
+    openapi_types = {
+        'resource_id': str,
+        'resource_role': ResourceRoleEnum,
+        'upstream_resource_ids': List[str],
+        'source_record_urls': List[str]
+    }
+
+    attribute_map = {
+        'resource_id': 'resource_id',
+        'resource_role': 'resource_role',
+        'upstream_resource_ids': 'upstream_resource_ids',
+        'source_record_urls': 'source_record_urls'
+    }
+
     def __init__(self, resource_id=None, resource_role=None, upstream_resource_ids=None, source_record_urls=None):  # noqa: E501
         """RetrievalSource - a model defined in OpenAPI
 
@@ -26,20 +49,6 @@ class RetrievalSource(Model):
         :param source_record_urls: The source_record_urls of this RetrievalSource.  # noqa: E501
         :type source_record_urls: List[str]
         """
-        self.openapi_types = {
-            'resource_id': str,
-            'resource_role': ResourceRoleEnum,
-            'upstream_resource_ids': List[str],
-            'source_record_urls': List[str]
-        }
-
-        self.attribute_map = {
-            'resource_id': 'resource_id',
-            'resource_role': 'resource_role',
-            'upstream_resource_ids': 'upstream_resource_ids',
-            'source_record_urls': 'source_record_urls'
-        }
-
         self._resource_id = resource_id
         self._resource_role = resource_role
         self._upstream_resource_ids = upstream_resource_ids
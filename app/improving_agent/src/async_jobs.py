@@ -0,0 +1,380 @@
+"""This module provides the job engine behind /asyncquery
+
+Submitted queries are placed on a bounded queue and run by a small pool
+of worker threads, so that long queries don't tie up a web worker. Job
+state and logs are kept in a `SqliteJobStore` so that any uwsgi worker
+can answer /asyncquery_status, and the TRAPI Response of each job is
+POSTed to the submitter's callback URL, with retries.
+
+Queued jobs live only in the queue of the process that accepted them,
+so jobs of a process that has exited, e.g. a restarted worker, can't
+finish. Each job records the host and pid of its process, and jobs
+whose process is no longer running on this host are marked Failed when
+workers start and when their status is requested.
+"""
+import json
+import os
+import queue
+import sqlite3
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from improving_agent import encoder
+from improving_agent.models import LogLevel
+from improving_agent.src.config import app_config
+from improving_agent.src.http_sessions import SERVICE_ASYNCQUERY_CALLBACK, get_session
+from improving_agent.util import get_evidara_logger
+
+logger = get_evidara_logger(__name__)
+
+JOB_STATUS_QUEUED = 'Queued'
+JOB_STATUS_RUNNING = 'Running'
+JOB_STATUS_COMPLETED = 'Completed'
+JOB_STATUS_FAILED = 'Failed'
+UNFINISHED_JOB_STATUSES = (JOB_STATUS_QUEUED, JOB_STATUS_RUNNING)
+
+
+class AsyncQueueFullError(Exception):
+    """Raise when the async job queue cannot accept more jobs"""
+    pass
+
+
+def _now_isoformat():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds').replace('+00:00', 'Z')
+
+
+def make_log_entry(message, level=LogLevel.INFO, code=None):
+    """Returns a dict representation of a TRAPI LogEntry"""
+    return {'timestamp': _now_isoformat(), 'level': level, 'code': code, 'message': message}
+
+
+def _get_job_owner():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _is_abandoned(owner, include_own=False):
+    """Returns whether the process `owner` ran in, on this host, has
+    exited; the current process counts as exited if `include_own`, i.e.
+    if it can't have accepted the job itself"""
+    host, _, pid = (owner or '').rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    pid = int(pid)
+    if pid == os.getpid():
+        return include_own
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+class SqliteJobStore:
+    """Stores the status, description, and logs of async jobs in a
+    SQLite file that can be shared by multiple processes
+
+    Connections are opened lazily, one per thread.
+
+    Parameters
+    ----------
+    path (str): location of the SQLite file; parent directories are
+        created if necessary
+    ttl (float or None): seconds after which finished and abandoned jobs
+        are removed from the store
+    """
+    def __init__(self, path, ttl=None):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def _get_connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS jobs '
+                '(job_id TEXT PRIMARY KEY, status TEXT, description TEXT, '
+                'callback TEXT, logs TEXT, updated_at REAL, owner TEXT)'
+            )
+            self._local.connection = connection
+        return connection
+
+    def create(self, job_id, callback, description):
+        """Adds a queued job, removing expired jobs from the store"""
+        now = time.time()
+        logs = [make_log_entry(description)]
+        connection = self._get_connection()
+        if self.ttl is not None:
+            connection.execute('DELETE FROM jobs WHERE updated_at <= ?', (now - self.ttl,))
+        connection.execute(
+            'INSERT INTO jobs (job_id, status, description, callback, logs, updated_at, owner) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (job_id, JOB_STATUS_QUEUED, description, callback, json.dumps(logs), now, _get_job_owner()),
+        )
+
+    def update(self, job_id, status=None, description=None, log_entry=None):
+        """Updates the status and description of a job and appends
+        `log_entry` to its logs, in a single statement so that
+        concurrent updates don't overwrite each other's logs"""
+        log_entry = None if log_entry is None else json.dumps(log_entry)
+        self._get_connection().execute(
+            'UPDATE jobs SET status = COALESCE(?, status), description = COALESCE(?, description), '
+            "logs = CASE WHEN ? IS NULL THEN logs ELSE json_insert(logs, '$[#]', json(?)) END, "
+            'updated_at = ? WHERE job_id = ?',
+            (status, description, log_entry, log_entry, time.time(), job_id),
+        )
+
+    def fail_abandoned_jobs(self, include_own=False):
+        """Marks queued and running jobs whose process has exited as
+        Failed and returns their job_ids; see `_is_abandoned`"""
+        rows = self._get_connection().execute(
+            f'SELECT job_id, owner FROM jobs WHERE status IN ({",".join("?" * len(UNFINISHED_JOB_STATUSES))})',
+            UNFINISHED_JOB_STATUSES,
+        ).fetchall()
+        job_ids = [job_id for job_id, owner in rows if _is_abandoned(owner, include_own)]
+        for job_id in job_ids:
+            self._fail_abandoned_job(job_id)
+        return job_ids
+
+    def _fail_abandoned_job(self, job_id):
+        log_entry = make_log_entry(
+            'The process running the query exited before it finished', LogLevel.ERROR
+        )
+        self._get_connection().execute(
+            'UPDATE jobs SET status = ?, description = ?, '
+            "logs = json_insert(logs, '$[#]', json(?)), updated_at = ? "
+            f'WHERE job_id = ? AND status IN ({",".join("?" * len(UNFINISHED_JOB_STATUSES))})',
+            (
+                JOB_STATUS_FAILED,
+                'Query was lost when the service restarted; please submit it again',
+                json.dumps(log_entry),
+                time.time(),
+                job_id,
+                *UNFINISHED_JOB_STATUSES,
+            ),
+        )
+
+    def get(self, job_id):
+        """Returns a dict of the job's status, description, callback, and
+        logs, or None if the job is not in the store"""
+        row = self._get_connection().execute(
+            'SELECT status, description, callback, logs, owner FROM jobs WHERE job_id = ?', (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[0] in UNFINISHED_JOB_STATUSES and _is_abandoned(row[4]):
+            self._fail_abandoned_job(job_id)
+            return self.get(job_id)
+        return {
+            'status': row[0],
+            'description': row[1],
+            'callback': row[2],
+            'logs': json.loads(row[3]),
+        }
+
+
+class AsyncQueryEngine:
+    """Runs queries in a pool of worker threads and POSTs their
+    responses to callback URLs
+
+    Parameters
+    ----------
+    store (SqliteJobStore): where job state is recorded
+    run_query (callable): takes the raw query json and returns a
+        (models.Response, HTTP status code) tuple, e.g. `core.try_query`
+    max_workers (int): number of worker threads
+    max_queued_jobs (int): number of jobs that may wait for a worker
+        before new submissions are rejected
+    callback_retries (int): number of times a failed callback POST is
+        retried
+    callback_backoff (float): seconds before the first retry, doubled
+        for every following retry
+    session (requests.Session or None): session to POST callbacks with
+    """
+    def __init__(
+        self,
+        store,
+        run_query,
+        max_workers=2,
+        max_queued_jobs=20,
+        callback_retries=3,
+        callback_backoff=1.0,
+        session=None,
+    ):
+        self.store = store
+        self.run_query = run_query
+        self.max_workers = max_workers
+        self.callback_retries = callback_retries
+        self.callback_backoff = callback_backoff
+        self._session = session
+        self._queue = queue.Queue(maxsize=max_queued_jobs)
+        self._workers = []
+        self._workers_lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is not None:
+            return self._session
+        return get_session(SERVICE_ASYNCQUERY_CALLBACK)
+
+    def _start_workers(self):
+        # threads are started on first use, i.e. after uwsgi has forked
+        if self._workers:
+            return
+        with self._workers_lock:
+            if self._workers:
+                return
+            # this process hasn't accepted any jobs yet, so unfinished
+            # jobs recorded for its pid are from an exited process
+            abandoned_job_ids = self.store.fail_abandoned_jobs(include_own=True)
+            if abandoned_job_ids:
+                logger.warning(f'Marked {len(abandoned_job_ids)} abandoned async query jobs as failed')
+            for i in range(self.max_workers):
+                worker = threading.Thread(
+                    target=self._work, name=f'asyncquery-worker-{i}', daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, raw_json, callback):
+        """Queues `raw_json` to be run and returns its job_id
+
+        Raises AsyncQueueFullError if too many jobs are waiting
+        """
+        self._start_workers()
+        job_id = uuid.uuid4().hex
+        self.store.create(job_id, callback, 'Query has been queued')
+        try:
+            self._queue.put_nowait((job_id, raw_json, callback))
+        except queue.Full:
+            self.store.update(
+                job_id,
+                JOB_STATUS_FAILED,
+                'Query was rejected because too many queries are queued',
+                make_log_entry('Async query queue is full', LogLevel.ERROR, 'ServiceUnavailable'),
+            )
+            raise AsyncQueueFullError('Too many queries are queued; try again later')
+        logger.info(f'Queued async query job {job_id}')
+        return job_id
+
+    def _work(self):
+        while True:
+            job_id, raw_json, callback = self._queue.get()
+            try:
+                self.run_job(job_id, raw_json, callback)
+            except Exception as e:
+                logger.exception(f'Async query job {job_id} failed: {e}')
+            finally:
+                self._queue.task_done()
+
+    def run_job(self, job_id, raw_json, callback):
+        """Runs the query for `job_id` and POSTs its response to
+        `callback`, recording progress in the store"""
+        self.store.update(job_id, JOB_STATUS_RUNNING, 'Query is running', make_log_entry('Query started'))
+        try:
+            response, status_code = self._run_query(raw_json)
+        except Exception as e:
+            logger.exception(f'Async query job {job_id} raised {e}')
+            self.store.update(
+                job_id,
+                JOB_STATUS_FAILED,
+                'Query failed unexpectedly',
+                make_log_entry(f'Query failed: {e}', LogLevel.ERROR),
+            )
+            return
+
+        if status_code == 200:
+            n_results = len(response.message.results or [])
+            log_entry = make_log_entry(f'Query finished with {n_results} results')
+        else:
+            log_entry = make_log_entry(
+                f'Query finished with status {status_code}: {response.description}', LogLevel.WARNING
+            )
+        self.store.update(job_id, log_entry=log_entry)
+
+        failure = self.post_callback(job_id, callback, response)
+        if failure:
+            self.store.update(job_id, JOB_STATUS_FAILED, failure)
+        elif status_code == 200:
+            self.store.update(job_id, JOB_STATUS_COMPLETED, 'Response was sent to the callback')
+        else:
+            self.store.update(job_id, JOB_STATUS_FAILED, response.description)
+
+    def _run_query(self, raw_json):
+        result = self.run_query(raw_json)
+        if isinstance(result, tuple):
+            return result
+        return result, 200
+
+    def post_callback(self, job_id, callback, response):
+        """POSTs `response` to `callback`, retrying on connection errors
+        and non-2xx status codes
+
+        Returns
+        -------
+        failure (str or None): description of the last failure, or None
+            if the callback accepted the response
+        """
+        body = encoder.dumps(response)
+        headers = {'Content-Type': 'application/json'}
+        failure = None
+        for attempt in range(self.callback_retries + 1):
+            if attempt:
+                time.sleep(self.callback_backoff * 2 ** (attempt - 1))
+            try:
+                callback_response = self.session.post(callback, data=body, headers=headers)
+            except Exception as e:
+                failure = f'Callback request failed: {e}'
+            else:
+                if callback_response.ok:
+                    self.store.update(job_id, log_entry=make_log_entry(
+                        f'Callback returned {callback_response.status_code}'
+                    ))
+                    return None
+                failure = f'Callback URL returned {callback_response.status_code}'
+            self.store.update(job_id, log_entry=make_log_entry(
+                f'{failure} (attempt {attempt + 1} of {self.callback_retries + 1})', LogLevel.WARNING
+            ))
+        logger.error(f'Giving up on callback for async query job {job_id}: {failure}')
+        return failure
+
+    def join(self):
+        """Blocks until every queued job has finished"""
+        self._queue.join()
+
+
+ASYNC_JOB_STORE = SqliteJobStore(
+    app_config.ASYNCQUERY_JOB_STORE_PATH,
+    ttl=float(app_config.ASYNCQUERY_JOB_TTL),
+)
+
+_async_query_engine = None
+_async_query_engine_lock = threading.Lock()
+
+
+def get_async_query_engine(run_query):
+    """Returns the shared AsyncQueryEngine, creating it with `run_query`
+    on first use"""
+    global _async_query_engine
+    if _async_query_engine is not None:
+        return _async_query_engine
+    with _async_query_engine_lock:
+        if _async_query_engine is None:
+            _async_query_engine = AsyncQueryEngine(
+                ASYNC_JOB_STORE,
+                run_query,
+                max_workers=int(app_config.ASYNCQUERY_MAX_WORKERS),
+                max_queued_jobs=int(app_config.ASYNCQUERY_MAX_QUEUED_JOBS),
+                callback_retries=int(app_config.ASYNCQUERY_CALLBACK_RETRIES),
+                callback_backoff=float(app_config.ASYNCQUERY_CALLBACK_BACKOFF),
+            )
+        return _async_query_engine
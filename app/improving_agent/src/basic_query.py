@@ -3,6 +3,7 @@ from typing import Dict, List, Optional, Tuple, Union
 from string import ascii_letters
 
 import neo4j
+import numpy as np
 from improving_agent import models
 from improving_agent.exceptions import MissingComponentError, NonLinearQueryError
 from improving_agent.src.biolink.spoke_biolink_constants import (
@@ -12,19 +13,12 @@ from improving_agent.src.biolink.spoke_biolink_constants import (
     BIOLINK_ENTITY_DRUG,
     BIOLINK_ENTITY_GENE,
     BIOLINK_ENTITY_SMALL_MOLECULE,
-    BIOLINK_SLOT_HIGHEST_FDA_APPROVAL,
-    BIOLINK_SLOT_MAX_RESEARCH_PHASE,
     INFORES_IMPROVING_AGENT,
     KNOWLEDGE_TYPE_LOOKUP,
-    KNOWN_UNMAPPED_ATTRS,
-    MAX_PHASE_FDA_APPROVAL_MAP,
-    PHASE_BL_CT_PHASE_ENUM_MAP,
     QUALIFIERS,
     SPOKE_ANY_TYPE,
     SPOKE_BIOLINK_EDGE_MAPPINGS,
-    SPOKE_BIOLINK_EDGE_ATTRIBUTE_MAPPINGS,
     SPOKE_BIOLINK_NODE_MAPPINGS,
-    SPOKE_BIOLINK_NODE_ATTRIBUTE_MAPPINGS,
     SPOKE_LABEL_COMPOUND,
     SPOKE_PROPERTY_NATIVE_SPOKE,
 )
@@ -36,35 +30,51 @@ from improving_agent.src.improving_agent_constants import (
     ATTRIBUTE_TYPE_PSEV_WEIGHT,
     SPOKE_NODE_PROPERTY_SOURCE
 )
+from improving_agent.src.instrumentation import (
+    COUNT_EDGES,
+    COUNT_NODES,
+    COUNT_RECORDS,
+    STAGE_CYPHER,
+    STAGE_EXTRACTION,
+    STAGE_KP_ANNOTATION,
+    STAGE_NORMALIZATION,
+    STAGE_SCORING,
+    count,
+    span,
+)
 from improving_agent.src.kps.biggim import annotate_edges_with_biggim
 from improving_agent.src.kps.cohd import annotate_edges_with_cohd
 # from improving_agent.src.kps.text_miner import TextMinerClient
 from improving_agent.src.normalization import SearchNode
 from improving_agent.src.normalization.node_normalization import normalize_spoke_nodes_for_translator
 from improving_agent.src.provenance import (
-    make_publications_attribute,
     make_retrieval_sources,
     SPOKE_PROVENANCE_FIELDS,
-    SPOKE_PUBLICATION_FIELDS,
 )
 from improving_agent.src.psev import get_psev_scores
 from improving_agent.src.result_handling import (
-    resolve_epc_kl_at,
+    SPOKE_GRAPH_TYPE_EDGE,
+    SPOKE_GRAPH_TYPE_NODE,
     get_edge_qualifiers,
+    make_result_attribute,
+    resolve_epc_kl_at,
 )
-from improving_agent.src.scoring.scoring_utils import normalize_results_scores
+from improving_agent.src.scoring.scoring_utils import normalize_scores, rank_results
 from improving_agent.util import get_evidara_logger
 
 logger = get_evidara_logger(__name__)
 ExtractedResult = namedtuple('ExtractedResult', ['nodes', 'edges'])
 
-# attributes
-SPOKE_GRAPH_TYPE_EDGE = 'edge'
-SPOKE_GRAPH_TYPE_NODE = 'node'
-ATTRIBUTE_MAPS = {
-    SPOKE_GRAPH_TYPE_EDGE: SPOKE_BIOLINK_EDGE_ATTRIBUTE_MAPPINGS,
-    SPOKE_GRAPH_TYPE_NODE: SPOKE_BIOLINK_NODE_ATTRIBUTE_MAPPINGS
-}
+# compact, transaction-independent copies of neo4j graph objects; these
+# are decoded while streaming records so that the transaction can be
+# released before TRAPI objects are constructed
+DecodedNode = namedtuple('DecodedNode', ['identifier', 'labels', 'properties'])
+DecodedEdge = namedtuple('DecodedEdge', ['id', 'type', 'subject', 'object', 'properties'])
+
+# the row variable and index of batched queries, see
+# BasicQuery.make_batch_cypher_query_string
+BATCH_QUERY_ROW = 'batch_query'
+BATCH_QUERY_INDEX = 'batch_index'
 
 # grouped constants
 SUPPORTED_COMPOUND_CATEGORIES = [
@@ -73,49 +83,8 @@ SUPPORTED_COMPOUND_CATEGORIES = [
     BIOLINK_ENTITY_SMALL_MOLECULE,
 ]
 
-# what follows is (hopefully) temporary handling of "special" attributes,
-# e.g. max phase transformation to biolink's highest fda approval enums
-SPECIAL_ATTRIBUTE_HANDLERS = {}
-
-
-def register_special_attribute_handler(attribute_name):
-    def wrapper(f):
-        SPECIAL_ATTRIBUTE_HANDLERS[attribute_name] = f
-        return f
-    return wrapper
-
-
-# max phase for nodes
-@register_special_attribute_handler(BIOLINK_SLOT_HIGHEST_FDA_APPROVAL)
-def _map_max_phase_to_fda_approval(property_value):
-    return MAX_PHASE_FDA_APPROVAL_MAP[property_value]
-
-# phase for edges
-@register_special_attribute_handler(BIOLINK_SLOT_MAX_RESEARCH_PHASE)
-def _map_max_phase_to_fda_approval(property_value):
-    return PHASE_BL_CT_PHASE_ENUM_MAP[property_value]
-
-
-def _transform_special_attributes(slot_type, property_value):
-    '''Returns a transformed property name and value if biolink
-    compliance requires it.
-
-    Parameters
-    ----------
-    slot_type (str): the name of the property (biolink slot)
-    property_value (str, list(str), int, float): the value of the property
-
-    Returns
-    -------
-    property_value (str, list(str), int, float): the updated value, if necessary
-    '''
-    attr_transformer = SPECIAL_ATTRIBUTE_HANDLERS.get(slot_type)
-    if attr_transformer:
-        return attr_transformer(property_value)
-    return property_value
-
-
-# scoring
+# scoring; functions are applied to numpy arrays of attribute values by
+# BasicQuery.get_result_scores, so they must be vectorizable
 IMPROVING_AGENT_SCORING_FUCNTIONS = {}
 
 
@@ -152,7 +121,45 @@ def get_text_miner_score(value):
 
 
 # Cypher
-def make_qnode_filter_clause(name, query_node):
+def get_cypher_identifier_values(spoke_identifiers):
+    """Returns a list of SPOKE identifiers that can be passed to neo4j
+    as a query parameter
+
+    QNode.spoke_identifiers are formatted as Cypher literals so that
+    they can be inlined in a query, i.e. strings are single-quoted and
+    integer identifiers (e.g. Gene) are bare. Here, quotes are stripped
+    and bare identifiers are converted back to int.
+
+    Parameters
+    ----------
+    spoke_identifiers (iterable of str): Cypher-formatted identifiers
+
+    Returns
+    -------
+    values (list of str|int): identifiers as they are stored in SPOKE
+    """
+    values = []
+    for identifier in spoke_identifiers:
+        if len(identifier) > 1 and identifier[0] == identifier[-1] == "'":
+            values.append(identifier[1:-1])
+            continue
+        try:
+            values.append(int(identifier))
+        except ValueError:
+            values.append(identifier)
+    return values
+
+
+def make_qnode_filter_clause(name, query_node, parameters=None, parameter_prefix='$'):
+    """Returns a Cypher WHERE fragment for `query_node`
+
+    If `parameters` is a dict, identifiers are not inlined; instead, the
+    clause references `${name}_identifiers` and the identifier values
+    are added to `parameters` so that queries of the same shape compile
+    to the same Cypher string and can reuse a cached neo4j query plan.
+    `parameter_prefix` replaces the `$`, e.g. to reference the
+    identifiers as a property of an UNWIND row
+    """
     labels_clause = ''
     if query_node.spoke_labels:
         if SPOKE_ANY_TYPE not in query_node.spoke_labels:
@@ -162,11 +169,17 @@ def make_qnode_filter_clause(name, query_node):
     identifiers_clause = ''
     if query_node.spoke_identifiers:
         spoke_search_ids = list(query_node.spoke_identifiers.keys())
-        identifiers_clause = f'{name}.identifier IN [{",".join(spoke_search_ids)}]'
+        if parameters is None:
+            search_ids = f'[{",".join(spoke_search_ids)}]'
+        else:
+            param_name = f'{name}_identifiers'
+            parameters[param_name] = get_cypher_identifier_values(spoke_search_ids)
+            search_ids = f'{parameter_prefix}{param_name}'
+        identifiers_clause = f'{name}.identifier IN {search_ids}'
         # TODO: this will quickly become untenable as we add better querying
         # and we'll need specific funcs; see also drug below
         if SPOKE_LABEL_COMPOUND in query_node.spoke_labels:
-            identifiers_clause = f'({identifiers_clause} OR {name}.chembl_id IN [{",".join(spoke_search_ids)}])'
+            identifiers_clause = f'({identifiers_clause} OR {name}.chembl_id IN {search_ids})'
     if query_node.categories:
         if (
             BIOLINK_ENTITY_DRUG in query_node.categories
@@ -216,6 +229,34 @@ def make_qedge_cypher_repr(name, query_edge):
     return edge_repr
 
 
+def decode_n4j_object(n4j_object):
+    """Returns a DecodedNode or DecodedEdge holding only the data
+    needed to build TRAPI objects from `n4j_object`
+
+    Parameters
+    ----------
+    n4j_object (neo4j.graph.Node or neo4j.graph.Relationship): a graph
+        object from a neo4j record
+
+    Returns
+    -------
+    DecodedNode or DecodedEdge
+    """
+    if isinstance(n4j_object, neo4j.graph.Node):
+        return DecodedNode(
+            n4j_object['identifier'],
+            tuple(n4j_object.labels),
+            dict(n4j_object.items()),
+        )
+    return DecodedEdge(
+        str(n4j_object.id),  # these are ints, but we want them as strings for TRAPI spec
+        n4j_object.type,
+        n4j_object.start_node['identifier'],
+        n4j_object.end_node['identifier'],
+        dict(n4j_object.items()),
+    )
+
+
 def get_n4j_param_str(self, parameters):
     """Returns a string properly formatted for neo4j parameter-based
     searching
@@ -247,16 +288,28 @@ class BasicQuery:
         query_options={},
         n_results=200,
         query_type=KNOWLEDGE_TYPE_LOOKUP,
+        parameterize_cypher=True,
     ):
-        """Instantiates a new BasicQuery object"""
+        """Instantiates a new BasicQuery object
+
+        When `parameterize_cypher` is True, identifiers and the result
+        limit are sent to neo4j as query parameters rather than inlined
+        in the Cypher string so that the query plan cache can be hit
+        """
         self.qnodes = qnodes
         self.qedges = qedges
         self.query_options = query_options
         self.n_results = n_results
         self.query_type = query_type
+        self.parameterize_cypher = parameterize_cypher
+        self.query_parameters = {}
 
         self.knowledge_graph = {"edges": {}, "nodes": {}}
         self.knowledge_node_counter = 0
+
+        # the knowledge graph doubles as a per-query build cache, keyed by
+        # SPOKE identifier and relationship id; these count its hits/misses
+        self.build_cache_stats = Counter()
         self.knowledge_edge_counter = 0
 
         self.nodes_to_normalize = set()
@@ -315,7 +368,9 @@ class BasicQuery:
                 else:
                     raise MissingComponentError(f"Missing one of {next_node}")
 
-    def make_cypher_query_string(self):
+    def _make_match_clause(self, parameter_prefix='$'):
+        """Returns the MATCH and WHERE clauses of this query, setting
+        `query_names`, `query_mapping`, and `query_parameters`"""
         # spoke diameter is <7 but consider enforcing max query length anyway
         # TODO: get rid of this silly naming and use the now-available `qedge_id` or `qnode_id` attr
         self.query_names = list(ascii_letters[: len(self.query_order)])
@@ -323,11 +378,15 @@ class BasicQuery:
         node_filter_clauses = []
         edge_filter_clauses = []
         self.query_mapping = {"edges": {}, "nodes": {}}
+        self.query_parameters = {}
+        parameters = self.query_parameters if self.parameterize_cypher else None
         for query_part, name in zip(self.query_order, self.query_names):
             if isinstance(query_part, models.QNode):
                 self.query_mapping["nodes"][name] = query_part.qnode_id
                 query_parts.append(f'({name})')
-                node_filter_clause = make_qnode_filter_clause(name, query_part)
+                node_filter_clause = make_qnode_filter_clause(
+                    name, query_part, parameters, parameter_prefix
+                )
                 if node_filter_clause:
                     node_filter_clauses.append(node_filter_clause)
 
@@ -349,9 +408,34 @@ class BasicQuery:
                 where_clause = "WHERE "
             where_clause = where_clause + " AND ".join(edge_filter_clauses)
 
-        return_clause = f'RETURN * limit {self.n_results}'
+        return f'{match_clause} {where_clause}'
+
+    def make_cypher_query_string(self):
+        match_clause = self._make_match_clause()
+        if self.parameterize_cypher:
+            self.query_parameters['n_results'] = self.n_results
+            return_clause = 'RETURN * limit $n_results'
+        else:
+            return_clause = f'RETURN * limit {self.n_results}'
+
+        return f'{match_clause} {return_clause};'
 
-        return f'{match_clause} {where_clause} {return_clause};'
+    def make_batch_cypher_query_string(self):
+        """Returns a Cypher query that runs this query once for each row
+        of a `$batch` parameter, for batches of queries of the same
+        shape; see improving_agent.src.batch_query
+
+        Each row holds the `query_parameters` of one query of the batch
+        and its `batch_index`, which is returned with its records.
+        `$n_results` limits the records of each row.
+        """
+        match_clause = self._make_match_clause(f'{BATCH_QUERY_ROW}.')
+        names = ', '.join(self.query_names)
+        return (
+            f'UNWIND $batch AS {BATCH_QUERY_ROW} '
+            f'CALL {{ WITH {BATCH_QUERY_ROW} {match_clause} RETURN {names} LIMIT $n_results }} '
+            f'RETURN {BATCH_QUERY_ROW}.{BATCH_QUERY_INDEX} AS {BATCH_QUERY_INDEX}, {names};'
+        )
 
     # Result handling
     def _get_psev_scores(
@@ -371,143 +455,99 @@ class BasicQuery:
         psev_scores = get_psev_scores(psev_contexts, self.result_nodes_spoke_identifiers)
         return psev_scores
 
-    def score_result(
-        self,
-        result: 'models.Result',
-        psev_scores: Dict[str, Dict[Union[str, int], float]]
-    ):
-        """Returns a score based on psev weights, cohort edge correlations,
-            both, or none
-
-        Parameters
-        ----------
-        result (Result): TRAPI Result object containing node_bindings
-            and edge_bindings,
-        psev_scores: psev scores for all result nodes for all conepts
-            related to the query
-
-        Returns
-        -------
-        scores (dict): mapping of score (str) -> float and
-            score name (str) -> str
+    def _get_knowledge_object_scores(self, kg_objects, psev_scores, use_psev):
+        """Returns an array with the summed score of the attributes of
+        each of `kg_objects`, i.e. knowledge graph nodes or edges
 
-        NOTE: currently for linear queries, all knowledge graphs are of the
-            length, but dividing the sum score by `n` may make sense in the
-            future
+        Attribute values are gathered into one column per scoring
+        function, which is then applied to the whole column. If
+        `use_psev`, node identifiers are scored by their PSEV summed
+        across all concepts in `psev_scores`.
         """
-        score = 0
-        psev_context = self.query_options.get('psev_context')
-
-        for knode in result.node_bindings.values():
-            # knode is a list of node_bindings, but we only support
-            # one, so index at 0
-            # TODO: reconsider upon version upgrade
-            node = self.knowledge_graph['nodes'][knode[0].id]
-            for attribute in node.attributes:
+        object_scores = np.zeros(len(kg_objects))
+        columns = {}  # attribute name -> (object positions, values)
+        psev_positions, psev_identifiers = [], []
+        for position, kg_object in enumerate(kg_objects):
+            for attribute in kg_object.attributes:
                 attribute_name = attribute.original_attribute_name
-                value = attribute.value
-                # first lookup psev if possible
-                if psev_context and attribute_name == 'identifier':
-                    attribute_name = 'psev'
-                    # iterate on all PSEV concepts and sum the
-                    # psev value for the node of interest across all
-                    # conepts
-                    psev_sum = 0
-                    for concept in psev_scores:
-                        psev_sum += psev_scores[concept].get(value, 0.0)
-                    value = psev_sum
-                score_func = IMPROVING_AGENT_SCORING_FUCNTIONS.get(attribute_name)
-                if score_func:
-                    score += score_func(value)
-
-        for kedge in result.analyses[0].edge_bindings.values():
-            # kedge is a list of node_bindings, but we only support
-            # one, so index at 0
-            # TODO: reconsider upon version upgrade
-            edge = self.knowledge_graph['edges'][kedge[0].id]
-            for attribute in edge.attributes:
-                score_func = IMPROVING_AGENT_SCORING_FUCNTIONS.get(attribute.original_attribute_name)
-                if score_func:
-                    score += score_func(attribute.value)
-        return score
-
-    def score_results(self, results):
-        scored_results = []
-        psev_concepts = self.query_options.get('psev_context')
-        psev_scores = self._get_psev_scores(psev_concepts)
-        for result in results:
-            result.analyses[0].score = self.score_result(result, psev_scores)
-            scored_results.append(result)
-        return scored_results
-
-    def _make_result_attribute(
-        self,
-        property_type,
-        property_value,
-        edge_or_node,
-        spoke_object_type
-    ):
-        """Returns a TRAPI-spec attribute for a result node or edge
-
-        Parameters
-        ----------
-        property_type: the neo4j-SPOKE property type
-        property_value: the value of the property
-        edge_or_node: string 'edge' or 'node' specifiying the type of
-            graph object that is described by this attributee
-        spoke_object_type: the neo4j node label or edge type from SPOKE
-
-        Returns
-        -------
-        models.Attribute or None
+                if use_psev and attribute_name == 'identifier':
+                    psev_positions.append(position)
+                    psev_identifiers.append(attribute.value)
+                    continue
+                if attribute_name not in IMPROVING_AGENT_SCORING_FUCNTIONS:
+                    continue
+                positions, values = columns.setdefault(attribute_name, ([], []))
+                positions.append(position)
+                values.append(attribute.value)
+
+        if psev_identifiers:
+            psev_matrix = np.array([
+                [concept_scores.get(identifier, 0.0) for identifier in psev_identifiers]
+                for concept_scores in psev_scores.values()
+            ], dtype=float).reshape(-1, len(psev_identifiers))
+            columns[ATTRIBUTE_TYPE_PSEV_WEIGHT] = (psev_positions, psev_matrix.sum(axis=0))
+
+        for attribute_name, (positions, values) in columns.items():
+            score_func = IMPROVING_AGENT_SCORING_FUCNTIONS.get(attribute_name)
+            if score_func:
+                np.add.at(object_scores, positions, score_func(np.asarray(values, dtype=float)))
+        return object_scores
+
+    def get_result_scores(self, results, psev_scores):
+        """Returns an array of the scores of `results`, each the sum of
+        the scores of the attributes of its bound knowledge graph nodes
+        and edges, with PSEVs, summed across concepts, scoring the node
+        identifiers if the query has a psev_context
+
+        Each distinct knowledge graph node and edge is scored once; a
+        result's score is then the sum of the scores of its bindings
         """
-        if edge_or_node not in ATTRIBUTE_MAPS:
-            raise ValueError(
-                f'Got {edge_or_node=} but it must be one of "edge" or "node"'
-            )
-        
-        if property_type in KNOWN_UNMAPPED_ATTRS:
-            return
-
-        if property_type in SPOKE_PUBLICATION_FIELDS:
-            return make_publications_attribute(property_type, property_value)
-
-        object_properties = ATTRIBUTE_MAPS[edge_or_node].get(spoke_object_type)
-        if not object_properties:
-            logger.warning(
-                f'Could not find any properties in the attribute map for {spoke_object_type=}'
-            )
-            return
-
-        attribute_mapping = object_properties.get(property_type)
-        if not attribute_mapping:
-            logger.warning(
-                f'Could not find an attribute mapping for {spoke_object_type=} and {property_type=}'
-            )
-            return
-        attribute_type_id = attribute_mapping.biolink_type
-        property_value = _transform_special_attributes(attribute_type_id, property_value)
-
-        attribute = models.Attribute(
-            attribute_type_id=attribute_type_id,
-            original_attribute_name=property_type,
-            value=property_value
+        node_columns, edge_columns = {}, {}
+        result_positions, node_positions, edge_positions = [], [], []
+        for i, result in enumerate(results):
+            for knode in result.node_bindings.values():
+                result_positions.append(i)
+                node_positions.append(node_columns.setdefault(knode[0].id, len(node_columns)))
+        for i, result in enumerate(results):
+            for kedge in result.analyses[0].edge_bindings.values():
+                result_positions.append(i)
+                edge_positions.append(edge_columns.setdefault(kedge[0].id, len(edge_columns)))
+
+        use_psev = bool(self.query_options.get('psev_context'))
+        node_scores = self._get_knowledge_object_scores(
+            [self.knowledge_graph['nodes'][node_id] for node_id in node_columns], psev_scores, use_psev,
         )
-        if attribute_mapping.attribute_source:  # temporary until node mappings are done
-            attribute.attribute_source = attribute_mapping.attribute_source
+        edge_scores = self._get_knowledge_object_scores(
+            [self.knowledge_graph['edges'][edge_id] for edge_id in edge_columns], psev_scores, False,
+        )
+        binding_scores = np.concatenate([
+            node_scores[np.asarray(node_positions, dtype=int)],
+            edge_scores[np.asarray(edge_positions, dtype=int)],
+        ])
+        return np.bincount(result_positions, weights=binding_scores, minlength=len(results))
 
-        if attribute_mapping.attributes:
-            attribute.attributes = attribute_mapping.attributes
-        return attribute
+    def score_results(self, results, norm_scores=False):
+        """Sets the score of each of `results`, optionally normalized
+        by `normalize_scores`, and returns them"""
+        psev_concepts = self.query_options.get('psev_context')
+        psev_scores = self._get_psev_scores(psev_concepts)
+        scores = self.get_result_scores(results, psev_scores)
+        if norm_scores is True:
+            scores = normalize_scores(scores)
+        else:
+            scores = scores.tolist()
+        for result, score in zip(results, scores):
+            result.analyses[0].score = score
+        return results
 
-    def make_result_node(self, n4j_object, spoke_curie):
+    def make_result_node(self, decoded_node, spoke_curie):
         """Instantiates a reasoner-standard Node to return as part of a
         KnowledgeGraph result
 
         Parameters
         ----------
-        n4j_object (neo4j.graph.Node): a `Node` object returned from a
-            neo4j.bolt.driver.session Cypher query
+        decoded_node (DecodedNode): a neo4j `Node` from a SPOKE Cypher
+            query, decoded by `decode_n4j_object`
         spoke_curie (str): spoke 'identifier'
 
         Returns
@@ -515,11 +555,12 @@ class BasicQuery:
         result_node (models.Node): a reasoner-standard `Edge` object for
             inclusion as part of a KnowledgeGraph result
         """
-        name = n4j_object.get("pref_name")
+        node_properties = decoded_node.properties
+        name = node_properties.get("pref_name")
         if not name:
-            name = n4j_object.get("name")
+            name = node_properties.get("name")
 
-        spoke_node_labels = list(n4j_object.labels)
+        spoke_node_labels = list(decoded_node.labels)
         result_node_categories = [
             SPOKE_BIOLINK_NODE_MAPPINGS[label]
             for label
@@ -528,12 +569,12 @@ class BasicQuery:
 
         node_source = None
         result_node_attributes = []
-        for k, v in n4j_object.items():
+        for k, v in node_properties.items():
             if k == SPOKE_PROPERTY_NATIVE_SPOKE:
                 continue
             if k == SPOKE_NODE_PROPERTY_SOURCE:
                 node_source = v
-            node_attribute = self._make_result_attribute(
+            node_attribute = make_result_attribute(
                 k, v, SPOKE_GRAPH_TYPE_NODE, spoke_node_labels[0]
             )
             if node_attribute:
@@ -553,32 +594,32 @@ class BasicQuery:
         self.nodes_to_normalize.add(search_node)
         return result_node
 
-    def make_result_edge(self, n4j_object):
+    def make_result_edge(self, decoded_edge):
         """Instantiates a reasoner-standard Edge to return as part of a
         KnowledgeGraph result
 
         Parameters
         ----------
-        n4j_object (abc.<neo4j edge type>): a `relationship` object returned
-            from a neo4j.bolt.driver.session Cypher query
+        decoded_edge (DecodedEdge): a neo4j `Relationship` from a SPOKE
+            Cypher query, decoded by `decode_n4j_object`
 
         Returns
         -------
         result_edge (models.Edge): reasoner-standard Edge object for
             inclusion as a part of a KnowledgeGraph result
         """
-        edge_type = n4j_object.type
-        
+        edge_type = decoded_edge.type
+
         edge_attributes = []
         provenance_retrieval_sources = []
-        for k, v in n4j_object.items():
+        for k, v in decoded_edge.properties.items():
             if k == SPOKE_PROPERTY_NATIVE_SPOKE:
                 continue
             if k in SPOKE_PROVENANCE_FIELDS:
                 retrieval_sources = make_retrieval_sources(k, v)
                 provenance_retrieval_sources.extend(retrieval_sources)
                 continue
-            edge_attribute = self._make_result_attribute(k, v, SPOKE_GRAPH_TYPE_EDGE, edge_type)
+            edge_attribute = make_result_attribute(k, v, SPOKE_GRAPH_TYPE_EDGE, edge_type)
             if edge_attribute:
                 if isinstance(edge_attribute, list):
                     edge_attributes.extend(edge_attribute)
@@ -594,11 +635,11 @@ class BasicQuery:
 
         result_edge = models.Edge(
             attributes=attrs,
-            object=n4j_object.end_node["identifier"],
+            object=decoded_edge.object,
             predicate=predicate,
             qualifiers=qualifiers,
             sources=sources,
-            subject=n4j_object.start_node["identifier"],
+            subject=decoded_edge.subject,
         )
 
         return result_edge
@@ -631,15 +672,15 @@ class BasicQuery:
 
         return query_id
 
-    def extract_result(self, n4j_result):
+    def extract_result(self, decoded_record):
         """Constructs a reasoner-standard result from the result of a neo4j
         query
 
         Parameters
         ----------
-        n4j_result (neo4j.BoltStatementResult): result of a SPOKE Cypher
-            query
-        record_number (int): record index
+        decoded_record (tuple of DecodedNode|DecodedEdge): a record from a
+            SPOKE Cypher query, decoded by `run_query`, in the order of
+            `self.query_names`
 
         Returns
         -------
@@ -650,11 +691,16 @@ class BasicQuery:
         edge_bindings, node_bindings = {}, {}
 
         # iterate through results and add to result objects
-        for name in self.query_names:
-            if isinstance(n4j_result[name], neo4j.graph.Node):
-                spoke_curie = n4j_result[name]['identifier']
-                result_node = self.make_result_node(n4j_result[name], spoke_curie)
-                self.knowledge_graph['nodes'][spoke_curie] = result_node
+        for name, decoded_object in zip(self.query_names, decoded_record):
+            if isinstance(decoded_object, DecodedNode):
+                spoke_curie = decoded_object.identifier
+                result_node = self.knowledge_graph['nodes'].get(spoke_curie)
+                if result_node is None:
+                    self.build_cache_stats['node_misses'] += 1
+                    result_node = self.make_result_node(decoded_object, spoke_curie)
+                    self.knowledge_graph['nodes'][spoke_curie] = result_node
+                else:
+                    self.build_cache_stats['node_hits'] += 1
 
                 # get query_id for mapping this node back to a specific
                 # CURIE on a QNode's ids
@@ -666,14 +712,16 @@ class BasicQuery:
                 )
 
             else:
-                # these are ints, but we want them as strings for TRAPI spec
-                spoke_edge_id = str(n4j_result[name].id)  # TODO: is there a way to make this consistent?
+                spoke_edge_id = decoded_object.id  # TODO: is there a way to make this consistent?
                 edge_bindings[self.query_mapping['edges'][name]] = [models.EdgeBinding(
                     id=spoke_edge_id,
                     attributes=[],
                 )]
-                result_edge = self.make_result_edge(n4j_result[name])
-                self.knowledge_graph['edges'][spoke_edge_id] = result_edge
+                if spoke_edge_id in self.knowledge_graph['edges']:
+                    self.build_cache_stats['edge_hits'] += 1
+                else:
+                    self.build_cache_stats['edge_misses'] += 1
+                    self.knowledge_graph['edges'][spoke_edge_id] = self.make_result_edge(decoded_object)
                 result_analysis = models.Analysis(
                     resource_id=INFORES_IMPROVING_AGENT.infores_id,
                     edge_bindings=edge_bindings,
@@ -681,6 +729,21 @@ class BasicQuery:
 
         return models.Result(node_bindings, [result_analysis])
 
+    def get_build_cache_hit_rates(self):
+        """Returns the fraction of node and edge lookups in
+        `extract_result` that reused an already-built TRAPI object
+
+        Returns
+        -------
+        hit_rates (dict): {'nodes': float, 'edges': float}
+        """
+        hit_rates = {}
+        for graph_type, prefix in (('nodes', 'node'), ('edges', 'edge')):
+            hits = self.build_cache_stats[f'{prefix}_hits']
+            total = hits + self.build_cache_stats[f'{prefix}_misses']
+            hit_rates[graph_type] = hits / total if total else 0.0
+        return hit_rates
+
     # normalization
     def normalize(self):
         # search the node normalizer for nodes collected in result creation
@@ -708,9 +771,19 @@ class BasicQuery:
 
         self.results = new_results
 
-    def run_query(self, tx, query_string):
-        r = tx.run(query_string)
-        self.results = [self.extract_result(record) for record in r]
+    def run_query(self, tx, query_string, parameters=None):
+        """Streams the records of `query_string` and returns them as
+        tuples of DecodedNode and DecodedEdge
+
+        Records are pulled from neo4j in batches of the session's
+        `fetch_size`; no TRAPI objects are built here so that the
+        transaction is held only as long as it takes to read the results
+        """
+        result = tx.run(query_string, parameters)
+        return [
+            tuple(decode_n4j_object(n4j_object) for n4j_object in record.values(*self.query_names))
+            for record in result
+        ]
 
     # Query
     def do_query(
@@ -737,35 +810,64 @@ class BasicQuery:
         query_string = self.make_cypher_query_string()
 
         # query
-        logger.info(f'Querying SPOKE with {query_string}')
-        session.read_transaction(self.run_query, query_string)
+        logger.info(f'Querying SPOKE with {query_string} and parameters {self.query_parameters}')
+        with span(STAGE_CYPHER):
+            decoded_records = session.read_transaction(
+                self.run_query, query_string, self.query_parameters
+            )
+        self.extract_results(decoded_records)
+        return self.finish_results(session, norm_scores)
+
+    def extract_results(self, decoded_records):
+        """Builds `results` and the knowledge graph from records decoded
+        by `run_query`"""
+        with span(STAGE_EXTRACTION):
+            self.results = [self.extract_result(record) for record in decoded_records]
+        count(COUNT_RECORDS, len(decoded_records))
+        count(COUNT_NODES, len(self.knowledge_graph['nodes']))
+        count(COUNT_EDGES, len(self.knowledge_graph['edges']))
+        hit_rates = self.get_build_cache_hit_rates()
+        logger.info(
+            f'Built {self.build_cache_stats["node_misses"]} nodes and '
+            f'{self.build_cache_stats["edge_misses"]} edges from {len(decoded_records)} records; '
+            f'dedup hit rates: nodes={hit_rates["nodes"]:.2f}, edges={hit_rates["edges"]:.2f}'
+        )
 
+    def finish_results(
+        self,
+        session: neo4j.Session,
+        norm_scores: bool = True,
+    ) -> Tuple[List[models.Result], models.KnowledgeGraph, List[Optional[str]]]:
+        """Returns the extracted results normalized, annotated, scored,
+        and ranked, along with the knowledge graph; see `do_query`"""
         if not self.results:
             return self.results, self.knowledge_graph, []
 
         # normalize the knowledge_graph and results
-        self.normalize()
+        with span(STAGE_NORMALIZATION):
+            self.normalize()
 
         # query kps
         query_kps = self.query_options.get('query_kps')
         if query_kps:
             # check KPs for annotations
-            self.knowledge_graph['edges'] = annotate_edges_with_cohd(self.knowledge_graph)
+            with span(STAGE_KP_ANNOTATION):
+                self.knowledge_graph['edges'] = annotate_edges_with_cohd(self.knowledge_graph)
         #     self.results = tm.query_for_associations_in_text_miner(self.query_order, self.results)
 
-        scored_results = self.score_results(self.results)
-        if norm_scores is True:
-            scored_results = normalize_results_scores(scored_results)
-        sorted_scored_results = sorted(scored_results, key=lambda x: x.analyses[0].score, reverse=True)
+        with span(STAGE_SCORING):
+            scored_results = self.score_results(self.results, norm_scores)
+            sorted_scored_results = rank_results(scored_results)
 
         if query_kps:
             # check BigGIM
-            self.knowledge_graph['edges'] = annotate_edges_with_biggim(
-                session,
-                self.query_order,
-                self.knowledge_graph['edges'],
-                sorted_scored_results,
-                self.query_options.get("psev_context"),
-            )
+            with span(STAGE_KP_ANNOTATION):
+                self.knowledge_graph['edges'] = annotate_edges_with_biggim(
+                    session,
+                    self.query_order,
+                    self.knowledge_graph['edges'],
+                    sorted_scored_results,
+                    self.query_options.get("psev_context"),
+                )
 
         return sorted_scored_results, self.knowledge_graph, {}
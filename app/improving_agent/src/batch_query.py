@@ -0,0 +1,227 @@
+"""This module runs batches of TRAPI queries, sharing the work that the
+queries of a batch have in common
+
+The qnode CURIEs of every query are normalized in one search of the SRI
+node normalizer. Basic (i.e. non-template) queries that compile to the
+same Cypher shape are sent to neo4j together as one parameterized
+UNWIND query, and their records are split back per query by their
+batch index. The SPOKE nodes of all results are normalized in one
+search, and PSEV scores are fetched once per concept for the union of
+the nodes of the queries that use it, before each query is scored and
+returned as it would be from /query.
+"""
+from collections import defaultdict
+
+from improving_agent.__main__ import get_db
+from improving_agent.src.basic_query import (
+    BATCH_QUERY_INDEX,
+    BasicQuery,
+    decode_n4j_object,
+)
+from improving_agent.src.config import app_config
+from improving_agent.src.core import finish_query, make_error_response, prepare_query
+from improving_agent.src.instrumentation import (
+    STAGE_CYPHER,
+    STAGE_NORMALIZATION,
+    STAGE_NORMALIZE_QNODES,
+    STAGE_SCORING,
+    STAGE_SPOKE_QUERY,
+    count_query,
+    span,
+    trace_query,
+)
+from improving_agent.src.normalization.node_normalization import (
+    normalize_spoke_nodes_for_translator,
+    prefetch_qnode_normalization,
+)
+from improving_agent.src.psev import prefetch_psev_scores
+from improving_agent.util import get_evidara_logger
+
+logger = get_evidara_logger(__name__)
+
+BATCH_QUERY_MAX_QUERIES = int(app_config.BATCH_QUERY_MAX_QUERIES)
+BATCH_QUERY_UNWIND_SIZE = int(app_config.BATCH_QUERY_UNWIND_SIZE)
+
+
+def _get_query_graph_nodes(raw_json):
+    """Returns the nodes of the query graph of `raw_json`, or an empty
+    dict if it has none; malformed queries fail later, on their own"""
+    try:
+        nodes = raw_json['message']['query_graph']['nodes']
+    except (KeyError, TypeError):
+        return {}
+    return nodes if isinstance(nodes, dict) else {}
+
+
+def group_batch_queriers(queriers):
+    """Returns {(Cypher query string, n_results): [batch index]} for
+    the BasicQuery objects in `queriers`, a dict of {batch index:
+    querier}, such that each group can be run as one UNWIND query; see
+    BasicQuery.make_batch_cypher_query_string
+    """
+    groups = defaultdict(list)
+    for batch_index, querier in queriers.items():
+        groups[(querier.make_batch_cypher_query_string(), querier.n_results)].append(batch_index)
+    return groups
+
+
+def make_batch_parameters(queriers, batch_indices, n_results):
+    """Returns the parameters of the UNWIND query for `batch_indices`,
+    one row of `query_parameters` per querier"""
+    return {
+        'batch': [
+            {**queriers[batch_index].query_parameters, BATCH_QUERY_INDEX: batch_index}
+            for batch_index in batch_indices
+        ],
+        'n_results': n_results,
+    }
+
+
+def run_batch_query(tx, query_string, parameters, query_names):
+    """Streams the records of a batch query and returns them as
+    {batch index: [tuple of DecodedNode and DecodedEdge]}, as
+    BasicQuery.run_query would for each query of the batch"""
+    decoded_records = defaultdict(list)
+    for record in tx.run(query_string, parameters):
+        decoded_records[record[BATCH_QUERY_INDEX]].append(
+            tuple(decode_n4j_object(n4j_object) for n4j_object in record.values(*query_names))
+        )
+    return decoded_records
+
+
+def _prefetch_result_normalization(queriers):
+    """Searches the node normalizer once for the result nodes of all
+    `queriers` so that each finds them cached when it is normalized"""
+    nodes_to_normalize = set()
+    for querier in queriers:
+        nodes_to_normalize.update(querier.nodes_to_normalize)
+    if nodes_to_normalize:
+        normalize_spoke_nodes_for_translator(nodes_to_normalize)
+
+
+def _prefetch_result_psev_scores(queriers):
+    """Fetches the PSEV scores of the result nodes of all `queriers`,
+    for each concept those of the queries that use it"""
+    identifiers_by_concept = defaultdict(set)
+    for querier in queriers:
+        psev_contexts = querier.query_options.get('psev_context')
+        if not psev_contexts or not querier.results:
+            continue
+        if isinstance(psev_contexts, str):
+            psev_contexts = [psev_contexts]
+        for concept in psev_contexts:
+            identifiers_by_concept[concept].update(querier.result_nodes_spoke_identifiers)
+    if identifiers_by_concept:
+        prefetch_psev_scores(identifiers_by_concept)
+
+
+def process_batch_query(raw_queries):
+    """Returns the TRAPI Response, or a (Response, HTTP status code)
+    tuple on error, for each query in `raw_queries`, in order
+
+    An error in one query, including in a neo4j query it shares with
+    others, fails only the queries it affects.
+    """
+    logger.info(f'Got batch of {len(raw_queries)} queries...')
+    responses = [None] * len(raw_queries)
+
+    with span(STAGE_NORMALIZE_QNODES):
+        prefetch_qnode_normalization(_get_query_graph_nodes(raw_json) for raw_json in raw_queries)
+
+    prepared_queries = {}
+    for batch_index, raw_json in enumerate(raw_queries):
+        try:
+            prepared_query = prepare_query(raw_json)
+        except Exception as e:
+            responses[batch_index] = make_error_response(e)
+            continue
+        if prepared_query.response is not None:
+            responses[batch_index] = prepared_query.response
+        else:
+            prepared_queries[batch_index] = prepared_query
+
+    # template queries run several dependent searches, so they're run
+    # one by one, as are any basic queries with inlined identifiers
+    batched_queriers, single_queriers = {}, {}
+    for batch_index, prepared_query in prepared_queries.items():
+        querier = prepared_query.querier
+        if type(querier) is not BasicQuery or not querier.parameterize_cypher:
+            single_queriers[batch_index] = querier
+            continue
+        try:
+            querier.make_query_order()
+        except Exception as e:
+            responses[batch_index] = make_error_response(e)
+            continue
+        batched_queriers[batch_index] = querier
+
+    with get_db() as session:
+        extracted = []
+        for (query_string, n_results), batch_indices in group_batch_queriers(batched_queriers).items():
+            query_names = batched_queriers[batch_indices[0]].query_names
+            for i in range(0, len(batch_indices), BATCH_QUERY_UNWIND_SIZE):
+                chunk = batch_indices[i:i + BATCH_QUERY_UNWIND_SIZE]
+                parameters = make_batch_parameters(batched_queriers, chunk, n_results)
+                logger.info(f'Querying SPOKE for {len(chunk)} queries with {query_string}')
+                try:
+                    with span(STAGE_CYPHER):
+                        decoded_records = session.read_transaction(
+                            run_batch_query, query_string, parameters, query_names
+                        )
+                except Exception as e:
+                    for batch_index in chunk:
+                        responses[batch_index] = make_error_response(e)
+                    continue
+                for batch_index in chunk:
+                    try:
+                        batched_queriers[batch_index].extract_results(decoded_records.get(batch_index, []))
+                    except Exception as e:
+                        responses[batch_index] = make_error_response(e)
+                        continue
+                    extracted.append(batch_index)
+
+        extracted_queriers = [batched_queriers[batch_index] for batch_index in extracted]
+        with span(STAGE_NORMALIZATION):
+            _prefetch_result_normalization(extracted_queriers)
+        with span(STAGE_SCORING):
+            _prefetch_result_psev_scores(extracted_queriers)
+
+        for batch_index in extracted:
+            try:
+                results, knowledge_graph, aux_graphs = batched_queriers[batch_index].finish_results(session)
+                responses[batch_index] = finish_query(
+                    prepared_queries[batch_index], results, knowledge_graph, aux_graphs
+                )
+            except Exception as e:
+                responses[batch_index] = make_error_response(e)
+
+        for batch_index, querier in single_queriers.items():
+            try:
+                with span(STAGE_SPOKE_QUERY):
+                    results, knowledge_graph, aux_graphs = querier.do_query(session)
+                responses[batch_index] = finish_query(
+                    prepared_queries[batch_index], results, knowledge_graph, aux_graphs
+                )
+            except Exception as e:
+                responses[batch_index] = make_error_response(e)
+
+    return responses
+
+
+def try_batch_query(raw_queries):
+    """Returns the responses to `raw_queries`, as `process_batch_query`,
+    and records the batch's per-stage timings and each query's status
+    """
+    with trace_query() as trace:
+        responses = process_batch_query(raw_queries)
+    status_codes = [response[1] if isinstance(response, tuple) else 200 for response in responses]
+    for status_code in status_codes:
+        count_query(status_code)
+    durations = ', '.join(
+        f'{stage}={duration * 1000:.1f}ms' for stage, duration in trace.get_stage_durations().items()
+    )
+    logger.info(
+        f'Batch of {len(responses)} queries finished with statuses {sorted(set(status_codes))}; '
+        f'stage timings: {durations}'
+    )
+    return responses
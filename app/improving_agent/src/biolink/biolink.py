@@ -1,9 +1,14 @@
 from functools import cache
 
-from bmt.toolkit import Toolkit
-
 from improving_agent.src.config import app_config
+from improving_agent.util import get_evidara_logger
 
+from .snapshot import (
+    BiolinkSnapshot,
+    build_biolink_snapshot,
+    get_vendored_snapshot_path,
+    make_toolkit,
+)
 from .spoke_biolink_constants import (
     BIOLINK_ASSOCIATION_RELATED_TO,
     BIOLINK_ENTITY_NAMED_THING,
@@ -11,7 +16,7 @@ from .spoke_biolink_constants import (
     BIOLINK_SPOKE_NODE_MAPPINGS,
 )
 
-BMT = Toolkit(f'https://raw.githubusercontent.com/biolink/biolink-model/v{app_config.BIOLINK_VERSION}/biolink-model.yaml')
+logger = get_evidara_logger(__name__)
 
 EDGE = 'edge'
 NODE = 'node'
@@ -22,6 +27,29 @@ BIOLINK_SPOKE_MAPPINGS = {
 }
 
 
+def _load_biolink_snapshot():
+    """Returns the BiolinkSnapshot for BIOLINK_VERSION, from the copy
+    committed under src/biolink/data or in BIOLINK_SNAPSHOT_CACHE_PATH, or else
+    built from the model downloaded by the biolink model toolkit"""
+    version = app_config.BIOLINK_VERSION
+    cache_path = app_config.BIOLINK_SNAPSHOT_CACHE_PATH
+    for path in (get_vendored_snapshot_path(version), cache_path):
+        if path and (snapshot := BiolinkSnapshot.from_file(path, version)):
+            return snapshot
+
+    logger.warning(f'No biolink {version} snapshot was found; building one from the biolink model')
+    snapshot = build_biolink_snapshot(make_toolkit(version), version)
+    if cache_path:
+        try:
+            snapshot.write(cache_path)
+        except OSError as e:
+            logger.warning(f'Could not write the biolink snapshot to {cache_path}: {e}')
+    return snapshot
+
+
+BIOLINK_SNAPSHOT = _load_biolink_snapshot()
+
+
 def _format_uri(element_name, entity_type):
     if entity_type == NODE:
         return f'biolink:{element_name.title().replace(" ", "")}'
@@ -37,10 +65,8 @@ def _get_entity_descendents(entity, entity_type, mapped_only=True):
         )
 
     _supported_descendants = set()
-    search_entities = BMT.get_descendants(entity)
-    for descendant in search_entities:
-        biolink_element = BMT.get_element(descendant)
-        element_name = _format_uri(biolink_element.name, entity_type)
+    for descendant in BIOLINK_SNAPSHOT.get_descendants(entity):
+        element_name = _format_uri(descendant, entity_type)
         if mapped_only is True:
             if element_name in mappings:
                 _supported_descendants.add(element_name)
@@ -85,7 +111,21 @@ def get_supported_biolink_descendants(
 def get_supported_inverse_predicates(entities):
     inverses = set()
     for entity in entities:
-        if inverse := BMT.get_element(entity).inverse:
+        if inverse := BIOLINK_SNAPSHOT.get_inverse(entity):
             inverses.add(inverse)
 
     return get_supported_biolink_descendants(inverses, EDGE)
+
+
+def _precompute_mapped_descendants():
+    """Caches the supported descendants of every entity that is mapped
+    to SPOKE, i.e. the categories and predicates most often queried"""
+    for entity_type, mappings in BIOLINK_SPOKE_MAPPINGS.items():
+        for entity in mappings:
+            try:
+                _get_entity_descendents(entity, entity_type)
+            except ValueError:
+                logger.warning(f'{entity} is mapped to SPOKE but not in biolink {app_config.BIOLINK_VERSION}')
+
+
+_precompute_mapped_descendants()
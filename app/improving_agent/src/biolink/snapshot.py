@@ -0,0 +1,158 @@
+"""This module provides a compact snapshot of the biolink model, i.e.
+the descendants and inverse of each element, so that workers can map
+queries to SPOKE without downloading and parsing the whole model
+
+The snapshot for BIOLINK_VERSION is committed under src/biolink/data.
+For a version without one, it is built with the biolink model toolkit
+and written to BIOLINK_SNAPSHOT_CACHE_PATH the first time it is needed.
+
+Usage (from app/), to (re)build the vendored snapshot:
+    python -m improving_agent.src.biolink.snapshot [--output PATH]
+"""
+import argparse
+import json
+import os
+
+from improving_agent.src.config import app_config
+
+BIOLINK_MODEL_URL = 'https://raw.githubusercontent.com/biolink/biolink-model/v{version}/biolink-model.yaml'
+SNAPSHOT_FORMAT = 1
+VENDORED_SNAPSHOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def get_vendored_snapshot_path(biolink_version):
+    return os.path.join(VENDORED_SNAPSHOT_DIR, f'biolink_snapshot_{biolink_version}.json')
+
+
+def make_toolkit(biolink_version):
+    """Returns a biolink model toolkit, which downloads and parses the
+    whole model; bmt is imported here since importing it is slow too"""
+    from bmt.toolkit import Toolkit
+    return Toolkit(BIOLINK_MODEL_URL.format(version=biolink_version))
+
+
+def _normalize_name(name):
+    """Returns `name` as the biolink model toolkit compares names as a
+    last resort, e.g. 'biolink:SmallMolecule' -> 'smallmolecule'"""
+    if name.startswith('biolink:'):
+        name = name[len('biolink:'):]
+    return name.lower().replace(' ', '').replace('_', '')
+
+
+def _get_lookup_names(element):
+    """Returns the forms in which queries refer to `element`"""
+    names = {element.name, element.name.replace(' ', '_'), f'biolink:{element.name.replace(" ", "_")}'}
+    for uri in (getattr(element, 'class_uri', None), getattr(element, 'slot_uri', None)):
+        if uri and uri.startswith('biolink:'):
+            names.add(uri)
+    return names
+
+
+class BiolinkSnapshot:
+    """The descendants and inverses of biolink model elements
+
+    Parameters
+    ----------
+    biolink_version (str): the version of the model this was built from
+    descendants (dict): element name -> names of its descendants,
+        including itself and mixin descendants
+    inverses (dict): element name -> name of its inverse, for
+        predicates that have one
+    lookup (dict): name, alias, or CURIE -> element name
+    """
+    def __init__(self, biolink_version, descendants, inverses, lookup):
+        self.biolink_version = biolink_version
+        self.descendants = descendants
+        self.inverses = inverses
+        self.lookup = lookup
+        self._normalized_lookup = {}
+        for name in descendants:
+            self._normalized_lookup.setdefault(_normalize_name(name), name)
+
+    def get_element_name(self, entity):
+        """Returns the name of the element that `entity` refers to, or
+        raises a ValueError, as the biolink model toolkit does"""
+        name = self.lookup.get(entity)
+        if name is None:
+            name = self._normalized_lookup.get(_normalize_name(entity))
+        if name is None:
+            raise ValueError(f'{entity} is not a valid biolink component')
+        return name
+
+    def get_descendants(self, entity):
+        return self.descendants[self.get_element_name(entity)]
+
+    def get_inverse(self, entity):
+        return self.inverses.get(self.get_element_name(entity))
+
+    def to_dict(self):
+        return {
+            'format': SNAPSHOT_FORMAT,
+            'biolink_version': self.biolink_version,
+            'descendants': self.descendants,
+            'inverses': self.inverses,
+            'lookup': self.lookup,
+        }
+
+    def write(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # written to a temporary file and renamed so that workers
+        # starting together never read a partial snapshot
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'), sort_keys=True)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def from_file(cls, path, biolink_version):
+        """Returns the snapshot at `path`, or None if it is missing or
+        was built for another biolink version"""
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('format') != SNAPSHOT_FORMAT or data.get('biolink_version') != biolink_version:
+            return None
+        return cls(biolink_version, data['descendants'], data['inverses'], data['lookup'])
+
+
+def build_biolink_snapshot(toolkit, biolink_version):
+    """Returns a BiolinkSnapshot of every element of the model loaded by
+    `toolkit`, a bmt.Toolkit"""
+    descendants = {}
+    inverses = {}
+    lookup = {}
+    for element_name in toolkit.get_all_elements():
+        element = toolkit.get_element(element_name)
+        if element is None or element.name in descendants:
+            continue
+        descendants[element.name] = [
+            toolkit.get_element(descendant).name for descendant in toolkit.get_descendants(element.name)
+        ]
+        if inverse := getattr(element, 'inverse', None):
+            inverses[element.name] = inverse
+        for name in _get_lookup_names(element):
+            # resolved as the toolkit would, since names can collide
+            resolved = toolkit.get_element(name)
+            if resolved is not None:
+                lookup[name] = resolved.name
+    return BiolinkSnapshot(biolink_version, descendants, inverses, lookup)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', default=get_vendored_snapshot_path(app_config.BIOLINK_VERSION))
+    args = parser.parse_args()
+
+    snapshot = build_biolink_snapshot(
+        make_toolkit(app_config.BIOLINK_VERSION), app_config.BIOLINK_VERSION
+    )
+    snapshot.write(args.output)
+    print(f'Wrote a snapshot of {len(snapshot.descendants)} biolink elements to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
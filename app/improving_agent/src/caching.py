@@ -0,0 +1,281 @@
+"""This module provides bounded cache backends for responses from
+external services, e.g. the SRI node normalizer
+
+Backends share a small dict-like interface (`get_many`, `set_many`) so
+that clients can be handed an in-memory cache, an on-disk cache shared
+across uwsgi workers, or a `TieredCache` of both. `get_many_with_ttls`
+also returns the seconds each entry has left, which `set_many` accepts,
+so that an entry copied between backends expires when the original does.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from improving_agent.util import get_evidara_logger
+
+logger = get_evidara_logger(__name__)
+
+SQLITE_MAX_VARIABLES = 500
+
+
+def _get_expiry(cache, key, value, now, ttls=None):
+    """Returns when `value` expires if cached for `key` at `now` by
+    `cache`, i.e. after its ttl, or negative_ttl for None, or sooner if
+    `ttls` gives the entry fewer seconds left"""
+    ttl = cache.negative_ttl if value is None else cache.ttl
+    ttl_left = ttls.get(key) if ttls is not None else None
+    if ttl_left is not None and (ttl is None or ttl_left < ttl):
+        ttl = ttl_left
+    if ttl is None:
+        return None
+    return now + ttl
+
+
+class LruTtlCache:
+    """A thread-safe, bounded, in-memory LRU cache
+
+    Parameters
+    ----------
+    max_size (int): maximum number of entries; the least recently used
+        entry is evicted when full
+    ttl (float or None): seconds that non-None values are valid for, or
+        None to keep them until evicted
+    negative_ttl (float or None): seconds that None values (e.g. failed
+        lookups) are valid for, or None to keep them until evicted
+    """
+    def __init__(self, max_size=100_000, ttl=None, negative_ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stats = Counter()
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_many(self, keys):
+        """Returns a dict of the unexpired entries for `keys`; keys that
+        are not cached are absent from the result"""
+        return self.get_many_with_ttls(keys)[0]
+
+    def get_many_with_ttls(self, keys):
+        """Returns the unexpired entries for `keys`, as by `get_many`,
+        and a dict of the seconds each has left, None if it never
+        expires"""
+        found, ttls = {}, {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is None:
+                    self.stats['misses'] += 1
+                    continue
+                value, expires_at = entry
+                if expires_at is not None and expires_at <= now:
+                    del self._data[key]
+                    self.stats['expired'] += 1
+                    self.stats['misses'] += 1
+                    continue
+                self._data.move_to_end(key)
+                self.stats['hits'] += 1
+                found[key] = value
+                ttls[key] = None if expires_at is None else expires_at - now
+        return found, ttls
+
+    def set_many(self, mapping, ttls=None):
+        """Caches the entries of `mapping`; `ttls` may give the seconds
+        an entry has left, e.g. in the cache it was read from, if that
+        is less than this cache's ttl"""
+        now = time.monotonic()
+        with self._lock:
+            for key, value in mapping.items():
+                self._data[key] = (value, _get_expiry(self, key, value, now, ttls))
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class SqliteCache:
+    """A key-value cache of JSON-serializable values in a SQLite file
+    that can be shared by multiple processes
+
+    Connections are opened lazily, one per thread. Errors reading or
+    writing the database are logged and treated as cache misses so that
+    a bad cache file never fails a query.
+
+    Expired rows are deleted, and the oldest written rows beyond
+    `max_rows`, by writes at most every `purge_interval` seconds, so
+    the table may briefly exceed `max_rows` between purges.
+
+    Parameters
+    ----------
+    path (str): location of the SQLite file; parent directories are
+        created if necessary
+    table (str): name of the table holding this cache's entries
+    ttl (float or None): seconds that non-None values are valid for
+    negative_ttl (float or None): seconds that None values are valid for
+    max_rows (int or None): number of rows kept by purges, or None to
+        keep all unexpired rows
+    purge_interval (float): seconds between purges by writes
+    raw (bool): if True, values are strings stored as they are, e.g.
+        JSON already serialized by the caller, rather than JSON-encoded
+    """
+    def __init__(
+        self,
+        path,
+        table='cache',
+        ttl=None,
+        negative_ttl=None,
+        max_rows=None,
+        purge_interval=60.0,
+        raw=False,
+    ):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_rows = max_rows
+        self.purge_interval = purge_interval
+        self.raw = raw
+        self.stats = Counter()
+        self._last_purged = float('-inf')
+        self._local = threading.local()
+
+    def _get_connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.table} '
+                '(key TEXT PRIMARY KEY, value TEXT, expires_at REAL)'
+            )
+            connection.execute(
+                f'CREATE INDEX IF NOT EXISTS {self.table}_expires_at ON {self.table} (expires_at)'
+            )
+            self._local.connection = connection
+        return connection
+
+    def get_many(self, keys):
+        """Returns a dict of the unexpired entries for `keys`; keys that
+        are not cached are absent from the result"""
+        return self.get_many_with_ttls(keys)[0]
+
+    def get_many_with_ttls(self, keys):
+        """Returns the unexpired entries for `keys`, as by `get_many`,
+        and a dict of the seconds each has left, None if it never
+        expires"""
+        keys = list(keys)
+        found, ttls = {}, {}
+        now = time.time()
+        try:
+            connection = self._get_connection()
+            for i in range(0, len(keys), SQLITE_MAX_VARIABLES):
+                chunk = keys[i:i + SQLITE_MAX_VARIABLES]
+                rows = connection.execute(
+                    f'SELECT key, value, expires_at FROM {self.table} '
+                    f'WHERE key IN ({",".join("?" * len(chunk))})',
+                    chunk,
+                )
+                for key, value, expires_at in rows:
+                    if expires_at is not None and expires_at <= now:
+                        self.stats['expired'] += 1
+                        continue
+                    found[key] = value if self.raw else json.loads(value)
+                    ttls[key] = None if expires_at is None else expires_at - now
+        except sqlite3.Error as e:
+            logger.warning(f'Failed to read from cache at {self.path}: {e}')
+        self.stats['hits'] += len(found)
+        self.stats['misses'] += len(keys) - len(found)
+        return found, ttls
+
+    def set_many(self, mapping, ttls=None):
+        """Caches the entries of `mapping`; `ttls` may give the seconds
+        an entry has left, e.g. in the cache it was read from, if that
+        is less than this cache's ttl"""
+        now = time.time()
+        rows = [
+            (key, value if self.raw else json.dumps(value), _get_expiry(self, key, value, now, ttls))
+            for key, value in mapping.items()
+        ]
+        try:
+            self._get_connection().executemany(
+                f'INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)',
+                rows,
+            )
+        except sqlite3.Error as e:
+            logger.warning(f'Failed to write to cache at {self.path}: {e}')
+            return
+        if time.monotonic() - self._last_purged >= self.purge_interval:
+            self.purge()
+
+    def purge(self):
+        """Deletes expired rows and, if there are more than `max_rows`,
+        the oldest written rows. Rows are rewritten on every set, so
+        their rowids are in the order they were last written"""
+        self._last_purged = time.monotonic()
+        try:
+            connection = self._get_connection()
+            n_deleted = connection.execute(
+                f'DELETE FROM {self.table} WHERE expires_at <= ?', (time.time(),)
+            ).rowcount
+            if self.max_rows is not None:
+                n_deleted += connection.execute(
+                    f'DELETE FROM {self.table} WHERE rowid <= '
+                    f'(SELECT rowid FROM {self.table} ORDER BY rowid DESC LIMIT 1 OFFSET ?)',
+                    (self.max_rows,),
+                ).rowcount
+        except sqlite3.Error as e:
+            logger.warning(f'Failed to purge cache at {self.path}: {e}')
+            return
+        self.stats['purged'] += n_deleted
+
+    def clear(self):
+        try:
+            self._get_connection().execute(f'DELETE FROM {self.table}')
+        except sqlite3.Error as e:
+            logger.warning(f'Failed to clear cache at {self.path}: {e}')
+
+
+class TieredCache:
+    """Checks each cache in `tiers` in order, e.g. a per-process
+    LruTtlCache in front of a SqliteCache shared by all workers, and
+    back-fills faster tiers with entries found in slower ones, which
+    expire there when they do in the slower tier"""
+    def __init__(self, *tiers):
+        self.tiers = tiers
+
+    def get_many(self, keys):
+        missing = list(keys)
+        found = {}
+        for i, tier in enumerate(self.tiers):
+            if not missing:
+                break
+            tier_found, tier_ttls = tier.get_many_with_ttls(missing)
+            if not tier_found:
+                continue
+            for faster_tier in self.tiers[:i]:
+                faster_tier.set_many(tier_found, tier_ttls)
+            found.update(tier_found)
+            missing = [key for key in missing if key not in tier_found]
+        return found
+
+    def set_many(self, mapping, ttls=None):
+        for tier in self.tiers:
+            tier.set_many(mapping, ttls)
+
+    def clear(self):
+        for tier in self.tiers:
+            tier.clear()
@@ -1,6 +1,7 @@
 # These functions should contain the core logic of evidARA-SPOKE
 # interactions
 from datetime import datetime
+from typing import Any, NamedTuple, Optional
 
 from werkzeug.exceptions import BadRequest, NotImplemented
 
@@ -21,9 +22,23 @@ from improving_agent.models import Message, Query, QueryGraph, Response
 from improving_agent.models import Schema1 as Workflow
 from improving_agent.src.basic_query import BasicQuery
 from improving_agent.src.config import app_config
+from improving_agent.src.instrumentation import (
+    COUNT_RESULTS,
+    STAGE_DESERIALIZATION,
+    STAGE_NORMALIZE_QEDGES,
+    STAGE_NORMALIZE_QNODES,
+    STAGE_PSEV_CONCEPTS,
+    STAGE_SPOKE_QUERY,
+    STAGE_TEMPLATE_MATCHING,
+    count,
+    count_query,
+    span,
+    trace_query,
+)
 from improving_agent.src.normalization.edge_normalization import validate_normalize_qedges
 from improving_agent.src.normalization.node_normalization import validate_normalize_qnodes
 from improving_agent.src.psev import get_psev_concepts
+from improving_agent.src.query_result_cache import QUERY_RESULT_CACHE
 from improving_agent.src.template_queries import match_template_queries
 from improving_agent.src.workflows import SUPPORTED_WORKFLOWS
 from improving_agent.util import get_evidara_logger
@@ -81,6 +96,78 @@ def deserialize_query(raw_json):
     return query, query_options
 
 
+class PreparedQuery(NamedTuple):
+    """A query that has been deserialized and normalized for SPOKE,
+    holding either the querier that will search SPOKE for it or, if it
+    was cached, its response"""
+    query: Query
+    query_graph: QueryGraph
+    querier: Any = None
+    cache_key: Optional[str] = None
+    response: Optional[Response] = None
+
+
+def prepare_query(raw_json):
+    """Returns a PreparedQuery for `raw_json`, a TRAPI query
+
+    As we unpack queries here and elsewhere, note that we never use
+    the classmethod `from_dict` because we've added some
+    openAPI-incompatible classes that prevent these from deserializing
+    using openAPI tools
+    """
+    with span(STAGE_DESERIALIZATION):
+        query, query_options = deserialize_query(raw_json)
+        try:
+            query_message = Message(**query.message)
+            qedges = query_message.query_graph['edges']
+            qnodes = query_message.query_graph['nodes']
+            query_graph = QueryGraph(nodes=qnodes, edges=qedges)
+        except (KeyError, TypeError):
+            raise BadRequest('Could not deserialize query_message or query_graph')
+
+    with span(STAGE_NORMALIZE_QNODES):
+        qnodes = validate_normalize_qnodes(query_graph.nodes)
+    with span(STAGE_NORMALIZE_QEDGES):
+        qedges = validate_normalize_qedges(query_graph)
+
+    cache_key = None
+    if QUERY_RESULT_CACHE is not None and not raw_json.get('bypass_cache'):
+        cache_key = QUERY_RESULT_CACHE.make_key(
+            qnodes, qedges, query.max_results, query.psev_context, query.query_kps
+        )
+        cached_message = QUERY_RESULT_CACHE.get(cache_key)
+        if cached_message is not None:
+            logger.info(f'Returning cached results for query {cache_key}')
+            response_message = Message(**{**cached_message, 'query_graph': query_graph})
+            return PreparedQuery(
+                query, query_graph, response=_make_success_response(response_message, query)
+            )
+
+    with span(STAGE_PSEV_CONCEPTS):
+        psev_contexts = get_psev_concepts(qnodes)
+    query_options['psev_context'] = psev_contexts
+
+    with span(STAGE_TEMPLATE_MATCHING):
+        template_query = match_template_queries(qedges, qnodes)
+    if template_query:
+        # decrease max result count
+        max_results = query.max_results if query.max_results < 300 else 300
+        querier = template_query(qnodes, qedges, query_options, max_results)
+    else:
+        querier = BasicQuery(qnodes, qedges, query_options, query.max_results)
+    return PreparedQuery(query, query_graph, querier, cache_key)
+
+
+def finish_query(prepared_query, results, knowledge_graph, aux_graphs):
+    """Returns the TRAPI Response for the results of `prepared_query`,
+    a PreparedQuery, caching them if it is cacheable"""
+    count(COUNT_RESULTS, len(results))
+    response_message = Message(results, prepared_query.query_graph, knowledge_graph, aux_graphs)
+    if prepared_query.cache_key is not None:
+        QUERY_RESULT_CACHE.set(prepared_query.cache_key, response_message)
+    return _make_success_response(response_message, prepared_query.query)
+
+
 def process_query(raw_json):
     """Maps query nodes to SPOKE equivalents
 
@@ -96,64 +183,83 @@ def process_query(raw_json):
         returns str message on error
     """
     logger.info(f"Got query {raw_json}...")
-    # as we unpack queries here and elsewhere, note that we never
-    # use the classmethod `from_dict` because we've added some
-    # openAPI-incompatible classes that prevent these from
-    # deserializing using openAPI tools
-    query, query_options = deserialize_query(raw_json)
-    try:
-        query_message = Message(**query.message)
-        qedges = query_message.query_graph['edges']
-        qnodes = query_message.query_graph['nodes']
-        query_graph = QueryGraph(nodes=qnodes, edges=qedges)
-    except (KeyError, TypeError):
-        raise BadRequest('Could not deserialize query_message or query_graph')
-
-    qnodes = validate_normalize_qnodes(query_graph.nodes)
-    qedges = validate_normalize_qedges(query_graph)
-
-    psev_contexts = get_psev_concepts(qnodes)
-    query_options['psev_context'] = psev_contexts
+    prepared_query = prepare_query(raw_json)
+    if prepared_query.response is not None:
+        return prepared_query.response
 
     # now query SPOKE
     with get_db() as session:
-        template_query = match_template_queries(qedges, qnodes)
-        if template_query:
-            # decrease max result count
-            max_results = query.max_results if query.max_results < 300 else 300
-            querier = template_query(qnodes, qedges, query_options, max_results)
-        else:
-            querier = BasicQuery(qnodes, qedges, query_options, query.max_results)
-        results, knowledge_graph, aux_graphs = querier.do_query(session)
-        response_message = Message(results, query_graph, knowledge_graph, aux_graphs)
-        success_description = (
-            f'Success. Returning {len(results)} results. Note: imProving '
-            "Agent's result scores are contextual within a set of results "
-            'and should not be compared with scores from other queries.'
-        )
-        response = Response(
-            response_message,
-            description=success_description,
-            workflow=query.workflow,
-            schema_version=app_config.TRAPI_VERSION,
-            biolink_version=app_config.BIOLINK_VERSION,
-            logs=[],
-        )
-        logger.info(success_description)
+        with span(STAGE_SPOKE_QUERY):
+            results, knowledge_graph, aux_graphs = prepared_query.querier.do_query(session)
+    return finish_query(prepared_query, results, knowledge_graph, aux_graphs)
+
+
+def _make_success_response(response_message, query):
+    success_description = (
+        f'Success. Returning {len(response_message.results or [])} results. Note: imProving '
+        "Agent's result scores are contextual within a set of results "
+        'and should not be compared with scores from other queries.'
+    )
+    response = Response(
+        response_message,
+        description=success_description,
+        workflow=query.workflow,
+        schema_version=app_config.TRAPI_VERSION,
+        biolink_version=app_config.BIOLINK_VERSION,
+        logs=[],
+    )
+    logger.info(success_description)
     return response
 
 
+def _should_attach_trace(query):
+    if app_config.TRACE_LOGS_IN_RESPONSE.lower() == 'true':
+        return True
+    return isinstance(query, dict) and query.get('log_level') == 'DEBUG'
+
+
 def try_query(query):
+    """Returns the TRAPI Response for `query`, or a (Response, HTTP
+    status code) tuple if it could not be processed, and records the
+    query's per-stage timings. These are attached to the Response logs
+    if the query's log_level is DEBUG or TRACE_LOGS_IN_RESPONSE is set
+    """
+    with trace_query() as trace:
+        response = _try_query(query)
+    if isinstance(response, tuple):
+        trapi_response, status_code = response
+    else:
+        trapi_response, status_code = response, 200
+    count_query(status_code)
+    durations = ', '.join(
+        f'{stage}={duration * 1000:.1f}ms' for stage, duration in trace.get_stage_durations().items()
+    )
+    logger.info(f'Query finished with status {status_code}; stage timings: {durations}')
+    if _should_attach_trace(query):
+        trapi_response.logs = (trapi_response.logs or []) + trace.to_log_entries()
+    return response
+
+
+def _try_query(query):
     try:
         return process_query(query)
-    except (
+    except Exception as e:
+        return make_error_response(e)
+
+
+def make_error_response(e):
+    """Returns a (Response, HTTP status code) tuple describing `e`, an
+    error raised while processing a query; unexpected errors are logged
+    with their traceback, so this should be called while handling `e`
+    """
+    if isinstance(e, (
         AmbiguousPredicateMappingError,
         BadRequest,
         MissingComponentError,
         UnsupportedConstraint,
         UnsupportedKnowledgeType,
         TemplateQuerySpecError
-    ) as e:
+    )):
         return Response(
             message=Message(),
             status="Bad Request",
@@ -162,12 +268,12 @@ def try_query(query):
             biolink_version=app_config.BIOLINK_VERSION,
             logs=[],
         ), 400
-    except (
+    if isinstance(e, (
         NonLinearQueryError,
         UnmatchedIdentifierError,
         UnsupportedQualifier,
         UnsupportedTypeError,
-    ) as e:
+    )):
         return Response(
             message=Message(),
             status="Query unprocessable",
@@ -176,7 +282,7 @@ def try_query(query):
             biolink_version=app_config.BIOLINK_VERSION,
             logs=[],
         ), 200
-    except (NotImplemented, UnsupportedSetInterpretation) as e:
+    if isinstance(e, (NotImplemented, UnsupportedSetInterpretation)):
         return Response(
             message=Message(),
             status="Not Implemented",
@@ -185,20 +291,20 @@ def try_query(query):
             biolink_version=app_config.BIOLINK_VERSION,
             logs=[],
         ), NotImplemented.code
-    except Exception as e:
-        logger.exception(str(e))
-        timestamp = datetime.now().isoformat()
-        error_description = (
-            'Something went wrong. If this error is reproducible using the same '
-            'query configuration, please post an issue in the imProving Agent GitHub '
-            'page https://github.com/suihuanglab/improving-agent '
-            f'timestamp: {timestamp}'
-        )
-        return Response(
-            message=Message(),
-            status="Server Error",
-            description=error_description,
-            schema_version=app_config.TRAPI_VERSION,
-            biolink_version=app_config.BIOLINK_VERSION,
-            logs=[],
-        ), 500
+
+    logger.exception(str(e))
+    timestamp = datetime.now().isoformat()
+    error_description = (
+        'Something went wrong. If this error is reproducible using the same '
+        'query configuration, please post an issue in the imProving Agent GitHub '
+        'page https://github.com/suihuanglab/improving-agent '
+        f'timestamp: {timestamp}'
+    )
+    return Response(
+        message=Message(),
+        status="Server Error",
+        description=error_description,
+        schema_version=app_config.TRAPI_VERSION,
+        biolink_version=app_config.BIOLINK_VERSION,
+        logs=[],
+    ), 500
@@ -0,0 +1,131 @@
+"""This module provides the shared outbound HTTP layer for the clients
+of external services, e.g. PSEV, the SRI node normalizer, COHD, and
+BigGIM
+
+Each service gets one lazily-created requests.Session with a keep-alive
+connection pool sized for the service, a default timeout, and a retry
+budget for transient failures. Sessions are safe to share between
+threads. Tests can inject their own with `set_session`.
+"""
+import threading
+from typing import NamedTuple, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from improving_agent.src.config import app_config
+from improving_agent.src.instrumentation import count_outbound_request
+
+SERVICE_ASYNCQUERY_CALLBACK = 'asyncquery_callback'
+SERVICE_BIGGIM = 'biggim'
+SERVICE_COHD = 'cohd'
+SERVICE_PSEV = 'psev'
+SERVICE_SRI_NODE_NORMALIZER = 'sri_node_normalizer'
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class ServiceHttpConfig(NamedTuple):
+    pool_size: int
+    timeout: Tuple[float, float]  # (connect, read) seconds
+    retries: int
+    backoff_factor: float
+    retry_methods: frozenset = frozenset(['GET'])
+
+
+SERVICE_HTTP_CONFIGS = {
+    # callbacks are retried, and logged, by the async job engine
+    SERVICE_ASYNCQUERY_CALLBACK: ServiceHttpConfig(
+        pool_size=int(app_config.ASYNCQUERY_MAX_WORKERS),
+        timeout=(3.05, 60),
+        retries=0,
+        backoff_factor=0,
+    ),
+    SERVICE_BIGGIM: ServiceHttpConfig(
+        pool_size=2,
+        timeout=(3.05, 60),
+        retries=2,
+        backoff_factor=1,
+    ),
+    SERVICE_COHD: ServiceHttpConfig(
+        pool_size=4,
+        timeout=(3.05, 30),
+        retries=2,
+        backoff_factor=0.5,
+    ),
+    # PSEV and node-normalization POSTs are lookups, so they can be retried
+    SERVICE_PSEV: ServiceHttpConfig(
+        pool_size=int(app_config.PSEV_MAX_CONCURRENT_REQUESTS),
+        timeout=(3.05, 30),
+        retries=3,
+        backoff_factor=0.25,
+        retry_methods=frozenset(['GET', 'POST']),
+    ),
+    SERVICE_SRI_NODE_NORMALIZER: ServiceHttpConfig(
+        pool_size=int(app_config.SRI_NN_MAX_CONCURRENT_REQUESTS),
+        timeout=(3.05, 60),
+        retries=3,
+        backoff_factor=0.5,
+        retry_methods=frozenset(['GET', 'POST']),
+    ),
+}
+
+
+class ServiceSession(requests.Session):
+    """A requests.Session that applies a default timeout to every
+    request that doesn't specify one and counts requests to `service`"""
+    def __init__(self, timeout, service=None):
+        super().__init__()
+        self.timeout = timeout
+        self.service = service
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        if self.service:
+            count_outbound_request(self.service)
+        return super().request(method, url, **kwargs)
+
+
+def make_session(config: ServiceHttpConfig, service: Optional[str] = None) -> ServiceSession:
+    """Returns a ServiceSession with a connection pool and retry budget
+    configured by `config`"""
+    retry = Retry(
+        total=config.retries,
+        backoff_factor=config.backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=config.retry_methods,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_maxsize=config.pool_size, max_retries=retry)
+    session = ServiceSession(config.timeout, service)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(service: str) -> requests.Session:
+    """Returns the shared session for `service`, creating it on first
+    use, i.e. after uwsgi has forked its workers"""
+    session = _sessions.get(service)
+    if session is not None:
+        return session
+    with _sessions_lock:
+        if service not in _sessions:
+            _sessions[service] = make_session(SERVICE_HTTP_CONFIGS[service], service)
+        return _sessions[service]
+
+
+def set_session(service: str, session: Optional[requests.Session]) -> None:
+    """Replaces the shared session for `service`, e.g. with a mock in
+    tests; pass None to go back to a default session on next use"""
+    with _sessions_lock:
+        previous = _sessions.pop(service, None)
+        if session is not None:
+            _sessions[service] = session
+    if previous is not None and previous is not session:
+        previous.close()
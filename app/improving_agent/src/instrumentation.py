@@ -0,0 +1,229 @@
+"""This module provides per-stage latency spans and counts for the
+query pipeline
+
+A `QueryTrace` is started for each query with `trace_query`. While it
+is active, `span` records how long each stage takes and `count` tallies
+records, nodes, edges, results, and outbound HTTP requests, both on the
+trace (which can be attached to the TRAPI `logs`) and in the
+process-wide `METRICS` registry, which is exported in the Prometheus
+text format at /api/metrics. Each uwsgi worker keeps its own registry.
+"""
+import contextvars
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from improving_agent.models import LogEntry, LogLevel
+
+STAGE_DESERIALIZATION = 'deserialization'
+STAGE_NORMALIZE_QNODES = 'normalize_qnodes'
+STAGE_NORMALIZE_QEDGES = 'normalize_qedges'
+STAGE_PSEV_CONCEPTS = 'psev_concepts'
+STAGE_TEMPLATE_MATCHING = 'template_matching'
+STAGE_SPOKE_QUERY = 'spoke_query'
+STAGE_CYPHER = 'cypher'
+STAGE_EXTRACTION = 'extraction'
+STAGE_NORMALIZATION = 'normalization'
+STAGE_KP_ANNOTATION = 'kp_annotation'
+STAGE_SCORING = 'scoring'
+STAGE_SERIALIZATION = 'serialization'
+STAGE_TOTAL = 'total'
+
+COUNT_RECORDS = 'records'
+COUNT_NODES = 'nodes'
+COUNT_EDGES = 'edges'
+COUNT_RESULTS = 'results'
+
+METRIC_PREFIX = 'improving_agent'
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape_label_value(v)}"' for k, v in labels) + '}'
+
+
+class MetricsRegistry:
+    """Process-wide stage latency histograms and counters
+
+    Parameters
+    ----------
+    buckets (tuple of float): upper bounds, in seconds, of the stage
+        latency histogram buckets
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._stage_durations = {}  # stage -> [bucket counts, sum, count]
+        self._counters = {}  # name -> Counter of label tuples
+        self._lock = threading.Lock()
+
+    def observe_stage(self, stage, seconds):
+        with self._lock:
+            histogram = self._stage_durations.get(stage)
+            if histogram is None:
+                histogram = [[0] * len(self.buckets), 0.0, 0]
+                self._stage_durations[stage] = histogram
+            for i, upper_bound in enumerate(self.buckets):
+                if seconds <= upper_bound:
+                    histogram[0][i] += 1
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def increment(self, name, n=1, **labels):
+        with self._lock:
+            self._counters.setdefault(name, Counter())[tuple(sorted(labels.items()))] += n
+
+    def get_counter(self, name, **labels):
+        with self._lock:
+            return self._counters.get(name, Counter())[tuple(sorted(labels.items()))]
+
+    def render(self):
+        """Returns all metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            name = f'{METRIC_PREFIX}_stage_duration_seconds'
+            lines.append(f'# HELP {name} Time spent in each stage of the query pipeline')
+            lines.append(f'# TYPE {name} histogram')
+            for stage, (bucket_counts, total, count) in sorted(self._stage_durations.items()):
+                for upper_bound, bucket_count in zip(self.buckets, bucket_counts):
+                    labels = _format_labels((('stage', stage), ('le', upper_bound)))
+                    lines.append(f'{name}_bucket{labels} {bucket_count}')
+                labels = _format_labels((('stage', stage), ('le', '+Inf')))
+                lines.append(f'{name}_bucket{labels} {count}')
+                lines.append(f'{name}_sum{_format_labels((("stage", stage),))} {total}')
+                lines.append(f'{name}_count{_format_labels((("stage", stage),))} {count}')
+
+            for counter_name, counter in sorted(self._counters.items()):
+                name = f'{METRIC_PREFIX}_{counter_name}_total'
+                lines.append(f'# TYPE {name} counter')
+                for labels, value in sorted(counter.items()):
+                    lines.append(f'{name}{_format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self._lock:
+            self._stage_durations.clear()
+            self._counters.clear()
+
+
+METRICS = MetricsRegistry()
+
+
+class QueryTrace:
+    """The spans and counts recorded while processing one query"""
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.spans = []  # (stage, offset from start, duration) in seconds
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def add_span(self, stage, start, duration):
+        with self._lock:
+            self.spans.append((stage, start - self.started_at, duration))
+
+    def increment(self, name, n=1):
+        with self._lock:
+            self.counts[name] += n
+
+    def get_stage_durations(self):
+        """Returns {stage: total seconds} for the stages in this trace"""
+        durations = Counter()
+        with self._lock:
+            for stage, _, duration in self.spans:
+                durations[stage] += duration
+        return dict(durations)
+
+    def to_log_entries(self):
+        """Returns this trace as TRAPI DEBUG LogEntry objects, one per
+        span followed by one summarizing the counts"""
+        timestamp = datetime.now(timezone.utc).isoformat(timespec='seconds').replace('+00:00', 'Z')
+        with self._lock:
+            log_entries = [
+                LogEntry(
+                    timestamp=timestamp,
+                    level=LogLevel.DEBUG,
+                    code='StageTiming',
+                    message=f'{stage} started at {start * 1000:.1f} ms and took {duration * 1000:.1f} ms',
+                )
+                for stage, start, duration in self.spans
+            ]
+            if self.counts:
+                counts = ', '.join(f'{name}={n}' for name, n in sorted(self.counts.items()))
+                log_entries.append(LogEntry(
+                    timestamp=timestamp, level=LogLevel.DEBUG, code='QueryCounts', message=counts
+                ))
+        return log_entries
+
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+
+def get_current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def trace_query():
+    """Starts a QueryTrace for the code in this block and records its
+    total duration"""
+    trace = QueryTrace()
+    token = _current_trace.set(trace)
+    try:
+        with span(STAGE_TOTAL):
+            yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(stage):
+    """Records the duration of the code in this block as `stage`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        METRICS.observe_stage(stage, duration)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(stage, start, duration)
+
+
+def count(name, n=1):
+    """Adds `n` to the count of `name`, e.g. COUNT_RECORDS"""
+    METRICS.increment('query_objects', n, kind=name)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.increment(name, n)
+
+
+def count_outbound_request(service):
+    METRICS.increment('outbound_http_requests', service=service)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.increment(f'http_requests.{service}')
+
+
+def count_query(status):
+    METRICS.increment('queries', status=status)
+
+
+def in_current_trace(fn):
+    """Wraps `fn` so that, when run by a worker thread of an executor,
+    its spans and counts are recorded on the current trace"""
+    trace = _current_trace.get()
+
+    def run_in_trace(*args, **kwargs):
+        token = _current_trace.set(trace)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current_trace.reset(token)
+    return run_in_trace
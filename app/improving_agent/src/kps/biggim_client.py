@@ -5,9 +5,9 @@ import re
 import time
 from contextlib import closing
 
-import requests
 from werkzeug.utils import cached_property
 
+from improving_agent.src.http_sessions import SERVICE_BIGGIM, get_session
 from improving_agent.util import get_evidara_logger
 
 logger = get_evidara_logger(__name__)
@@ -18,20 +18,27 @@ class BigGimClient:
     class for the ability to cache the result of tissues and potentially
     other metadata"""
 
-    def __init__(self):
+    def __init__(self, session=None):
         """Instantiates a BigGimClient object"""
         self.available_tissue_studies = {}
+        self._session = session
+
+    @property
+    def session(self):
+        if self._session is not None:
+            return self._session
+        return get_session(SERVICE_BIGGIM)
 
     @cached_property
     def tissues(self):
-        return requests.get("http://biggim.ncats.io/api/metadata/tissue").json()["tissues"]
+        return self.session.get("http://biggim.ncats.io/api/metadata/tissue").json()["tissues"]
 
     def get_available_tissue_studies(self, tissue):
         """Returns columns related to tissue that can be searched in
         BigGIM"""
         # check for tissue in cached dict and get if not there
         if tissue not in self.available_tissue_studies:
-            r = requests.get(f"http://biggim.ncats.io/api/metadata/tissue/{tissue}")
+            r = self.session.get(f"http://biggim.ncats.io/api/metadata/tissue/{tissue}")
             self.available_tissue_studies[tissue] = r.json()["substudies"]
 
         # unpack potential tissues, returning those from GIANT and GTEx
@@ -74,7 +81,7 @@ class BigGimClient:
         # set up search strings
         search_columns = ",".join(set(columns))
         search_genes = ",".join(set([str(gene) for gene in genes]))
-        r = requests.post(
+        r = self.session.post(
             "http://biggim.ncats.io/api/biggim/query",
             json={
                 "table": "BigGIM_70_v1",
@@ -92,7 +99,7 @@ class BigGimClient:
         results_ready = False
         while not results_ready:
             time.sleep(1)
-            results_r = requests.get(
+            results_r = self.session.get(
                 f"http://biggim.ncats.io/api/biggim/status/{request_id}"
             )
             if results_r.json()["status"] == "complete":
@@ -108,12 +115,12 @@ class BigGimClient:
         result_url = results_r.json()["request_uri"][0]
 
         # get the header row
-        with closing(requests.get(result_url, stream=True)) as r:
+        with closing(self.session.get(result_url, stream=True)) as r:
             reader = csv.reader(codecs.iterdecode(r.iter_lines(), "utf-8"))
             header_row = next(reader)
 
         # iterate through the results
-        with closing(requests.get(result_url, stream=True)) as r:
+        with closing(self.session.get(result_url, stream=True)) as r:
             reader = csv.DictReader(
                 codecs.iterdecode(r.iter_lines(), "utf-8"), fieldnames=header_row
             )
@@ -4,6 +4,7 @@ from typing import Any, Dict, Optional
 
 import requests
 
+from improving_agent.src.http_sessions import SERVICE_COHD, get_session
 from improving_agent.src.normalization.sri_node_normalizer import SRI_NODE_NORMALIZER
 from improving_agent.util import get_evidara_logger
 
@@ -23,8 +24,14 @@ class CohdClient():
     # scope of only dealing with COHD itself. The SRI querying via the
     # query_xref_to_omop func could stand to be removed to external
     # funcs; it's pretty odd that a COHD client would be querying SRI...
-    def __init__(self) -> None:
-        pass
+    def __init__(self, session=None) -> None:
+        self._session = session
+
+    @property
+    def session(self):
+        if self._session is not None:
+            return self._session
+        return get_session(SERVICE_COHD)
 
     def _get_cache_string(self, **kwargs):
         return "_".join([f"{k}-{v}" for k, v in kwargs.items()])
@@ -80,7 +87,7 @@ class CohdClient():
         payload = [("curie", curie)]
         payload.extend([(k, v) for k, v in kwargs.items()])
 
-        response = requests.get(
+        response = self.session.get(
             f"{COHD_BASE_URL}omop/xrefToOMOP", params=payload
         )
         if response.status_code != 200:
@@ -120,7 +127,7 @@ class CohdClient():
         logger.info(f"Querying COHD chi-square with {payload}")
 
         # query
-        response = requests.get(
+        response = self.session.get(
             f"{COHD_BASE_URL}association/chiSquare", params=payload
         )
 
@@ -144,7 +151,7 @@ class CohdClient():
 
         logger.info(f"Querying COHD chi-square with {payload}")
 
-        response = requests.get(
+        response = self.session.get(
             f"{COHD_BASE_URL}frequencies/pairedConceptFreq", params=payload
         )
 
@@ -1,4 +1,5 @@
-from collections import defaultdict
+from functools import lru_cache
+from types import MappingProxyType
 
 from werkzeug.exceptions import BadRequest, NotImplemented
 
@@ -13,6 +14,7 @@ from improving_agent.src.biolink.biolink import EDGE, get_supported_biolink_desc
 from improving_agent.src.biolink.spoke_biolink_constants import (
     BIOLINK_ASSOCIATION_AFFECTS,
     BIOLINK_ASSOCIATION_IN_CLINICAL_TRIALS_FOR,
+    BIOLINK_ASSOCIATION_RELATED_TO,
     BIOLINK_ASSOCIATION_TREATS,
     BIOLINK_ENTITY_CHEMICAL_ENTITY,
     BIOLINK_ENTITY_DISEASE,
@@ -27,7 +29,6 @@ from improving_agent.src.biolink.spoke_biolink_constants import (
     BL_QUALIFIER_TYPE_QUALIFIED_PREDICATE,
     KNOWLEDGE_TYPE_INFERRED,
     KNOWLEDGE_TYPE_LOOKUP,
-    PREDICATES,
     QUALIFIERS,
     SPOKE_ANY_TYPE,
     SPOKE_BIOLINK_EDGE_MAPPINGS,
@@ -151,47 +152,6 @@ def _deserialize_qedge(qedge_id, qedge):
     return qedge
 
 
-def _get_objects_maps(subj_qnode):
-    if not subj_qnode.category:
-        return list(PREDICATES.values())
-
-    objects_maps = []
-    for category in subj_qnode.category:
-        objects_map = PREDICATES.get(category)
-        if objects_map:
-            objects_maps.append(objects_map)
-
-    if not objects_maps:
-        raise UnsupportedTypeError(f'Could not find any supported predicates for subject category: {subj_qnode.category}')
-
-    return objects_maps
-
-
-def _get_potential_predicate_maps(subj_qnode, obj_qnode):
-    objects_maps = _get_objects_maps(subj_qnode)
-    potential_predicates_map = defaultdict(list)
-    if not obj_qnode.category:
-        for objects_map in objects_maps:
-            for predicate, spoke_edges in objects_map.items():
-                potential_predicates_map[predicate].extend(spoke_edges)
-        return potential_predicates_map
-
-    for category in obj_qnode.category:
-        for objects_map in objects_maps:
-            predicates_map = objects_map.get(category)
-            if not predicates_map:
-                continue
-            for predicate, spoke_edges in predicates_map.items():
-                potential_predicates_map[predicate].extend(spoke_edges)
-
-    if not potential_predicates_map:
-        raise UnsupportedTypeError(
-            'Could not find any supported predicates for subject category: '
-            f'{subj_qnode.category} and object category: {obj_qnode.category}'
-        )
-    return potential_predicates_map
-
-
 def _get_subject_object_qnodes(query_graph, qedge):
     subject_node = query_graph.nodes.get(qedge.subject)
     object_node = query_graph.nodes.get(qedge.object)
@@ -201,74 +161,133 @@ def _get_subject_object_qnodes(query_graph, qedge):
     return subject_node, object_node
 
 
-def _are_qualifiers_compatible(qedge, spoke_edge):
-    query_qualifiers = qedge.qualifier_constraints
-    if not query_qualifiers:
-        return True
+def _make_spoke_edge_qualifier_index():
+    """Returns {SPOKE edge type: {qualifier type: value}} for the SPOKE
+    edge types that have qualifiers; values are str, or tuples of str
+    where a SPOKE edge type has several"""
+    return MappingProxyType({
+        spoke_edge: MappingProxyType({
+            qualifier_type: qualifier_value if isinstance(qualifier_value, str) else tuple(qualifier_value)
+            for qualifier_type, qualifier_value in mapping[QUALIFIERS].items()
+        })
+        for spoke_edge, mapping in SPOKE_BIOLINK_EDGE_MAPPINGS.items()
+        if mapping.get(QUALIFIERS)
+    })
+
+
+def _make_predicate_descendant_index():
+    """Returns {predicate: frozenset of it and its descendants that are
+    mapped to SPOKE} for every predicate mapped to SPOKE"""
+    index = {}
+    for predicate in BIOLINK_SPOKE_EDGE_MAPPINGS:
+        try:
+            index[predicate] = frozenset(get_supported_biolink_descendants([predicate], EDGE))
+        except ValueError:
+            # not in this biolink version; resolved per query, as before
+            continue
+    return MappingProxyType(index)
+
+
+SPOKE_EDGE_QUALIFIERS = _make_spoke_edge_qualifier_index()
+PREDICATE_DESCENDANTS = _make_predicate_descendant_index()
+
+
+def _make_qualifier_key(qualifier_constraints):
+    """Returns `qualifier_constraints` as a hashable key in which the
+    order of the qualifiers within each set is ignored"""
+    if not qualifier_constraints:
+        return None
+    return tuple(
+        tuple(sorted(
+            (qualifier['qualifier_type_id'], qualifier['qualifier_value'])
+            for qualifier in qualifier_set['qualifier_set']
+        ))
+        for qualifier_set in qualifier_constraints
+    )
 
-    spoke_edge_qualifiers = SPOKE_BIOLINK_EDGE_MAPPINGS[spoke_edge].get(QUALIFIERS)
-    if not spoke_edge_qualifiers:
-        return False
 
-    for qualifier_set in query_qualifiers:
+@lru_cache(maxsize=1024)
+def _parse_qualifier_key(qualifier_key):
+    """Returns the object aspects, directions, and qualified predicates
+    required by the qualifier constraints of `qualifier_key`
+
+    Every qualifier set is validated, but, as before, only the last is
+    matched.
+    """
+    for qualifier_set in qualifier_key:
         query_data = {
-            'aspects': [],
-            'directions': [],
-            'qualified_predicates': [],
+            BL_QUALIFIER_TYPE_OBJECT_ASPECT: set(),
+            BL_QUALIFIER_TYPE_OBJECT_DIRECTION: set(),
+            BL_QUALIFIER_TYPE_QUALIFIED_PREDICATE: set(),
         }
-        for qualifier in qualifier_set['qualifier_set']:
-            qualifier_type = qualifier['qualifier_type_id']
-            if qualifier_type == BL_QUALIFIER_TYPE_OBJECT_ASPECT:
-                query_data['aspects'].append(qualifier['qualifier_value'])
-            elif qualifier_type == BL_QUALIFIER_TYPE_OBJECT_DIRECTION:
-                query_data['directions'].append(qualifier['qualifier_value'])
-            elif qualifier_type == BL_QUALIFIER_TYPE_QUALIFIED_PREDICATE:
-                query_data['qualified_predicates'].append(qualifier['qualifier_value'])
-            else:
+        for qualifier_type, qualifier_value in qualifier_set:
+            if qualifier_type not in query_data:
                 raise UnsupportedQualifier(
                     'imProving Agent does not support '
                     f'qualifier_type_id={qualifier_type}'
                 )
+            query_data[qualifier_type].add(qualifier_value)
 
-        if query_data['directions'] and not query_data['aspects']:
+        if query_data[BL_QUALIFIER_TYPE_OBJECT_DIRECTION] and not query_data[BL_QUALIFIER_TYPE_OBJECT_ASPECT]:
             raise UnsupportedQualifier(
                 'imProving Agent does not support qualifier directions '
                 'without a qualifier aspect'
             )
 
-    if not all(
-        aspect in spoke_edge_qualifiers[BL_QUALIFIER_TYPE_OBJECT_ASPECT]
-        for aspect
-        in query_data['aspects']
-    ):
-        return False
-    if not all(
-        direction in spoke_edge_qualifiers[BL_QUALIFIER_TYPE_OBJECT_DIRECTION]
-        for direction
-        in query_data['directions']
-    ):
+    return {qualifier_type: frozenset(values) for qualifier_type, values in query_data.items()}
+
+
+def _are_qualifiers_compatible(qualifier_key, spoke_edge):
+    """Returns whether every queried qualifier value is `in` the SPOKE
+    edge type's value of its type, i.e. a substring of a str value or
+    one of several values; edge types without a queried type don't match"""
+    if qualifier_key is None:
+        return True
+
+    spoke_edge_qualifiers = SPOKE_EDGE_QUALIFIERS.get(spoke_edge)
+    if not spoke_edge_qualifiers:
         return False
-    if query_data['qualified_predicates']:
-        if not all(
-            predicate in spoke_edge_qualifiers[BL_QUALIFIER_TYPE_QUALIFIED_PREDICATE]
-            for predicate
-            in query_data['qualified_predicates']
-        ):
-            return False
 
+    for qualifier_type, values in _parse_qualifier_key(qualifier_key).items():
+        if not values:
+            continue
+        spoke_value = spoke_edge_qualifiers.get(qualifier_type)
+        if spoke_value is None or not all(value in spoke_value for value in values):
+            return False
     return True
 
 
-def _get_compatible_spoke_edges(qedge):
+def _get_compatible_predicates(predicates):
+    """Returns the predicates mapped to SPOKE that are `predicates` or
+    their descendants, as `get_supported_biolink_descendants` does"""
+    if BIOLINK_ASSOCIATION_RELATED_TO in predicates:
+        return {BIOLINK_ASSOCIATION_RELATED_TO}
+
+    compatible_predicates = set()
+    for predicate in predicates:
+        descendants = PREDICATE_DESCENDANTS.get(predicate)
+        if descendants is None:
+            descendants = get_supported_biolink_descendants([predicate], EDGE)
+        compatible_predicates.update(descendants)
+    return compatible_predicates
+
+
+@lru_cache(maxsize=1024)
+def _resolve_spoke_edge_types(predicates, qualifier_key):
+    """Returns a tuple of the SPOKE edge types that satisfy a qedge with
+    `predicates`, a frozenset, and qualifier constraints `qualifier_key`
+
+    Results are memoized, so the same predicates and qualifiers are
+    resolved once per worker.
+    """
     compatible_edges = []
-    compatible_predicates = get_supported_biolink_descendants(qedge.predicates, EDGE)
-    for predicate in compatible_predicates:
+    for predicate in _get_compatible_predicates(predicates):
         spoke_edge_mappings = BIOLINK_SPOKE_EDGE_MAPPINGS.get(predicate)
         if not spoke_edge_mappings:
             raise UnsupportedTypeError(f'imProving Agent does not currently accept predicates of type {predicate}')
 
         for spoke_edge_type in spoke_edge_mappings:
-            if _are_qualifiers_compatible(qedge, spoke_edge_type):
+            if _are_qualifiers_compatible(qualifier_key, spoke_edge_type):
                 compatible_edges.append(spoke_edge_type)
 
     if not compatible_edges:
@@ -277,7 +296,14 @@ def _get_compatible_spoke_edges(qedge):
             'and (if present) qualifier constraints'
         )
 
-    return compatible_edges
+    return tuple(compatible_edges)
+
+
+def _get_compatible_spoke_edges(qedge):
+    return list(_resolve_spoke_edge_types(
+        frozenset(qedge.predicates),
+        _make_qualifier_key(qedge.qualifier_constraints),
+    ))
 
 
 def _assign_spoke_edge_types(qedge):
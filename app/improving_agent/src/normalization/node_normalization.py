@@ -1,3 +1,5 @@
+from concurrent.futures import ThreadPoolExecutor
+
 from werkzeug.exceptions import BadRequest
 
 from improving_agent.exceptions import (
@@ -16,6 +18,7 @@ from improving_agent.src.biolink.spoke_biolink_constants import (
     SPOKE_LABEL_GENE,
 )
 from improving_agent.src.constraints import validate_constraint_support
+from improving_agent.src.instrumentation import in_current_trace
 from improving_agent.src.normalization import SearchNode
 from improving_agent.util import get_evidara_logger
 
@@ -25,15 +28,43 @@ from .curie_formatters import (
     get_spoke_identifiers_from_normalized_node,
 )
 from .sri_node_normalizer import (
+    SRI_NN_MAX_CONCURRENT_REQUESTS,
     SRI_NN_RESPONSE_VALUE_ID,
     SRI_NN_RESPONSE_VALUE_IDENTIFIER,
     SRI_NODE_NORMALIZER,
 )
 
 QNODE_CURIE_SPOKE_IDENTIFIERS = 'spoke_identifiers'
+SRI_NN_CHUNK_SIZE = 1000  # per SRI guidance
 
 logger = get_evidara_logger(__name__)
 
+# shared by all requests so that total concurrency to SRI stays bounded;
+# threads are started lazily, i.e. after uwsgi forks workers
+_sri_executor = ThreadPoolExecutor(
+    max_workers=SRI_NN_MAX_CONCURRENT_REQUESTS,
+    thread_name_prefix='sri-node-normalizer',
+)
+
+
+def _get_normalized_nodes_in_chunks(search_curies):
+    """Returns normalized nodes for `search_curies`, searched in chunks
+    of SRI_NN_CHUNK_SIZE that are sent concurrently"""
+    chunks = [
+        search_curies[i:i + SRI_NN_CHUNK_SIZE]
+        for i in range(0, len(search_curies), SRI_NN_CHUNK_SIZE)
+    ]
+    search_results = {}
+    if len(chunks) == 1:
+        search_results.update(SRI_NODE_NORMALIZER.get_normalized_nodes(chunks[0]))
+        return search_results
+
+    for chunk_results in _sri_executor.map(
+        in_current_trace(SRI_NODE_NORMALIZER.get_normalized_nodes), chunks
+    ):
+        search_results.update(chunk_results)
+    return search_results
+
 
 def normalize_spoke_nodes_for_translator(
     spoke_search_nodes: list[SearchNode],
@@ -52,17 +83,7 @@ def normalize_spoke_nodes_for_translator(
         in spoke_search_nodes
     }
     search_curies = list(formatted_curie_node_map.keys())
-    search_results = {}
-
-    # chunk per SRI guidance
-    chunk_size = 1000
-    start = 0
-    end = start + chunk_size
-    while start <= len(search_curies):
-        search_chunk = search_curies[start:end]
-        search_results = {**search_results, **SRI_NODE_NORMALIZER.get_normalized_nodes(search_chunk)}
-        start += chunk_size
-        end += chunk_size
+    search_results = _get_normalized_nodes_in_chunks(search_curies)
 
     result_map = {}
     for formatted_curie, search_node in formatted_curie_node_map.items():
@@ -196,6 +217,34 @@ def _normalize_query_nodes_for_spoke(qnodes):
     return normalized_qnodes
 
 
+def prefetch_qnode_normalization(query_graphs_nodes):
+    """Searches the node normalizer once for the CURIEs of the qnodes of
+    several query graphs, e.g. a batch of queries, so that their calls
+    to `validate_normalize_qnodes` are answered from the cache of
+    SRI_NODE_NORMALIZER
+
+    Parameters
+    ----------
+    query_graphs_nodes: iterable of the nodes components of TRAPI
+        QueryGraphs, which are left unchanged
+    """
+    search_curies = set()
+    for qnodes in query_graphs_nodes:
+        try:
+            deserialized_qnodes = {
+                qnode_id: _assign_spoke_node_label(_deserialize_qnode(qnode_id, qnode))
+                for qnode_id, qnode in qnodes.items()
+            }
+            _, formatted_search_nodes = _check_and_format_qnode_curies_for_search(deserialized_qnodes)
+        except Exception:
+            # the query fails with this error again when it is normalized
+            continue
+        search_curies.update(formatted_search_nodes)
+
+    if search_curies:
+        _get_normalized_nodes_in_chunks(sorted(search_curies))
+
+
 def validate_normalize_qnodes(qnodes):
     """Returns deserializes QNodes that have been mapped for SPOKE
     querying
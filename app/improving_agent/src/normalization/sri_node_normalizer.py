@@ -3,9 +3,11 @@ API to retrieve equivalent identifiers (CURIEs) for nodes encountered
 in ARS queries and KP responses"""
 from typing import Any, Dict, Iterable, List
 
-import requests
 from werkzeug.utils import cached_property
 
+from improving_agent.src.caching import LruTtlCache, SqliteCache, TieredCache
+from improving_agent.src.config import app_config
+from improving_agent.src.http_sessions import SERVICE_SRI_NODE_NORMALIZER, get_session
 from improving_agent.util import get_evidara_logger
 
 SRI_NN_BASE_URL = "https://nodenorm.transltr.io/1.3/"
@@ -21,26 +23,48 @@ SRI_NN_RESPONSE_VALUE_TYPE = 'type'
 SRI_NN_SEMANTIC_TYPES_ENDPOINT = "get_semantic_types"
 SRI_NN_SEMANTIC_TYPE_IDENTIFIER = "semantictype"
 
+# the number of concurrent requests node normalization may send, which
+# also sizes the connection pool; see http_sessions
+SRI_NN_MAX_CONCURRENT_REQUESTS = int(app_config.SRI_NN_MAX_CONCURRENT_REQUESTS)
+
 logger = get_evidara_logger(__name__)
 
 
 class SriNodeNormalizer:
-    """Query functionality for RENCI's node-normalization service"""
-
-    def __init__(self) -> None:
-        self.normalized_node_cache = {}
+    """Query functionality for RENCI's node-normalization service
+
+    Parameters
+    ----------
+    cache:
+        a cache backend from improving_agent.src.caching for normalized
+        nodes; defaults to an in-memory LruTtlCache
+    base_url:
+        location of the node-normalization API
+    session:
+        a requests.Session, safe to share between threads, for calls to
+        the API; defaults to the shared node-normalizer session from
+        improving_agent.src.http_sessions
+    """
+
+    def __init__(self, cache=None, base_url=SRI_NN_BASE_URL, session=None) -> None:
+        if cache is None:
+            cache = LruTtlCache()
+        self.normalized_node_cache = cache
+        self.base_url = base_url
+        self._session = session
+
+    @property
+    def session(self):
+        if self._session is not None:
+            return self._session
+        return get_session(SERVICE_SRI_NODE_NORMALIZER)
 
     def _check_cache_and_reformat_curies(self, curies):
-        cached = {}
-        subset = set()
-
-        for curie in curies:
-            if curie in self.normalized_node_cache:
-                if self.normalized_node_cache[curie] is not None:
-                    cached[curie] = self.normalized_node_cache[curie]
-                continue
-            subset.add(curie)
-
+        curies = set(curies)
+        cached = self.normalized_node_cache.get_many(curies)
+        subset = curies.difference(cached)
+        # None entries are remembered failures; don't search or return them
+        cached = {curie: node for curie, node in cached.items() if node is not None}
         return cached, subset
 
     def get_normalized_nodes(self, curies: Iterable[str]) -> Dict[str, Any]:
@@ -64,13 +88,12 @@ class SriNodeNormalizer:
 
         logger.info(f'Querying SRI to normalize {subset}')
         data = {SRI_NN_PARAM_CURIES: list(subset)}
-        response = requests.post(
-            f"{SRI_NN_BASE_URL}{SRI_NN_NORMALIZED_NODES_ENDPOINT}", json=data
+        response = self.session.post(
+            f"{self.base_url}{SRI_NN_NORMALIZED_NODES_ENDPOINT}", json=data
         )
         if response.status_code == 404:
             logger.warning(f"No results for {list(subset)} in SRI node normalizer")
-            for curie in subset:
-                self.normalized_node_cache[curie] = None
+            self.normalized_node_cache.set_many({curie: None for curie in subset})
             empty_results = {curie: None for curie in subset}
             return {**empty_results, **cached}
 
@@ -82,9 +105,9 @@ class SriNodeNormalizer:
         failed_curies = []
 
         for search_curie, normalized_node in normalized_nodes.items():
-            self.normalized_node_cache[search_curie] = normalized_node
             if normalized_node is None:
                 failed_curies.append(search_curie)
+        self.normalized_node_cache.set_many(normalized_nodes)
 
         if failed_curies:
             logger.warning(f"Failed to retrieve normalized nodes for {failed_curies}")
@@ -112,8 +135,8 @@ class SriNodeNormalizer:
             (SRI_NN_SEMANTIC_TYPE_IDENTIFIER, semantic_type) for semantic_type in semantic_types
         ]
 
-        response = requests.get(
-            f"{SRI_NN_BASE_URL}{SRI_NN_CURIE_PREFIXES_ENDPOINT}", params=payload
+        response = self.session.get(
+            f"{self.base_url}{SRI_NN_CURIE_PREFIXES_ENDPOINT}", params=payload
         )
 
         if response.status_code != 200:
@@ -132,7 +155,7 @@ class SriNodeNormalizer:
         List[str]:
             list of valid semantic types
         """
-        response = requests.get(f"{SRI_NN_BASE_URL}{SRI_NN_SEMANTIC_TYPES_ENDPOINT}")
+        response = self.session.get(f"{self.base_url}{SRI_NN_SEMANTIC_TYPES_ENDPOINT}")
         if response.status_code != 200:
             logger.error(f"Failed to get semantic types with {response.status_code} and {response.text}")
             response.raise_for_status()
@@ -140,4 +163,24 @@ class SriNodeNormalizer:
         return response.json()["semantic_types"]["types"]
 
 
-SRI_NODE_NORMALIZER = SriNodeNormalizer()
+def _make_sri_node_normalizer_cache():
+    """Returns the cache configured for SRI_NODE_NORMALIZER: a bounded
+    per-process LRU, in front of a SQLite file shared by all workers if
+    SRI_NN_CACHE_PATH is set"""
+    negative_ttl = float(app_config.SRI_NN_CACHE_NEGATIVE_TTL)
+    memory_cache = LruTtlCache(
+        max_size=int(app_config.SRI_NN_CACHE_MAX_SIZE),
+        negative_ttl=negative_ttl,
+    )
+    if not app_config.SRI_NN_CACHE_PATH:
+        return memory_cache
+    shared_cache = SqliteCache(
+        app_config.SRI_NN_CACHE_PATH,
+        table='sri_normalized_nodes',
+        negative_ttl=negative_ttl,
+        max_rows=int(app_config.SRI_NN_CACHE_MAX_ROWS),
+    )
+    return TieredCache(memory_cache, shared_cache)
+
+
+SRI_NODE_NORMALIZER = SriNodeNormalizer(_make_sri_node_normalizer_cache())
@@ -1,10 +1,11 @@
 import logging
-from typing import Dict, List, Optional, Union
+from typing import Dict, Iterable, List, Optional, Union
 
 from improving_agent.src.biolink.spoke_biolink_constants import SPOKE_LABEL_COMPOUND
 
 from improving_agent.models import QNode
 from improving_agent.src.config import app_config
+from .cache import PsevScoreCache
 from .psev_client import (
     PsevClient,
     PSEV_SERVICE_SUPPORTED_NODE_TYPES,
@@ -13,6 +14,49 @@ from .psev_client import (
 
 logger = logging.getLogger(__name__)
 
+PSEV_SCORE_CACHE = PsevScoreCache(
+    max_scores=int(app_config.PSEV_CACHE_MAX_SCORES),
+    ttl=float(app_config.PSEV_CACHE_TTL),
+    negative_ttl=float(app_config.PSEV_CACHE_NEGATIVE_TTL),
+)
+
+
+def _get_identifier_scores(psev_client, concepts, identifiers, node_type):
+    """Returns {concept: {identifier: score}}, searching the service
+    only for scores that are not in PSEV_SCORE_CACHE"""
+    scores, missing = PSEV_SCORE_CACHE.get_identifier_scores(concepts, identifiers)
+    if not missing:
+        return scores
+
+    missing_identifiers = sorted({i for concept_missing in missing.values() for i in concept_missing})
+    fetched = psev_client.get_psev_scores(list(missing), missing_identifiers, node_type)
+    PSEV_SCORE_CACHE.set_identifier_scores(fetched, missing)
+    for concept, concept_scores in fetched.items():
+        scores[concept].update(concept_scores)
+    return scores
+
+
+def _get_concept_vectors(psev_client, concepts, node_type):
+    """Returns {concept: {identifier: score}} for all nodes of
+    `node_type`, searching the service only for concepts that are not
+    in PSEV_SCORE_CACHE"""
+    scores, missing = {}, []
+    for concept in concepts:
+        vector = PSEV_SCORE_CACHE.get_concept_vector(concept, node_type)
+        if vector is None:
+            missing.append(concept)
+        else:
+            scores[concept] = vector
+    if not missing:
+        return scores
+
+    fetched = psev_client.get_psev_scores(missing, None, node_type)
+    for concept, concept_scores in fetched.items():
+        if concept_scores:
+            PSEV_SCORE_CACHE.set_concept_vector(concept, node_type, concept_scores)
+        scores[concept] = concept_scores
+    return scores
+
 
 def get_psev_scores(concepts: List[Union[int, str]],
                     identifiers: Optional[List[Union[int, str]]] = None,
@@ -52,15 +96,19 @@ def get_psev_scores(concepts: List[Union[int, str]],
     if node_type and node_type not in PSEV_SERVICE_SUPPORTED_NODE_TYPES:
         raise ValueError(f'`node_type may only be one of` {", ".join(PSEV_SERVICE_SUPPORTED_NODE_TYPES)}')
 
-    # query
+    # query the cache, then the service for what's missing
     psev_client = PsevClient(app_config.PSEV_API_KEY, app_config.PSEV_SERVICE_URL)
     try:
-        result = psev_client.get_psev_scores(q_concepts, q_ids, node_type)
+        if q_ids:
+            result = _get_identifier_scores(psev_client, q_concepts, q_ids, node_type)
+        else:
+            result = _get_concept_vectors(psev_client, q_concepts, node_type)
     except Exception as e:
         logger.exception(
             f'Failed to retrieve PSEV values from psev service, error was: {str(e)}',
         )
         return {concept: {} for concept in concepts}
+    logger.info(f'PSEV cache hit rates: {PSEV_SCORE_CACHE.get_hit_rates()}')
 
     # handle the result
     if not identifiers:  # node_type query
@@ -86,11 +134,44 @@ def get_psev_scores(concepts: List[Union[int, str]],
         resulting_psevs[concept] = {}
         for identifier in identifiers:
             # we check for strings here in case our local id is int
-            resulting_psevs[concept][identifier] = result[concept][str(identifier)]
+            resulting_psevs[concept][identifier] = result[concept].get(str(identifier), 0.0)
 
     return resulting_psevs
 
 
+def prefetch_psev_scores(identifiers_by_concept: Dict[Union[int, str], Iterable[Union[int, str]]]):
+    """Searches the psev-service once for the scores of several
+    queries, e.g. a batch, so that their calls to `get_psev_scores` are
+    answered from PSEV_SCORE_CACHE
+
+    Parameters
+    ----------
+    identifiers_by_concept:
+        dict of concept -> identifiers: the union of the result node
+        identifiers of the queries that use each concept; only scores
+        missing from the cache are searched, each concept concurrently
+    """
+    missing_by_concept = {}
+    for concept, identifiers in identifiers_by_concept.items():
+        concept = str(concept)
+        _, missing = PSEV_SCORE_CACHE.get_identifier_scores(
+            [concept], sorted({str(identifier) for identifier in identifiers})
+        )
+        if missing:
+            missing_by_concept[concept] = missing[concept]
+    if not missing_by_concept:
+        return
+
+    psev_client = PsevClient(app_config.PSEV_API_KEY, app_config.PSEV_SERVICE_URL)
+    try:
+        fetched = psev_client.get_psev_scores_by_concept(missing_by_concept)
+    except Exception as e:
+        # each query searches for its own scores again
+        logger.exception(f'Failed to prefetch PSEV values from psev service, error was: {str(e)}')
+        return
+    PSEV_SCORE_CACHE.set_identifier_scores(fetched, missing_by_concept)
+
+
 def _get_supported_psev_concepts(qnode: QNode) -> List[Union[str, int]]:
     """Returns a list of identifiers from a single QNode that may be
     supported as PSEVs
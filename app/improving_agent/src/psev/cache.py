@@ -0,0 +1,205 @@
+"""This module provides a bounded, in-memory cache of PSEV scores
+
+Scores are stored per concept as float32 arrays, alongside either an
+identifier -> position index (for scores looked up by identifier) or a
+tuple of identifiers (for whole-concept vectors from `node_type`
+queries). Concepts are evicted least-recently-used first once the total
+number of stored scores exceeds `max_scores`, and expire after `ttl`
+seconds, e.g. so that a new SPOKE/PSEV build is picked up. Identifiers
+that the service has no score for are stored as absent, and searched
+again after `negative_ttl` seconds.
+"""
+import sys
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict
+
+
+class _ConceptScores:
+    """Scores for a single concept, looked up by identifier, and the
+    identifiers it has no score for, with their expiry"""
+    __slots__ = ('index', 'scores', 'absent', 'expires_at')
+
+    def __init__(self, expires_at):
+        self.index = {}
+        self.scores = array('f')
+        self.absent = {}
+        self.expires_at = expires_at
+
+    def __len__(self):
+        return len(self.scores) + len(self.absent)
+
+    def add(self, identifier_scores):
+        for identifier, score in identifier_scores.items():
+            self.absent.pop(identifier, None)
+            position = self.index.get(identifier)
+            if position is None:
+                self.index[sys.intern(identifier)] = len(self.scores)
+                self.scores.append(score)
+            else:
+                self.scores[position] = score
+
+    def add_absent(self, identifiers, expires_at):
+        for identifier in identifiers:
+            if identifier not in self.index:
+                self.absent[sys.intern(identifier)] = expires_at
+
+
+class _ConceptVector:
+    """All scores for a single concept and node type"""
+    __slots__ = ('identifiers', 'scores', 'expires_at')
+
+    def __init__(self, identifier_scores, expires_at):
+        self.identifiers = tuple(sys.intern(i) for i in identifier_scores)
+        self.scores = array('f', identifier_scores.values())
+        self.expires_at = expires_at
+
+    def __len__(self):
+        return len(self.scores)
+
+    def to_dict(self):
+        return dict(zip(self.identifiers, self.scores))
+
+
+class PsevScoreCache:
+    """A thread-safe LRU+TTL cache of PSEV scores
+
+    Parameters
+    ----------
+    max_scores (int): total number of scores to hold across concepts,
+        counting identifiers stored as absent
+    ttl (float or None): seconds that a concept's scores are valid for
+    negative_ttl (float or None): seconds that identifiers without a
+        score are stored as absent for
+    """
+    def __init__(self, max_scores=2_000_000, ttl=None, negative_ttl=None):
+        self.max_scores = max_scores
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stats = Counter()
+        self._entries = OrderedDict()
+        self._n_scores = 0
+        self._lock = threading.Lock()
+
+    @property
+    def n_scores(self):
+        return self._n_scores
+
+    def _get_entry(self, key, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at is not None and entry.expires_at <= now:
+            self._n_scores -= len(entry)
+            del self._entries[key]
+            self.stats['expired'] += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _evict(self):
+        while self._n_scores > self.max_scores and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self._n_scores -= len(entry)
+            self.stats['evictions'] += 1
+
+    def _get_expiry(self, now, ttl):
+        return None if ttl is None else now + ttl
+
+    def _is_absent(self, entry, identifier, now):
+        if entry is None or identifier not in entry.absent:
+            return False
+        expires_at = entry.absent[identifier]
+        if expires_at is not None and expires_at <= now:
+            del entry.absent[identifier]
+            self._n_scores -= 1
+            return False
+        return True
+
+    def get_identifier_scores(self, concepts, identifiers):
+        """Returns cached scores and what is missing for `identifiers`
+        in each of `concepts`
+
+        Returns
+        -------
+        cached (dict): {concept: {identifier: score}} for cached scores
+        missing (dict): {concept: [identifier]} for scores not cached;
+            identifiers cached as absent are in neither
+        """
+        cached, missing = {}, {}
+        now = time.monotonic()
+        with self._lock:
+            for concept in concepts:
+                entry = self._get_entry(concept, now)
+                concept_cached, concept_missing = {}, []
+                for identifier in identifiers:
+                    position = entry.index.get(identifier) if entry is not None else None
+                    if position is not None:
+                        concept_cached[identifier] = entry.scores[position]
+                    elif not self._is_absent(entry, identifier, now):
+                        concept_missing.append(identifier)
+                self.stats['identifier_hits'] += len(identifiers) - len(concept_missing)
+                self.stats['identifier_misses'] += len(concept_missing)
+                cached[concept] = concept_cached
+                if concept_missing:
+                    missing[concept] = concept_missing
+        return cached, missing
+
+    def set_identifier_scores(self, scores, searched=None):
+        """Stores {concept: {identifier: score}}, and identifiers of
+        `searched`, {concept: [identifier]}, without a score as absent"""
+        searched = searched or {}
+        now = time.monotonic()
+        with self._lock:
+            for concept in scores.keys() | searched.keys():
+                entry = self._get_entry(concept, now)
+                if entry is None:
+                    entry = _ConceptScores(self._get_expiry(now, self.ttl))
+                    self._entries[concept] = entry
+                n_before = len(entry)
+                identifier_scores = scores.get(concept, {})
+                entry.add(identifier_scores)
+                entry.add_absent(
+                    [i for i in searched.get(concept, []) if i not in identifier_scores],
+                    self._get_expiry(now, self.negative_ttl),
+                )
+                self._n_scores += len(entry) - n_before
+            self._evict()
+
+    def get_concept_vector(self, concept, node_type):
+        """Returns {identifier: score} for every node of `node_type`, or
+        None if the vector for `concept` is not cached"""
+        with self._lock:
+            entry = self._get_entry((concept, node_type), time.monotonic())
+            if entry is None:
+                self.stats['vector_misses'] += 1
+                return None
+            self.stats['vector_hits'] += 1
+        return entry.to_dict()
+
+    def set_concept_vector(self, concept, node_type, identifier_scores):
+        now = time.monotonic()
+        vector = _ConceptVector(identifier_scores, self._get_expiry(now, self.ttl))
+        with self._lock:
+            previous = self._entries.pop((concept, node_type), None)
+            if previous is not None:
+                self._n_scores -= len(previous)
+            self._entries[(concept, node_type)] = vector
+            self._n_scores += len(vector)
+            self._evict()
+
+    def get_hit_rates(self):
+        """Returns the fraction of identifier and vector lookups that
+        were served from the cache"""
+        hit_rates = {}
+        for lookup in ('identifier', 'vector'):
+            hits = self.stats[f'{lookup}_hits']
+            total = hits + self.stats[f'{lookup}_misses']
+            hit_rates[lookup] = hits / total if total else 0.0
+        return hit_rates
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._n_scores = 0
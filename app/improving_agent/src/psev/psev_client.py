@@ -1,14 +1,18 @@
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from http import HTTPStatus
 from typing import Dict, List, Optional
 
 import requests
 
+from improving_agent.src.http_sessions import SERVICE_PSEV, get_session
 from improving_agent.src.biolink.spoke_biolink_constants import (
     SPOKE_LABEL_COMPOUND,
     SPOKE_LABEL_DISEASE,
     SPOKE_LABEL_GENE,
 )
+from improving_agent.src.config import app_config
+from improving_agent.src.instrumentation import in_current_trace
 
 PSEV_SERVICE_CONCEPTS = 'concepts'
 PSEV_SERVICE_HEADER_X_API_KEY = 'X-API-KEY'
@@ -24,11 +28,26 @@ PSEV_SERVICE_SUPPORTED_PSEV_CONCEPT_TYPES = [
     SPOKE_LABEL_GENE
 ]
 
+# Concepts are fetched concurrently, at most PSEV_MAX_CONCURRENT_REQUESTS
+# per worker. The pages of a concept are fetched in turn, as whether
+# there is another is only known from the current one
+PSEV_MAX_CONCURRENT_REQUESTS = int(app_config.PSEV_MAX_CONCURRENT_REQUESTS)
+_concept_executor = ThreadPoolExecutor(
+    max_workers=PSEV_MAX_CONCURRENT_REQUESTS, thread_name_prefix='psev-concept',
+)
+
 
 class PsevClient:
-    def __init__(self, api_key, service_url):
+    def __init__(self, api_key, service_url, session=None):
         self._api_key = api_key
         self._service_url = '/'.join([service_url, PSEV_SERVICE_PSEV_ENDPOINT])
+        self._session = session
+
+    @property
+    def session(self):
+        if self._session is not None:
+            return self._session
+        return get_session(SERVICE_PSEV)
 
     def _call(
         self,
@@ -38,7 +57,7 @@ class PsevClient:
         headers={},
     ):
         headers = {**headers, PSEV_SERVICE_HEADER_X_API_KEY: self._api_key}
-        r = requests.post(url, headers=headers, params=params, json=req_body)
+        r = self.session.post(url, headers=headers, params=params, json=req_body)
         try:
             r.raise_for_status()
         except requests.exceptions.HTTPError as e:
@@ -56,9 +75,6 @@ class PsevClient:
         page = 0
         concept_scores = {}
 
-        params = {
-            PSEV_SERVICE_PAGE: page,
-        }
         req_body = {
             PSEV_SERVICE_IDENTIFIERS: node_identifiers,
             PSEV_SERVICE_NODE_TYPE: node_type,
@@ -68,15 +84,12 @@ class PsevClient:
         more_available = True
         while more_available:
             try:
-                response = self._call(req_url, params, req_body)
-                for identifier, psev_value in response[concept].items():
-                    concept_scores[identifier] = psev_value
-
-                more_available = response[PSEV_SERVICE_MORE_AVAILABLE]
-                params[PSEV_SERVICE_PAGE] += 1
-
+                response = self._call(req_url, {PSEV_SERVICE_PAGE: page}, req_body)
             except ValueError:  # concept not found
                 return {}
+            concept_scores.update(response[concept])
+            more_available = response[PSEV_SERVICE_MORE_AVAILABLE]
+            page += 1
 
         return concept_scores
 
@@ -115,9 +128,48 @@ class PsevClient:
             raise ValueError('`node_type` must be a string')
 
         scores = defaultdict(dict)
-        for concept in concepts:
-            scores[concept] = self._get_scores_for_concept(
-                concept, node_identifiers, node_type
+        if len(concepts) == 1:
+            scores[concepts[0]] = self._get_scores_for_concept(
+                concepts[0], node_identifiers, node_type
             )
+            return scores
+
+        concept_scores = _concept_executor.map(
+            in_current_trace(
+                lambda concept: self._get_scores_for_concept(concept, node_identifiers, node_type)
+            ),
+            concepts,
+        )
+        for concept, scores_for_concept in zip(concepts, concept_scores):
+            scores[concept] = scores_for_concept
 
         return scores
+
+    def get_psev_scores_by_concept(
+        self,
+        identifiers_by_concept: Dict[str, List[str]],
+    ) -> Dict[str, Dict[str, float]]:
+        """Returns PSEV scores as a dict of {concept: {identifier:
+        score}} for the node identifiers given for each concept in
+        `identifiers_by_concept`, a dict of {concept: [identifier]}, so
+        that each concept is searched only for the nodes that need it
+
+        As in `get_psev_scores`, concepts and identifiers must be str
+        and concepts are searched concurrently
+        """
+        for concept, node_identifiers in identifiers_by_concept.items():
+            if not isinstance(concept, str):
+                raise ValueError('concepts must be str')
+            if not isinstance(node_identifiers, list) or not all(isinstance(i, str) for i in node_identifiers):
+                raise ValueError('node identifiers must be a list of str')
+
+        concepts = list(identifiers_by_concept)
+        concept_scores = _concept_executor.map(
+            in_current_trace(
+                lambda concept: self._get_scores_for_concept(
+                    concept, identifiers_by_concept[concept], None
+                )
+            ),
+            concepts,
+        )
+        return dict(zip(concepts, concept_scores))
@@ -0,0 +1,165 @@
+"""This module provides a cache of TRAPI response messages keyed by a
+canonical fingerprint of the normalized query
+
+Identical query graphs are often resent, e.g. by the ARS and by test
+suites. The fingerprint is taken after qnode and qedge normalization, so
+queries that differ only in the order of ids, categories, or predicates
+share an entry. The submitted ids are part of the fingerprint, as
+results refer to them, so curies that normalize to the same SPOKE
+identifiers still have entries of their own. Entries are namespaced by
+IA_VERSION and SPOKE_VERSION so that a release or a new SPOKE build
+never serves stale results, and the on-disk tier is cleared when either
+changes.
+
+Messages are cached serialized, and each lookup returns its own copy,
+so a response can't change the cached message it was made from.
+"""
+import hashlib
+import json
+import threading
+
+from improving_agent.encoder import to_json_data
+from improving_agent.models.base_model import Model
+from improving_agent.src.caching import LruTtlCache, SqliteCache, TieredCache
+from improving_agent.src.config import app_config
+from improving_agent.src.instrumentation import METRICS
+from improving_agent.util import get_evidara_logger
+
+logger = get_evidara_logger(__name__)
+
+NAMESPACE_KEY = '__namespace__'
+
+
+def _canonicalize(value):
+    """Returns `value` as plain JSON-able data with dict keys and list
+    items in a stable order and None values dropped; TRAPI lists, e.g.
+    ids, categories, and predicates, are sets, so their order is ignored"""
+    if isinstance(value, Model):
+        value = value.to_dict()
+    if isinstance(value, dict):
+        return {
+            str(k): _canonicalize(v)
+            for k, v in sorted(value.items(), key=lambda item: str(item[0]))
+            if v is not None
+        }
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [_canonicalize(v) for v in value]
+        return sorted(items, key=lambda v: json.dumps(v, sort_keys=True, default=str))
+    return value
+
+
+def make_query_fingerprint(qnodes, qedges, max_results, psev_context, query_kps, namespace=''):
+    """Returns a hex digest that is equal for queries whose normalized
+    qnodes and qedges and options are equal"""
+    canonical_query = {
+        'namespace': namespace,
+        'qnodes': {
+            qnode_id: {
+                **_canonicalize(qnode),
+                'spoke_labels': _canonicalize(getattr(qnode, 'spoke_labels', None) or []),
+                'spoke_identifiers': _canonicalize(list(getattr(qnode, 'spoke_identifiers', None) or {})),
+            }
+            for qnode_id, qnode in qnodes.items()
+        },
+        'qedges': {
+            qedge_id: {
+                **_canonicalize(qedge),
+                'spoke_edge_types': _canonicalize(getattr(qedge, 'spoke_edge_types', None) or []),
+            }
+            for qedge_id, qedge in qedges.items()
+        },
+        'max_results': max_results,
+        'psev_context': _canonicalize(psev_context),
+        'query_kps': query_kps,
+    }
+    serialized = json.dumps(canonical_query, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+class QueryResultCache:
+    """Caches TRAPI messages, serialized as JSON, by query fingerprint
+
+    Parameters
+    ----------
+    memory_cache (LruTtlCache): per-process cache, checked first
+    disk_cache (SqliteCache or None): cache shared by workers
+    namespace (str): identifies the versions of this service and SPOKE
+        that produced the cached messages
+    """
+    def __init__(self, memory_cache, disk_cache=None, namespace=''):
+        self.memory_cache = memory_cache
+        self.disk_cache = disk_cache
+        self.namespace = namespace
+        if disk_cache is None:
+            self.cache = memory_cache
+        else:
+            self.cache = TieredCache(memory_cache, disk_cache)
+        self._namespace_checked = disk_cache is None
+        self._namespace_lock = threading.Lock()
+
+    def _check_namespace(self):
+        # the disk tier outlives deployments, so it is emptied when it
+        # was filled by another version of this service or of SPOKE
+        if self._namespace_checked:
+            return
+        with self._namespace_lock:
+            if self._namespace_checked:
+                return
+            stored_namespace = self.disk_cache.get_many([NAMESPACE_KEY]).get(NAMESPACE_KEY)
+            if stored_namespace != self.namespace:
+                logger.info(
+                    f'Clearing query result cache from {stored_namespace} for {self.namespace}'
+                )
+                self.disk_cache.clear()
+                self.disk_cache.set_many({NAMESPACE_KEY: self.namespace})
+            self._namespace_checked = True
+
+    def make_key(self, qnodes, qedges, max_results, psev_context, query_kps):
+        return make_query_fingerprint(
+            qnodes, qedges, max_results, psev_context, query_kps, self.namespace
+        )
+
+    def get(self, key):
+        """Returns a new dict of the cached message for `key`, or None"""
+        self._check_namespace()
+        message = self.cache.get_many([key]).get(key)
+        METRICS.increment('query_cache_lookups', result='miss' if message is None else 'hit')
+        if message is None:
+            return None
+        return json.loads(message)
+
+    def set(self, key, message):
+        """Caches `message`, a models.Message, for `key`"""
+        self._check_namespace()
+        serialized_message = json.dumps(to_json_data(message), separators=(',', ':'))
+        self.cache.set_many({key: serialized_message})
+
+    def clear(self):
+        self.cache.clear()
+        if self.disk_cache is not None:
+            self.disk_cache.set_many({NAMESPACE_KEY: self.namespace})
+
+
+def _make_query_result_cache():
+    """Returns the cache configured for QUERY_RESULT_CACHE: a bounded
+    per-process LRU, in front of a SQLite file shared by all workers if
+    QUERY_CACHE_PATH is set, or None if QUERY_CACHE_MAX_SIZE is 0"""
+    max_size = int(app_config.QUERY_CACHE_MAX_SIZE)
+    if not max_size:
+        return None
+    ttl = float(app_config.QUERY_CACHE_TTL)
+    memory_cache = LruTtlCache(max_size=max_size, ttl=ttl)
+    disk_cache = None
+    if app_config.QUERY_CACHE_PATH:
+        disk_cache = SqliteCache(
+            app_config.QUERY_CACHE_PATH,
+            table='query_results',
+            ttl=ttl,
+            max_rows=int(app_config.QUERY_CACHE_MAX_ROWS),
+            raw=True,
+        )
+    namespace = f'{app_config.IA_VERSION}/{app_config.SPOKE_VERSION}'
+    return QueryResultCache(memory_cache, disk_cache, namespace)
+
+
+QUERY_RESULT_CACHE = _make_query_result_cache()
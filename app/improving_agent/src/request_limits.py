@@ -0,0 +1,67 @@
+"""This module provides request-level back-pressure for the endpoints
+that query SPOKE
+
+Each worker process admits at most `max_concurrent` such requests at a
+time. Requests that can't get a slot within `acquire_timeout` seconds
+are turned away with a 503 so that clients retry, rather than queueing
+behind a saturated neo4j connection pool.
+"""
+import re
+import threading
+
+from improving_agent.src.config import app_config
+
+# /query, /api/batch-query, /api/paths, and /text-search; cheap
+# endpoints, e.g. /api/hello and /asyncquery_status, are never limited
+LIMITED_PATH_PATTERN = re.compile(r'(/query$|/api/batch-query$|/api/paths/|/text-search/)')
+RETRY_AFTER_SECONDS = 5
+
+
+class ConcurrencyLimiter:
+    """Bounds the number of requests being processed at once
+
+    Parameters
+    ----------
+    max_concurrent (int): number of requests admitted at once
+    acquire_timeout (float): seconds a request may wait for a slot
+    """
+    def __init__(self, max_concurrent, acquire_timeout=0):
+        self.max_concurrent = max_concurrent
+        self.acquire_timeout = acquire_timeout
+        self._semaphore = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.n_rejected = 0
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def try_acquire(self):
+        """Returns True if a slot was acquired, which must be released,
+        or False if the limiter stayed saturated for `acquire_timeout`"""
+        if self.acquire_timeout:
+            acquired = self._semaphore.acquire(timeout=self.acquire_timeout)
+        else:
+            acquired = self._semaphore.acquire(blocking=False)
+        with self._lock:
+            if acquired:
+                self._in_flight += 1
+            else:
+                self.n_rejected += 1
+        return acquired
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+        self._semaphore.release()
+
+
+def is_limited_path(path):
+    return LIMITED_PATH_PATTERN.search(path) is not None
+
+
+QUERY_LIMITER = ConcurrencyLimiter(
+    int(app_config.MAX_CONCURRENT_QUERIES),
+    float(app_config.QUERY_ACQUIRE_TIMEOUT),
+)
@@ -2,6 +2,7 @@
 as there is time.
 """
 from copy import deepcopy
+from itertools import chain
 
 import neo4j
 import neo4j.graph
@@ -64,7 +65,7 @@ from improving_agent.src.provenance import (
     SPOKE_PUBLICATION_FIELDS,
     TREATS_LOOKUP_RETRIEVAL_SOURCE_MAP,
 )
-from improving_agent.util import get_evidara_logger
+from improving_agent.util import AggregatedWarningLogger, get_evidara_logger
 
 
 _logger = get_evidara_logger(__name__)
@@ -296,10 +297,16 @@ ATTRIBUTE_MAPS = {
 # e.g. max phase transformation to biolink's highest fda approval enums
 SPECIAL_ATTRIBUTE_HANDLERS = {}
 
+# (graph type, SPOKE label or edge type, property) -> transformer; see
+# compile_attribute_transformers below
+ATTRIBUTE_TRANSFORMERS = {}
+
 
 def register_special_attribute_handler(attribute_name):
     def wrapper(f):
         SPECIAL_ATTRIBUTE_HANDLERS[attribute_name] = f
+        if ATTRIBUTE_TRANSFORMERS:  # handlers registered after startup
+            compile_attribute_transformers()
         return f
     return wrapper
 
@@ -316,26 +323,87 @@ def _map_max_phase_to_fda_approval(property_value):
     return PHASE_BL_CT_PHASE_ENUM_MAP[property_value]
 
 
-def _transform_special_attributes(slot_type, property_value):
-    """Returns a transformed property name and value if biolink
-    compliance requires it.
+def _make_mapped_attribute_transformer(property_type, attribute_mapping):
+    """Returns a closure that converts a property value to a TRAPI
+    Attribute according to `attribute_mapping`, with the special
+    attribute handler, if any, resolved ahead of time
+    """
+    attribute_type_id = attribute_mapping.biolink_type
+    attribute_source = attribute_mapping.attribute_source
+    attribute_attributes = attribute_mapping.attributes
+    special_handler = SPECIAL_ATTRIBUTE_HANDLERS.get(attribute_type_id)
+
+    def transform(property_value):
+        if special_handler:
+            property_value = special_handler(property_value)
+        attribute = Attribute(
+            attribute_type_id=attribute_type_id,
+            original_attribute_name=property_type,
+            value=property_value,
+        )
+        if attribute_source:  # temporary until node mappings are done
+            attribute.attribute_source = attribute_source
+        if attribute_attributes:
+            attribute.attributes = attribute_attributes
+        return attribute
+    return transform
 
-    Parameters
-    ----------
-    slot_type (str): the name of the property (biolink slot)
-    property_value (str, list(str), int, float): the value of the property
 
-    Returns
-    -------
-    property_value (str, list(str), int, float): the updated value, if necessary
+def _make_publications_transformer(property_type):
+    def transform(property_value):
+        return make_publications_attribute(property_type, property_value)
+    return transform
+
+
+def _make_unmapped_transformer(warning_key):
+    def transform(property_value):
+        UNMAPPED_ATTRIBUTE_WARNINGS.record(warning_key)
+    return transform
+
+
+def _get_property_transformer(edge_or_node, spoke_object_type, property_type):
+    """Returns the transformer for a (graph type, SPOKE label or edge
+    type, property) key that is not in the precompiled table"""
+    if property_type in KNOWN_UNMAPPED_ATTRS:
+        return None
+    if property_type in SPOKE_PUBLICATION_FIELDS:
+        return _make_publications_transformer(property_type)
+
+    object_properties = ATTRIBUTE_MAPS[edge_or_node].get(spoke_object_type)
+    if not object_properties:
+        return _make_unmapped_transformer(f'{spoke_object_type=} (no properties mapped)')
+
+    attribute_mapping = object_properties.get(property_type)
+    if not attribute_mapping:
+        return _make_unmapped_transformer(f'{spoke_object_type=} and {property_type=}')
+    return _make_mapped_attribute_transformer(property_type, attribute_mapping)
+
+
+def compile_attribute_transformers():
+    """(Re)builds ATTRIBUTE_TRANSFORMERS, the dispatch table from
+    (graph type, SPOKE label or edge type, property) to a transformer
+    closure, or None for properties that are deliberately dropped
     """
-    attr_transformer = SPECIAL_ATTRIBUTE_HANDLERS.get(slot_type)
-    if attr_transformer:
-        return attr_transformer(property_value)
-    return property_value
+    ATTRIBUTE_TRANSFORMERS.clear()
+    for edge_or_node, attribute_map in ATTRIBUTE_MAPS.items():
+        for spoke_object_type, object_properties in attribute_map.items():
+            property_types = chain(
+                object_properties, SPOKE_PUBLICATION_FIELDS, KNOWN_UNMAPPED_ATTRS,
+            )
+            for property_type in property_types:
+                ATTRIBUTE_TRANSFORMERS[(edge_or_node, spoke_object_type, property_type)] = (
+                    _get_property_transformer(edge_or_node, spoke_object_type, property_type)
+                )
+
+
+# aggregated, rate-limited warnings for properties that have no mapping
+UNMAPPED_ATTRIBUTE_WARNINGS = AggregatedWarningLogger(
+    _logger, 'Could not find attribute mappings for', interval=60.0,
+)
+compile_attribute_transformers()
 
 
-def _make_result_attribute(
+def make_result_attribute(
     property_type,
     property_value,
     edge_or_node,
@@ -355,44 +423,20 @@ def _make_result_attribute(
     -------
     models.Attribute or None
     """
-    if edge_or_node not in ATTRIBUTE_MAPS:
-        raise ValueError(
-            f'Got {edge_or_node=} but it must be one of "edge" or "node"',
-        )
-
-    if property_type in KNOWN_UNMAPPED_ATTRS:
+    key = (edge_or_node, spoke_object_type, property_type)
+    try:
+        transformer = ATTRIBUTE_TRANSFORMERS[key]
+    except KeyError:
+        if edge_or_node not in ATTRIBUTE_MAPS:
+            raise ValueError(
+                f'Got {edge_or_node=} but it must be one of "edge" or "node"',
+            )
+        transformer = _get_property_transformer(*key)
+        ATTRIBUTE_TRANSFORMERS[key] = transformer
+
+    if transformer is None:
         return
-
-    if property_type in SPOKE_PUBLICATION_FIELDS:
-        return make_publications_attribute(property_type, property_value)
-
-    object_properties = ATTRIBUTE_MAPS[edge_or_node].get(spoke_object_type)
-    if not object_properties:
-        _logger.warning(
-            f'Could not find any properties in the attribute map for {spoke_object_type=}',
-        )
-        return
-
-    attribute_mapping = object_properties.get(property_type)
-    if not attribute_mapping:
-        _logger.warning(
-            f'Could not find an attribute mapping for {spoke_object_type=} and {property_type=}',
-        )
-        return
-    attribute_type_id = attribute_mapping.biolink_type
-    property_value = _transform_special_attributes(attribute_type_id, property_value)
-
-    attribute = Attribute(
-        attribute_type_id=attribute_type_id,
-        original_attribute_name=property_type,
-        value=property_value,
-    )
-    if attribute_mapping.attribute_source:  # temporary until node mappings are done
-        attribute.attribute_source = attribute_mapping.attribute_source
-
-    if attribute_mapping.attributes:
-        attribute.attributes = attribute_mapping.attributes
-    return attribute
+    return transformer(property_value)
 
 
 def make_result_edge(
@@ -423,7 +467,7 @@ def make_result_edge(
             retrieval_sources = make_retrieval_sources(k, v)
             provenance_retrieval_sources.extend(retrieval_sources)
             continue
-        edge_attribute = _make_result_attribute(k, v, SPOKE_GRAPH_TYPE_EDGE, edge_type)
+        edge_attribute = make_result_attribute(k, v, SPOKE_GRAPH_TYPE_EDGE, edge_type)
         if edge_attribute:
             if isinstance(edge_attribute, list):
                 edge_attributes.extend(edge_attribute)
@@ -482,7 +526,7 @@ def make_result_node(n4j_object: neo4j.graph.Node):
             continue
         if k == SPOKE_NODE_PROPERTY_SOURCE:
             node_source = v
-        node_attribute = _make_result_attribute(
+        node_attribute = make_result_attribute(
             k, v, SPOKE_GRAPH_TYPE_NODE, spoke_node_labels[0],
         )
         if node_attribute:
@@ -509,8 +553,21 @@ def normalize(
 ) -> tuple[KnowledgeGraph, list[Result]]:
     # search the node normalizer for nodes collected in result creation
     node_search_results = normalize_spoke_nodes_for_translator(nodes_to_normalize)
-    for spoke_curie, normalized_curie in node_search_results.items():
-        knowledge_graph['nodes'][normalized_curie] = knowledge_graph['nodes'].pop(spoke_curie)
+    return apply_normalization(node_search_results, knowledge_graph, results)
+
+
+def apply_normalization(
+    node_search_results: dict,
+    knowledge_graph: KnowledgeGraph,
+    results: list[Result],
+) -> tuple[KnowledgeGraph, list[Result]]:
+    """Returns `knowledge_graph` and `results` with SPOKE CURIEs
+    replaced by their normalized equivalents in `node_search_results`,
+    which may also map CURIEs that are not in them"""
+    knowledge_graph['nodes'] = {
+        node_search_results[spoke_curie]: node
+        for spoke_curie, node in knowledge_graph['nodes'].items()
+    }
 
     for edge in knowledge_graph['edges'].values():
         setattr(edge, 'object', node_search_results[edge.object])
@@ -1,4 +1,6 @@
-from typing import Union
+from typing import Optional, Union
+
+import numpy as np
 
 from improving_agent.models import Result
 
@@ -7,29 +9,78 @@ def normalize_round_score(i_score: float, m: float, b: float) -> float:
     return round(m * i_score + b, 3)
 
 
-def normalize_results_scores(results: list[Result]) -> list[Result]:
-    """Given a set of results, return a version normalized between
-    0.01 and 1.
+def normalize_scores(scores: Union[list[float], np.ndarray]) -> list[float]:
+    """Given an array of scores, return a list normalized between 0.01
+    and 1, rounded to 3 decimal places. All-zero scores are returned
+    as-is and all-equal scores are set to 1.
     """
-
-    scores = [result.analyses[0].score for result in results]
-    if not scores:
-        return results
-    min_score = min(scores)
-    max_score = max(scores)
+    scores = np.asarray(scores, dtype=float)
+    if not scores.size:
+        return []
+    min_score = scores.min()
+    max_score = scores.max()
 
     if min_score == 0 and max_score == 0:
-        return results
+        return scores.tolist()
 
-    if len(scores) == 1:
-        results[0].analyses[0].score = 1
-        return results
+    if min_score == max_score:
+        return [1] * scores.size
 
     desired_max = 1
     desired_min = 0.01
     m = (desired_max - desired_min) / (max_score - min_score)
     b = desired_min - m * min_score
-    for i, score in enumerate(scores):
-        results[i].analyses[0].score = normalize_round_score(score, m, b)
+    return [round(score, 3) for score in (m * scores + b).tolist()]
+
+
+def normalize_results_scores(results: list[Result]) -> list[Result]:
+    """Given a set of results, return a version normalized between
+    0.01 and 1.
+    """
+    scores = [result.analyses[0].score for result in results]
+    if not scores or (min(scores) == 0 and max(scores) == 0):
+        return results
+
+    for result, score in zip(results, normalize_scores(scores)):
+        result.analyses[0].score = score
 
     return results
+
+
+def top_k_indices(scores: Union[list[float], np.ndarray], k: Optional[int] = None) -> np.ndarray:
+    """Given an array of scores, return the indices of the `k` highest,
+    highest first, or of all scores if `k` is None. Equal scores keep
+    their input order.
+
+    Only the candidates at or above the k-th highest score are sorted,
+    so the cost scales with `k` rather than with the number of scores.
+    """
+    neg_scores = -np.asarray(scores, dtype=float)
+    n_scores = neg_scores.size
+    if k is None or k >= n_scores:
+        return np.argsort(neg_scores, kind='stable')
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+
+    threshold = np.partition(neg_scores, k - 1)[k - 1]
+    candidates = np.flatnonzero(neg_scores <= threshold)
+    order = np.argsort(neg_scores[candidates], kind='stable')
+    return candidates[order[:k]]
+
+
+def rank_results(results: list[Result], k: Optional[int] = None) -> list[Result]:
+    """Given a set of results, return the `k` (or all, if None) with the
+    highest scores, highest first. Results with equal scores keep their
+    input order.
+    """
+    scores = [result.analyses[0].score or 0 for result in results]
+    return [results[i] for i in top_k_indices(scores, k)]
+
+
+def top_k_items(scores: dict, k: Optional[int] = None) -> dict:
+    """Given a dict of {key: score}, return a dict of the `k` (or all,
+    if None) items with the highest scores, highest first
+    """
+    keys = list(scores)
+    values = np.fromiter(scores.values(), dtype=float, count=len(keys))
+    return {keys[i]: scores[keys[i]] for i in top_k_indices(values, k)}
@@ -34,7 +34,7 @@ from improving_agent.src.biolink.spoke_biolink_constants import (
     SPOKE_EDGE_TYPE_UPREGULATES_OGuG,
 )
 from improving_agent.src.provenance import make_internal_retrieval_source
-from improving_agent.src.scoring.scoring_utils import normalize_results_scores
+from improving_agent.src.scoring.scoring_utils import normalize_results_scores, rank_results
 from improving_agent.util import get_evidara_logger
 
 
@@ -344,7 +344,7 @@ class CompoundAffectsGene(TemplateQueryBase):
 
                 _results.append(result)
 
-        two_hop_results = sorted(_results, key=lambda x: x.analyses[0].score, reverse=True)[:count_to_get]
+        two_hop_results = rank_results(_results, count_to_get)
         two_hop_knowledge_graph = {'edges': {}, 'nodes': {}}
         two_hop_aux_graphs = {}
         for two_hop_result in two_hop_results:
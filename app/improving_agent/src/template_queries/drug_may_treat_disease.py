@@ -10,7 +10,7 @@ from improving_agent.models import (
     Result,
 )
 from improving_agent.exceptions import UnmatchedIdentifierError
-from improving_agent.src.basic_query import BasicQuery
+from improving_agent.src.basic_query import BasicQuery, decode_n4j_object
 from improving_agent.src.biolink.spoke_biolink_constants import (
     BIOLINK_ASSOCIATION_IN_CLINICAL_TRIALS_FOR,
     BIOLINK_ASSOCIATION_TREATS,
@@ -34,7 +34,11 @@ from improving_agent.src.normalization.node_normalization import (
 )
 from improving_agent.src.provenance import make_internal_retrieval_source
 from improving_agent.src.psev import get_psev_scores
-from improving_agent.src.scoring.scoring_utils import normalize_results_scores
+from improving_agent.src.scoring.scoring_utils import (
+    normalize_results_scores,
+    rank_results,
+    top_k_items,
+)
 from improving_agent.util import get_evidara_logger
 
 logger = get_evidara_logger(__name__)
@@ -53,8 +57,8 @@ CYPHER_DISEASE_SEARCH = """
 
 
 def _extract_node_result(record, querier):
-    node_info = record['c']
-    identifier = node_info['identifier']
+    node_info = decode_n4j_object(record['c'])
+    identifier = node_info.identifier
     result_node = querier.make_result_node(node_info, identifier)
     return identifier, result_node
 
@@ -345,11 +349,7 @@ class DrugMayTreatDisease(TemplateQueryBase):
 
         # sort compound_psev_scores
         count_to_get = self.max_results - len(mutated_results)
-        sorted_compound_scores = {
-            k: v
-            for k, v
-            in sorted(compound_psev_scores.items(), reverse=True, key=lambda item: item[1])[:count_to_get]
-        }
+        sorted_compound_scores = top_k_items(compound_psev_scores, count_to_get)
 
         # remove the known to treat compounds from the top scored
         for node in knowledge_graph['nodes'].values():
@@ -428,5 +428,5 @@ class DrugMayTreatDisease(TemplateQueryBase):
         mutated_results.extend(new_results)
         results = normalize_results_scores(mutated_results)
 
-        results = sorted(results, key=lambda x: x.analyses[0].score, reverse=True)
+        results = rank_results(results)
         return results, self.knowledge_graph, auxiliary_graphs
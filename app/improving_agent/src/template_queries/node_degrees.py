@@ -0,0 +1,146 @@
+"""This module provides a table of the degrees of high-degree SPOKE
+nodes, by which pathfinder avoids expanding hubs
+
+The table is computed offline from SPOKE, counting the relationships of
+each node other than those pathfinder excludes, and only nodes of at
+least a minimum degree are kept, so that it stays small. It is loaded at
+startup from PATHFINDER_NODE_DEGREES_PATH; nodes not in it are taken to
+have a degree of 0, and without it pathfinder prunes by fan-out only.
+
+Usage (from app/), against the SPOKE of the app config:
+    python -m improving_agent.src.template_queries.node_degrees [--min-degree 100 --output PATH]
+"""
+import argparse
+import json
+import os
+
+from improving_agent.src.config import app_config
+from improving_agent.util import get_evidara_logger
+
+logger = get_evidara_logger(__name__)
+
+NODE_DEGREES_FORMAT = 1
+DEFAULT_MIN_DEGREE = 100
+
+
+class NodeDegrees:
+    """The degrees of SPOKE nodes of at least `min_degree`
+
+    Parameters
+    ----------
+    degrees (dict): label -> {str(identifier): degree}
+    min_degree (int): the lowest degree in the table; nodes not in it
+        have a lower degree
+    spoke_version (str): the SPOKE build the table was computed from
+    """
+    def __init__(self, degrees, min_degree=0, spoke_version=''):
+        self.degrees = degrees
+        self.min_degree = min_degree
+        self.spoke_version = spoke_version
+
+    def get_degree(self, node):
+        """Returns the degree of `node`, a PathNode, or 0 if it is not
+        in the table"""
+        degree = 0
+        for label in node.labels:
+            label_degrees = self.degrees.get(label)
+            if label_degrees:
+                degree = max(degree, label_degrees.get(str(node.identifier), 0))
+        return degree
+
+    def __len__(self):
+        return sum(len(label_degrees) for label_degrees in self.degrees.values())
+
+    def to_dict(self):
+        return {
+            'format': NODE_DEGREES_FORMAT,
+            'spoke_version': self.spoke_version,
+            'min_degree': self.min_degree,
+            'degrees': self.degrees,
+        }
+
+    def write(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f, separators=(',', ':'), sort_keys=True)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def from_file(cls, path):
+        """Returns the table at `path`, or None if it is missing or
+        unreadable"""
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('format') != NODE_DEGREES_FORMAT:
+            return None
+        return cls(data['degrees'], data['min_degree'], data.get('spoke_version', ''))
+
+
+def load_node_degrees(path):
+    """Returns the NodeDegrees at `path`, or None, with a warning, if
+    there is none or it was computed from another SPOKE build"""
+    if not path:
+        return None
+    node_degrees = NodeDegrees.from_file(path)
+    if node_degrees is None:
+        logger.warning(f'No node degree table was found at {path}; pathfinder will not prune hubs')
+        return None
+    if app_config.SPOKE_VERSION and node_degrees.spoke_version != app_config.SPOKE_VERSION:
+        logger.warning(
+            f'The node degree table at {path} is for SPOKE {node_degrees.spoke_version or "(unknown)"}, '
+            f'not {app_config.SPOKE_VERSION}'
+        )
+    return node_degrees
+
+
+def _run_get_node_degrees(tx, undesired_edges, min_degree):
+    result = tx.run(
+        'MATCH (n)-[r]-() WHERE NOT type(r) IN $undesired_edges '
+        'WITH n, count(r) AS degree WHERE degree >= $min_degree '
+        'RETURN labels(n) AS labels, n.identifier AS identifier, degree',
+        undesired_edges=undesired_edges,
+        min_degree=min_degree,
+    )
+    degrees = {}
+    for record in result:
+        for label in record['labels']:
+            degrees.setdefault(label, {})[str(record['identifier'])] = record['degree']
+    return degrees
+
+
+def build_node_degrees(session, undesired_edges, min_degree=DEFAULT_MIN_DEGREE):
+    """Returns the NodeDegrees of the nodes in `session`'s database
+    with at least `min_degree` relationships not of `undesired_edges`"""
+    degrees = session.read_transaction(_run_get_node_degrees, undesired_edges, min_degree)
+    return NodeDegrees(degrees, min_degree, app_config.SPOKE_VERSION)
+
+
+def main():
+    import neo4j
+
+    from improving_agent.src.template_queries.pathfinder import DEFAULT_EXCLUDE_EDGES
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--min-degree', type=int, default=DEFAULT_MIN_DEGREE)
+    parser.add_argument('--output', default=app_config.PATHFINDER_NODE_DEGREES_PATH)
+    args = parser.parse_args()
+
+    driver = neo4j.GraphDatabase.driver(
+        app_config.NEO4J_SPOKE_URI,
+        auth=(app_config.NEO4J_SPOKE_USER, app_config.NEO4J_SPOKE_PASS),
+    )
+    with driver.session() as session:
+        node_degrees = build_node_degrees(session, DEFAULT_EXCLUDE_EDGES, args.min_degree)
+    driver.close()
+    node_degrees.write(args.output)
+    print(f'Wrote the degrees of {len(node_degrees)} nodes to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""This module provides a store of the state of paged pathfinder
+searches, keyed by the opaque cursors returned with each page
+
+The state of a search, i.e. its frontiers and the SPOKE nodes already
+normalized, is kept in a bounded per-process LRU and, if
+PATHFINDER_CURSOR_STORE_PATH is set, a SQLite file shared by workers,
+so that any worker can serve the next page. Each page gets a new
+cursor, so a page can be requested again until its cursor expires or
+is among the oldest beyond PATHFINDER_CURSOR_STORE_MAX_ROWS.
+"""
+from uuid import uuid4
+
+from improving_agent.src.caching import LruTtlCache, SqliteCache, TieredCache
+from improving_agent.src.config import app_config
+
+
+class PathCursorStore:
+    """Stores JSON-able pathfinder search states by cursor
+
+    Parameters
+    ----------
+    memory_cache (LruTtlCache): per-process cache, checked first
+    disk_cache (SqliteCache or None): cache shared by workers
+    """
+    def __init__(self, memory_cache, disk_cache=None):
+        self.memory_cache = memory_cache
+        self.disk_cache = disk_cache
+        if disk_cache is None:
+            self.cache = memory_cache
+        else:
+            self.cache = TieredCache(memory_cache, disk_cache)
+
+    def save(self, state):
+        """Stores `state` and returns a new cursor for it"""
+        cursor = uuid4().hex
+        self.cache.set_many({cursor: state})
+        return cursor
+
+    def load(self, cursor):
+        """Returns the state stored for `cursor`, or None if it is
+        unknown or has expired"""
+        return self.cache.get_many([cursor]).get(cursor)
+
+
+def _make_path_cursor_store():
+    ttl = float(app_config.PATHFINDER_CURSOR_TTL)
+    memory_cache = LruTtlCache(max_size=int(app_config.PATHFINDER_CURSOR_MAX_SIZE), ttl=ttl)
+    disk_cache = None
+    if app_config.PATHFINDER_CURSOR_STORE_PATH:
+        disk_cache = SqliteCache(
+            app_config.PATHFINDER_CURSOR_STORE_PATH,
+            table='path_cursors',
+            ttl=ttl,
+            max_rows=int(app_config.PATHFINDER_CURSOR_STORE_MAX_ROWS),
+        )
+    return PathCursorStore(memory_cache, disk_cache)
+
+
+PATH_CURSOR_STORE = _make_path_cursor_store()
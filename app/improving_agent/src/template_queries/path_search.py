@@ -0,0 +1,485 @@
+"""This module provides a bidirectional path search for pathfinder
+
+Rather than expanding every path of n hops from the start node and
+filtering them, as a variable-length Cypher pattern does, the search
+expands frontiers from both the start and end nodes, one hop at a time
+and always on the smaller side, and joins them where they meet. Each
+hop is a neo4j query for the neighbors of a batch of frontier nodes, in
+which excluded edge types are pruned. Path constraints, i.e. that some
+node of a path has one of the intermediate labels or identifiers, are
+tracked for each partial path so that only qualifying halves are
+joined, and the last hop is restricted to nodes on the other frontier.
+The search stops at the first number of hops with any paths.
+
+Hubs, i.e. high-degree nodes such as common genes, multiply the paths a
+search finds and the nodes it must expand, mostly with trivial paths.
+Given a table of node degrees, nodes of more than `max_node_degree`
+relationships are not traversed, other than the start and end nodes,
+and each expanded node keeps at most `max_fan_out` neighbors, those of
+the lowest degree first, which bounds the work of each hop.
+
+A PathSearch can be resumed: each call for more paths continues from
+the frontiers and paths of the last, and its state can be saved as
+JSON-able data, e.g. to serve later pages of results from any worker.
+"""
+from collections import defaultdict
+from typing import Any, NamedTuple, Optional
+
+import neo4j
+
+PATH_SEARCH_MIN_HOPS = 2
+
+# bits of the constraint mask of a partial path
+_CONSTRAINT_LABELS = 1
+_CONSTRAINT_IDENTIFIERS = 2
+
+
+class PathNode(NamedTuple):
+    """A node as seen by the search: its neo4j id, labels, and SPOKE
+    identifier"""
+    id: int
+    labels: tuple
+    identifier: Any
+
+
+class FoundPath(NamedTuple):
+    """A path of neo4j graph objects, ordered from the start node"""
+    nodes: list[neo4j.graph.Node]
+    relationships: list[neo4j.graph.Relationship]
+
+
+class _PathConstraints:
+    """Tracks which path constraints a node satisfies as a bit mask"""
+    def __init__(self, intermediate_labels=None, intermediate_ids=None):
+        self.labels = frozenset(intermediate_labels or ())
+        # compared as str, since Gene identifiers are ints in SPOKE
+        self.identifiers = frozenset(str(i) for i in intermediate_ids or ())
+        self.complete = 0
+        if self.labels:
+            self.complete |= _CONSTRAINT_LABELS
+        if self.identifiers:
+            self.complete |= _CONSTRAINT_IDENTIFIERS
+
+    def get_mask(self, labels, identifier):
+        mask = 0
+        if self.labels and not self.labels.isdisjoint(labels):
+            mask |= _CONSTRAINT_LABELS
+        if self.identifiers and str(identifier) in self.identifiers:
+            mask |= _CONSTRAINT_IDENTIFIERS
+        return mask
+
+
+class _Frontier:
+    """The partial paths from one end of the search, by hop
+
+    Each layer maps a state, i.e. (node id, constraint mask), to the
+    (relationship id, previous state) pairs by which it was reached
+    """
+    def __init__(self, constraints, layers):
+        self.constraints = constraints
+        self.layers = layers
+
+    @classmethod
+    def from_seeds(cls, seeds, constraints):
+        return cls(constraints, [{
+            (seed.id, constraints.get_mask(seed.labels, seed.identifier)): []
+            for seed in seeds
+        }])
+
+    def to_list(self):
+        """Returns the layers as lists of [node id, mask, [[relationship
+        id, previous node id, previous mask]]], in order"""
+        return [
+            [
+                [node_id, mask, [[rel_id, *parent] for rel_id, parent in parents]]
+                for (node_id, mask), parents in layer.items()
+            ]
+            for layer in self.layers
+        ]
+
+    @classmethod
+    def from_list(cls, layers, constraints):
+        return cls(constraints, [
+            {
+                (node_id, mask): [(rel_id, (parent_id, parent_mask)) for rel_id, parent_id, parent_mask in parents]
+                for node_id, mask, parents in layer
+            }
+            for layer in layers
+        ])
+
+    @property
+    def depth(self):
+        return len(self.layers) - 1
+
+    @property
+    def node_ids(self):
+        return {node_id for node_id, _ in self.layers[-1]}
+
+    def extend(self, rows):
+        """Adds a layer from `rows` of (node id, relationship id,
+        neighbor PathNode) returned by expanding the last layer"""
+        states_by_node = defaultdict(list)
+        for state in self.layers[-1]:
+            states_by_node[state[0]].append(state)
+        layer = defaultdict(list)
+        for node_id, rel_id, neighbor in rows:
+            neighbor_mask = self.constraints.get_mask(neighbor.labels, neighbor.identifier)
+            for state in states_by_node[node_id]:
+                layer[(neighbor.id, state[1] | neighbor_mask)].append((rel_id, state))
+        self.layers.append(layer)
+
+    def get_walks(self, state, depth=None):
+        """Returns the (node ids, relationship ids) of the partial paths
+        from a seed to `state`, seed first"""
+        if depth is None:
+            depth = self.depth
+        if depth == 0:
+            return [((state[0],), ())]
+        return [
+            (nodes + (state[0],), rels + (rel_id,))
+            for rel_id, parent in self.layers[depth][state]
+            for nodes, rels in self.get_walks(parent, depth - 1)
+        ]
+
+
+def _join_frontiers(forward, backward, constraints, limit, position=None):
+    """Returns up to `limit` paths, as (node ids, relationship ids),
+    joining the last layers of `forward` and `backward` from `position`,
+    and the position to continue from, or None once all are joined
+
+    A position is [forward state, backward state, forward walk, backward
+    walk], the indexes of the next pair of partial paths to join: the
+    states in the order of the last layers, the backward one among those
+    of the same node, and the walks in the order of `get_walks`. Joining
+    from it doesn't repeat the joins of earlier pages.
+    """
+    backward_states = defaultdict(list)
+    for state in backward.layers[-1]:
+        backward_states[state[0]].append(state)
+    forward_states = list(forward.layers[-1])
+    forward_index, backward_index, forward_walk, backward_walk = position or (0, 0, 0, 0)
+
+    paths = []
+    backward_walks = {}
+    for forward_index in range(forward_index, len(forward_states)):
+        forward_state = forward_states[forward_index]
+        matching_states = backward_states.get(forward_state[0], ())
+        forward_walks = None
+        for backward_index in range(backward_index, len(matching_states)):
+            backward_state = matching_states[backward_index]
+            if forward_state[1] | backward_state[1] != constraints.complete:
+                continue
+            if forward_walks is None:
+                forward_walks = forward.get_walks(forward_state)
+            if backward_state not in backward_walks:
+                backward_walks[backward_state] = backward.get_walks(backward_state)
+            for forward_walk in range(forward_walk, len(forward_walks)):
+                forward_nodes, forward_rels = forward_walks[forward_walk]
+                walks = backward_walks[backward_state]
+                for backward_walk in range(backward_walk, len(walks)):
+                    if len(paths) >= limit:
+                        return paths, [forward_index, backward_index, forward_walk, backward_walk]
+                    backward_nodes, backward_rels = walks[backward_walk]
+                    rels = forward_rels + backward_rels[::-1]
+                    # as in Cypher, a relationship appears once per path
+                    if len(set(rels)) != len(rels):
+                        continue
+                    paths.append((forward_nodes + backward_nodes[-2::-1], rels))
+                backward_walk = 0
+            forward_walk = 0
+        backward_index = 0
+    return paths, None
+
+
+def _prune_expansion(rows, end_ids, preferred_ids, node_degrees, max_fan_out, max_node_degree):
+    """Returns the `rows` of an expansion without neighbors of more than
+    `max_node_degree`, other than `end_ids`, and with at most
+    `max_fan_out` neighbors per expanded node, preferring
+    `preferred_ids` and then neighbors of the lowest degree"""
+    def get_degree(node):
+        return node_degrees.get_degree(node) if node_degrees is not None else 0
+
+    if max_node_degree and node_degrees is not None:
+        rows = [
+            row for row in rows
+            if row[2].id in end_ids or get_degree(row[2]) <= max_node_degree
+        ]
+    if not max_fan_out:
+        return rows
+
+    rows_by_node = defaultdict(list)
+    for row in rows:
+        rows_by_node[row[0]].append(row)
+    pruned = []
+    for node_rows in rows_by_node.values():
+        if len(node_rows) > max_fan_out:
+            node_rows = sorted(
+                node_rows,
+                key=lambda row: (row[2].id not in preferred_ids, get_degree(row[2]), row[1]),
+            )[:max_fan_out]
+        pruned.extend(node_rows)
+    return pruned
+
+
+class PathSearch:
+    """A resumable search for paths between `start_nodes` and
+    `end_nodes` of PATH_SEARCH_MIN_HOPS to `max_hops` hops, fewest
+    first
+
+    Parameters
+    ----------
+    start_nodes, end_nodes (list of PathNode): the nodes at either end
+        of the paths
+    undesired_edges (list of str): relationship types that paths may
+        not traverse
+    intermediate_labels, intermediate_ids: if given, paths must have a
+        node with one of these labels and one of these identifiers
+    max_hops (int): the most hops in a path
+    batch_size (int): the number of frontier nodes expanded per call to
+        `graph.expand`
+    node_degrees: an object with a `get_degree(PathNode)` method, e.g.
+        node_degrees.NodeDegrees, by which hubs are pruned
+    max_fan_out (int): if given, the most neighbors kept per expanded
+        node
+    max_node_degree (int): if given with `node_degrees`, the highest
+        degree of a node that paths may pass through
+    """
+    def __init__(
+        self,
+        start_nodes: list[PathNode],
+        end_nodes: list[PathNode],
+        undesired_edges: list[str],
+        intermediate_labels: Optional[list[str]] = None,
+        intermediate_ids: Optional[list[str]] = None,
+        max_hops: int = 4,
+        batch_size: int = 1000,
+        node_degrees=None,
+        max_fan_out: Optional[int] = None,
+        max_node_degree: Optional[int] = None,
+    ):
+        self.constraints = _PathConstraints(intermediate_labels, intermediate_ids)
+        self.forward = _Frontier.from_seeds(start_nodes, self.constraints)
+        self.backward = _Frontier.from_seeds(end_nodes, self.constraints)
+        self.end_ids = {node.id for node in start_nodes} | {node.id for node in end_nodes}
+        self.undesired_edges = list(undesired_edges)
+        self.max_hops = max_hops
+        self.batch_size = batch_size
+        self.node_degrees = node_degrees
+        self.max_fan_out = max_fan_out
+        self.max_node_degree = max_node_degree
+        # where joining the frontiers at the current number of hops
+        # continues, see _join_frontiers, and whether it is done
+        self.join_position = None
+        self.hops_done = False
+        self.exhausted = not start_nodes or not end_nodes
+
+    @property
+    def n_hops(self):
+        return self.forward.depth + self.backward.depth
+
+    def _expand(self, graph):
+        """Expands the smaller frontier by one hop"""
+        forward, backward = self.forward, self.backward
+        if len(forward.node_ids) <= len(backward.node_ids):
+            side, other = forward, backward
+        else:
+            side, other = backward, forward
+        # the last hop can only be useful where it meets the other side
+        targets = sorted(other.node_ids) if self.n_hops + 1 == self.max_hops else None
+        node_ids = sorted(side.node_ids)
+        rows = []
+        for i in range(0, len(node_ids), self.batch_size):
+            rows.extend(graph.expand(node_ids[i:i + self.batch_size], self.undesired_edges, targets))
+        # the last hop only reaches nodes that passed pruning already
+        if targets is None and (self.max_fan_out or self.max_node_degree):
+            rows = _prune_expansion(
+                rows,
+                self.end_ids,
+                other.node_ids | self.end_ids,
+                self.node_degrees,
+                self.max_fan_out,
+                self.max_node_degree,
+            )
+        side.extend(rows)
+        self.join_position = None
+        self.hops_done = False
+        if not side.layers[-1]:
+            self.exhausted = True
+
+    def next_paths(self, graph, limit: int) -> list[tuple[tuple[int, ...], tuple[int, ...]]]:
+        """Returns up to `limit` more paths, as (node ids, relationship
+        ids) ordered from the start: those not yet returned with the
+        current number of hops, or else those of the next number of hops
+        with any, expanding the frontiers as needed; [] once exhausted
+
+        `graph` is an object with an `expand(node_ids, undesired_edges,
+        targets)` method, e.g. Neo4jPathGraph, that returns (node id,
+        relationship id, neighbor PathNode) for every relationship of
+        the nodes, in either direction, that is not of an undesired type
+        and, if `targets` is given, ends at one of those node ids
+        """
+        while not self.exhausted:
+            if self.n_hops >= PATH_SEARCH_MIN_HOPS and not self.hops_done:
+                paths, self.join_position = _join_frontiers(
+                    self.forward, self.backward, self.constraints, limit, self.join_position,
+                )
+                if self.join_position is None:
+                    self.hops_done = True
+                    self.exhausted = self.n_hops >= self.max_hops
+                if paths:
+                    return paths
+            elif self.n_hops >= self.max_hops:
+                self.exhausted = True
+            else:
+                self._expand(graph)
+        return []
+
+    def to_dict(self):
+        """Returns the state of the search as JSON-able data"""
+        return {
+            'forward': self.forward.to_list(),
+            'backward': self.backward.to_list(),
+            'intermediate_labels': sorted(self.constraints.labels),
+            'intermediate_ids': sorted(self.constraints.identifiers),
+            'end_ids': sorted(self.end_ids),
+            'undesired_edges': self.undesired_edges,
+            'max_hops': self.max_hops,
+            'batch_size': self.batch_size,
+            'max_fan_out': self.max_fan_out,
+            'max_node_degree': self.max_node_degree,
+            'join_position': self.join_position,
+            'hops_done': self.hops_done,
+            'exhausted': self.exhausted,
+        }
+
+    @classmethod
+    def from_dict(cls, data, node_degrees=None):
+        """Returns the search saved as `data` by `to_dict`"""
+        search = cls(
+            [],
+            [],
+            data['undesired_edges'],
+            data['intermediate_labels'],
+            data['intermediate_ids'],
+            max_hops=data['max_hops'],
+            batch_size=data['batch_size'],
+            node_degrees=node_degrees,
+            max_fan_out=data['max_fan_out'],
+            max_node_degree=data['max_node_degree'],
+        )
+        search.forward = _Frontier.from_list(data['forward'], search.constraints)
+        search.backward = _Frontier.from_list(data['backward'], search.constraints)
+        search.end_ids = set(data['end_ids'])
+        search.join_position = data['join_position']
+        search.hops_done = data['hops_done']
+        search.exhausted = data['exhausted']
+        return search
+
+
+def search_paths(
+    graph,
+    start_nodes: list[PathNode],
+    end_nodes: list[PathNode],
+    undesired_edges: list[str],
+    intermediate_labels: Optional[list[str]] = None,
+    intermediate_ids: Optional[list[str]] = None,
+    max_hops: int = 4,
+    limit: int = 1000,
+    batch_size: int = 1000,
+    node_degrees=None,
+    max_fan_out: Optional[int] = None,
+    max_node_degree: Optional[int] = None,
+) -> list[tuple[tuple[int, ...], tuple[int, ...]]]:
+    """Returns up to `limit` paths between `start_nodes` and
+    `end_nodes` with the fewest hops, from PATH_SEARCH_MIN_HOPS to
+    `max_hops`, as (node ids, relationship ids) ordered from the start;
+    see PathSearch for the other parameters
+    """
+    search = PathSearch(
+        start_nodes,
+        end_nodes,
+        undesired_edges,
+        intermediate_labels,
+        intermediate_ids,
+        max_hops=max_hops,
+        batch_size=batch_size,
+        node_degrees=node_degrees,
+        max_fan_out=max_fan_out,
+        max_node_degree=max_node_degree,
+    )
+    return search.next_paths(graph, limit)
+
+
+class Neo4jPathGraph:
+    """Runs the queries of a path search against SPOKE in `session`"""
+    def __init__(self, session: neo4j.Session):
+        self.session = session
+
+    @staticmethod
+    def _run_get_nodes(tx, name, filter_clause, parameters):
+        if not filter_clause:
+            raise ValueError(f'Pathfinder {name} node must have identifiers or categories')
+        result = tx.run(
+            f'MATCH ({name}) WHERE {filter_clause} '
+            f'RETURN id({name}) AS id, labels({name}) AS labels, {name}.identifier AS identifier',
+            parameters,
+        )
+        return [PathNode(record['id'], tuple(record['labels']), record['identifier']) for record in result]
+
+    def get_nodes(self, name, filter_clause, parameters):
+        """Returns a PathNode for each node named `name` that matches
+        `filter_clause`, a Cypher WHERE clause"""
+        return self.session.read_transaction(self._run_get_nodes, name, filter_clause, parameters)
+
+    @staticmethod
+    def _run_expand(tx, node_ids, undesired_edges, targets):
+        targets_clause = 'AND id(m) IN $targets ' if targets is not None else ''
+        result = tx.run(
+            'UNWIND $node_ids AS node_id '
+            'MATCH (n)-[r]-(m) '
+            f'WHERE id(n) = node_id AND NOT type(r) IN $undesired_edges {targets_clause}'
+            'RETURN node_id, id(r) AS rel_id, id(m) AS id, labels(m) AS labels, m.identifier AS identifier',
+            node_ids=node_ids,
+            undesired_edges=undesired_edges,
+            targets=targets,
+        )
+        return [
+            (
+                record['node_id'],
+                record['rel_id'],
+                PathNode(record['id'], tuple(record['labels']), record['identifier']),
+            )
+            for record in result
+        ]
+
+    def expand(self, node_ids, undesired_edges, targets=None):
+        return self.session.read_transaction(self._run_expand, node_ids, undesired_edges, targets)
+
+    @staticmethod
+    def _run_get_paths(tx, rel_ids):
+        result = tx.run(
+            'UNWIND $rel_ids AS rel_id '
+            'MATCH (a)-[r]->(b) WHERE id(r) = rel_id '
+            'RETURN a, r, b',
+            rel_ids=rel_ids,
+        )
+        nodes, relationships = {}, {}
+        for record in result:
+            start_node, relationship, end_node = record.values()
+            nodes[start_node.id] = start_node
+            nodes[end_node.id] = end_node
+            relationships[relationship.id] = relationship
+        return nodes, relationships
+
+    def get_paths(self, paths):
+        """Returns a FoundPath for each of `paths`, as returned by
+        `search_paths`, fetching each node and relationship once"""
+        rel_ids = sorted({rel_id for _, path_rel_ids in paths for rel_id in path_rel_ids})
+        nodes, relationships = self.session.read_transaction(self._run_get_paths, rel_ids)
+        return [
+            FoundPath(
+                [nodes[node_id] for node_id in node_ids],
+                [relationships[rel_id] for rel_id in path_rel_ids],
+            )
+            for node_ids, path_rel_ids in paths
+        ]
@@ -26,13 +26,13 @@ from improving_agent.models.edge import Edge
 from improving_agent.models.edge_binding import EdgeBinding
 from improving_agent.models.knowledge_graph import KnowledgeGraph
 from improving_agent.models.message import Message
-from improving_agent.models.node import Node
 from improving_agent.models.node_binding import NodeBinding
 from improving_agent.models.q_edge import QEdge
 from improving_agent.models.q_node import QNode
 from improving_agent.models.query_graph import QueryGraph
 from improving_agent.models.response import Response
 from improving_agent.models.result import Result
+from improving_agent.models.retrieval_source import RetrievalSource
 from improving_agent.src.basic_query import make_qnode_filter_clause
 from improving_agent.src.biolink.spoke_biolink_constants import (
     BIOLINK_ASSOCIATION_RELATED_TO,
@@ -53,13 +53,21 @@ from improving_agent.src.biolink.spoke_biolink_constants import (
 from improving_agent.src.config import app_config
 from improving_agent.src.normalization import SearchNode
 from improving_agent.src.normalization.node_normalization import (
+    normalize_spoke_nodes_for_translator,
     validate_normalize_qnodes,
 )
 from improving_agent.src.provenance import make_internal_retrieval_source
 from improving_agent.src.result_handling import (
+    apply_normalization,
     make_result_edge,
     make_result_node,
-    normalize,
+)
+from improving_agent.src.template_queries.node_degrees import load_node_degrees
+from improving_agent.src.template_queries.path_cursors import PATH_CURSOR_STORE
+from improving_agent.src.template_queries.path_search import (
+    FoundPath,
+    Neo4jPathGraph,
+    PathSearch,
 )
 from improving_agent.util import get_evidara_logger
 
@@ -76,6 +84,8 @@ class PathfinderConfig(NamedTuple):
     undesired_edges: list[str]
     intermediate_labels: Optional[list[str]] = None
     intermediate_ids: Optional[list[str]] = None
+    max_fan_out: Optional[int] = None
+    max_node_degree: Optional[int] = None
 
 
 DEFAULT_EXCLUDE_EDGES = [
@@ -83,20 +93,18 @@ DEFAULT_EXCLUDE_EDGES = [
     SPOKE_EDGE_TYPE_NEGATIVELYCORRELATED_CaD,
     SPOKE_EDGE_TYPE_NEGATIVELYCORRELATED_DaD,
 ]
+PATHFINDER_EXPANSION_BATCH_SIZE = int(app_config.PATHFINDER_EXPANSION_BATCH_SIZE)
+PATHFINDER_MAX_HOPS = int(app_config.PATHFINDER_MAX_HOPS)
+PATHFINDER_MAX_PATHS = int(app_config.PATHFINDER_MAX_PATHS)
+PATHFINDER_MAX_FAN_OUT = int(app_config.PATHFINDER_MAX_FAN_OUT)
+PATHFINDER_MAX_NODE_DEGREE = int(app_config.PATHFINDER_MAX_NODE_DEGREE)
+PATHFINDER_NODE_DEGREES = load_node_degrees(app_config.PATHFINDER_NODE_DEGREES_PATH)
 
 #######################
 #  Cypher query config
 #######################
 
 
-def cyph_get_path_string(n_hops: int) -> str:
-    return (
-        f'MATCH p=(start)-[path*{n_hops}]-(end) '
-        'WHERE NONE(rel in relationships(p) WHERE type(rel) IN $undesired_edges) '  # (start.identifier=$start_curie AND end.identifier=$end_curie) '
-        # 'AND NONE(rel in relationships(p) WHERE type(rel) IN $undesired_edges) '
-    )
-
-
 def cyph_make_qnode_filter_clause(name, query_node):
     labels_clause = ''
     if query_node.spoke_labels:
@@ -141,139 +149,26 @@ def cyph_make_qnode_filter_clause(name, query_node):
     return ''
 
 
-def _get_label_clause(
-        name: str,
-        labels: Optional[list[str]],
-) -> Optional[str]:
-    if not labels:
-        return
-    labeled_names = [f'{name}:{label}' for label in labels]
-    return f'({" OR ".join(labeled_names)})'
-
-
-def cyph_get_label_constraints_clause(
-    start_labels: Optional[list[str]] = None,
-    end_labels: Optional[list[str]] = None,
-) -> str | None:
-    if not start_labels and not end_labels:
-        return
-    clauses = []
-    for name, labels in (
-        ('start', start_labels),
-        ('end', end_labels),
-    ):
-        clause = _get_label_clause(name, labels)
-        if clause:
-            clauses.append(clause)
-
-    return ' AND '.join(clauses)
-
-
-def cyph_get_intermediate_node_label_constraints(labels: list[str]) -> str:
-    labels_clause = _get_label_clause('i_node', labels)
-    if not labels_clause:
-        return
-    return f'(ANY(i_node in nodes(p) WHERE {labels_clause}))'
-
-
-def cyph_get_intermediate_node_id_constraints(identifiers: list[str]) -> str:
-    if not identifiers:
-        return
-    return '(ANY(i_node in nodes(p) WHERE i_node.identifier in $i_node_ids))'
-
-
-def _get_cypher(
-        pathfinder_cfg: PathfinderConfig,
-        n_hops: int,
-        limit: Optional[int] = 1000,
-        skip: Optional[int] = 0,
-) -> str:
-    cypher = cyph_get_path_string(n_hops)
-    # labels_clause = cyph_get_label_constraints_clause(
-    #     pathfinder_cfg.start_labels,
-    #     pathfinder_cfg.end_labels,
-    # )
-    # if labels_clause:
-    #     cypher += f'AND {labels_clause} '
-    start_clause = cyph_make_qnode_filter_clause(
-        'start',
-        pathfinder_cfg.start_qnode,
-    )
-    cypher += f'AND {start_clause} '
-    end_clause = cyph_make_qnode_filter_clause(
-        'end',
-        pathfinder_cfg.end_qnode,
-    )
-    cypher += f'AND {end_clause} '
-
-    inode_labels_clause = cyph_get_intermediate_node_label_constraints(
-        pathfinder_cfg.intermediate_labels,
-    )
-    if inode_labels_clause:
-        cypher += f'AND {inode_labels_clause} '
-
-    inode_ids_clause = cyph_get_intermediate_node_id_constraints(
-        pathfinder_cfg.intermediate_ids,
-    )
-    if inode_ids_clause:
-        cypher += f'AND {inode_ids_clause} '
-
-    cypher += 'RETURN p '
-    cypher += f'SKIP {skip} '
-    cypher += f'LIMIT {limit};'
-
-    return cypher
-
 # Unpack; serialize results
 
 
-def _get_path_edges(
-    relationships: list[neo4j.graph.Relationship],
-) -> dict[int, Edge]:
-    rel_map = {}
-    for rel in relationships:
-        res_edge = make_result_edge(rel, KNOWLEDGE_TYPE_LOOKUP)
-        rel_map[str(rel.id)] = res_edge
-    return rel_map
-
-
-def _get_path_nodes(
-    nodes: list[neo4j.graph.Node],
-) -> tuple[dict[str, Node], set[SearchNode]]:
-    node_map = {}
-    search_nodes = set()
-    for node in nodes:
-        res_node, search_node = make_result_node(node)
-        search_nodes.add(search_node)
-        node_map[node['identifier']] = res_node
-    return node_map, search_nodes
-
-
-def _get_path_components(
-    path: neo4j.graph.Path,
-) -> tuple[dict[str, Edge], dict[str, Node], set[SearchNode]]:
-    edges = _get_path_edges(path.relationships)
-    nodes, search_nodes = _get_path_nodes(path.nodes)
-    return edges, nodes, search_nodes
-
-
 def _make_pf_result(
-    edges: dict[str, Edge],
+    aux_graph_edges: list[str],
     start_curie: str,
     end_curie: str,
-) -> tuple[Result, dict[str, Edge], dict[str, AuxiliaryGraph]]:
+    start_query_id: Optional[str],
+    end_query_id: Optional[str],
+    edge_id: str,
+    aux_graph_id: str,
+    provenance: RetrievalSource,
+) -> tuple[Result, Edge, AuxiliaryGraph]:
     # set up objects to collect results and query mappings
     edge_bindings, node_bindings = {}, {}
     # make edge for kg for related_to
-    node_bindings['start'] = NodeBinding(id=start_curie, query_id=start_curie)
-    node_bindings['end'] = NodeBinding(id=end_curie, query_id=end_curie)
-
-    provenance = make_internal_retrieval_source([], INFORES_IMPROVING_AGENT.infores_id)
+    node_bindings['start'] = [NodeBinding(id=start_curie, query_id=start_query_id, attributes=[])]
+    node_bindings['end'] = [NodeBinding(id=end_curie, query_id=end_query_id, attributes=[])]
 
-    aux_graph_edges = list(edges.keys())
     aux_graph = AuxiliaryGraph(edges=aux_graph_edges)
-    aux_graph_id = str(uuid4())
-    aux_graph_map = {aux_graph_id: aux_graph}
     supporting_edges_attr = Attribute(
         attribute_source=INFORES_IMPROVING_AGENT.infores_id,
         attribute_type_id=BIOLINK_SLOT_SUPPORT_GRAPHS,
@@ -287,8 +182,6 @@ def _make_pf_result(
         object=end_curie,
         sources=[provenance],
     )
-    edge_id = str(uuid4())
-    inferred_edge = {edge_id: related_to}
     edge_bindings['path'] = [EdgeBinding(edge_id)]
 
     result_analysis = Analysis(
@@ -296,7 +189,7 @@ def _make_pf_result(
         edge_bindings=edge_bindings,
     )
     result = Result(node_bindings, [result_analysis])
-    return result, inferred_edge, aux_graph_map
+    return result, related_to, aux_graph
 
 
 def _make_start_end_search_node(qnode: QNode) -> SearchNode:
@@ -312,51 +205,69 @@ def _make_start_end_search_node(qnode: QNode) -> SearchNode:
 
 
 def _consume_results(
-    paths: list[neo4j.graph.Path],
-    start_qnode: QNode,
-    end_qnode: QNode,
-) -> tuple[KnowledgeGraph, list[Result], dict[str, AuxiliaryGraph]]:
+    paths: list[FoundPath],
+    normalized_curies: Optional[dict] = None,
+) -> tuple[KnowledgeGraph, list[Result], dict[str, AuxiliaryGraph], dict]:
+    """Returns the knowledge graph, results, and aux graphs of `paths`,
+    normalized, and the normalized CURIEs of their SPOKE nodes, as well
+    as those of `normalized_curies`, which are not searched again
+
+    Paths share most of their nodes and relationships, so each is
+    decoded once, by its neo4j id, and paths refer to them by id
+    """
+    nodes, edge_ids = {}, {}
     knowledge_graph = {'edges': {}, 'nodes': {}}
-    aux_graphs = {}
-    results = []
     search_nodes = set()
     for path in paths:
-        # get components and update kg, nodes to normalize
-        p_edges, p_nodes, p_search_nodes = _get_path_components(path)
-        knowledge_graph['edges'] |= p_edges
-        knowledge_graph['nodes'] |= p_nodes
-        search_nodes.update(p_search_nodes)
-
-        # we need to find the start and end node curies by iterating
-        # through the possibilies. This is necessary because we may
-        # search for multiple identifiers for a single node; e.g. with
-        # compound nodes
-        start_curie, end_curie = '', ''
-        start_identifiers = _get_spoke_identifiers(start_qnode)
-        end_identifiers = _get_spoke_identifiers(end_qnode)
-        for p_node_id in p_nodes.keys():
-            if p_node_id in start_identifiers:
-                start_curie = p_node_id
-            if p_node_id in end_identifiers:
-                end_curie = p_node_id
-
-        # create a result object, inferred edge, and aux_graph, then update objects
-        result, inf_edge, aux_graph = _make_pf_result(
-            p_edges,
+        for node in path.nodes:
+            if node.id not in nodes:
+                nodes[node.id] = node['identifier']
+                result_node, search_node = make_result_node(node)
+                knowledge_graph['nodes'][node['identifier']] = result_node
+                search_nodes.add(search_node)
+        for rel in path.relationships:
+            if rel.id not in edge_ids:
+                edge_ids[rel.id] = str(rel.id)
+                knowledge_graph['edges'][edge_ids[rel.id]] = make_result_edge(rel, KNOWLEDGE_TYPE_LOOKUP)
+
+    normalized_curies = normalized_curies or {}
+    search_nodes = [
+        search_node for search_node in search_nodes
+        if search_node.curie not in normalized_curies
+    ]
+    if search_nodes:
+        normalized_curies = {**normalized_curies, **normalize_spoke_nodes_for_translator(search_nodes)}
+    knowledge_graph, _ = apply_normalization(normalized_curies, knowledge_graph, [])
+
+    # results are made with normalized CURIEs, after the above; their
+    # related_to edges and aux graphs are numbered within the response
+    response_id = uuid4()
+    provenance = make_internal_retrieval_source([], INFORES_IMPROVING_AGENT.infores_id)
+    aux_graphs = {}
+    results = []
+    for i, path in enumerate(paths):
+        # paths are ordered from the start node to the end node
+        start_spoke_curie = nodes[path.nodes[0].id]
+        end_spoke_curie = nodes[path.nodes[-1].id]
+        start_curie = normalized_curies[start_spoke_curie]
+        end_curie = normalized_curies[end_spoke_curie]
+        edge_id = f'{response_id}-{i}'
+        aux_graph_id = f'{response_id}-support-{i}'
+        result, related_to, aux_graph = _make_pf_result(
+            [edge_ids[rel.id] for rel in path.relationships],
             start_curie,
             end_curie,
+            start_spoke_curie if start_spoke_curie != start_curie else None,
+            end_spoke_curie if end_spoke_curie != end_curie else None,
+            edge_id,
+            aux_graph_id,
+            provenance,
         )
-        knowledge_graph['edges'] |= inf_edge
-        aux_graphs |= aux_graph
+        knowledge_graph['edges'][edge_id] = related_to
+        aux_graphs[aux_graph_id] = aux_graph
         results.append(result)
 
-    # add search nodes for start and end nodes, as those don't pass through
-    # the typical flow
-    # search_nodes.add(_make_start_end_search_node(start_qnode))
-    # search_nodes.add(_make_start_end_search_node(end_qnode))
-    norm_kg, norm_results = normalize(search_nodes, knowledge_graph, results)
-
-    return norm_kg, norm_results, aux_graphs
+    return knowledge_graph, results, aux_graphs, normalized_curies
 
 
 def _get_pf_query_graph(start_curie: str, end_curie: str) -> QueryGraph:
@@ -421,12 +332,42 @@ def _get_spoke_identifiers(qnode: QNode) -> list[str]:
     return identifiers
 
 
+def _get_request_limit(name: str, value: Optional[str], configured: int) -> Optional[int]:
+    """Returns the limit requested as `value`, a positive int, or the
+    `configured` one if no limit was requested; a request can't raise
+    the configured limit, unless that is 0, i.e. disabled"""
+    if value is None or value == '':
+        return configured or None
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise BadRequest(f'{name} must be a positive integer')
+    if limit < 1:
+        raise BadRequest(f'{name} must be a positive integer')
+    if configured:
+        limit = min(limit, configured)
+    return limit
+
+
+def _get_configured_fan_out() -> int:
+    """Returns the configured fan-out limit, which only applies when the
+    table of node degrees has loaded: without it, neighbors can't be
+    ranked by degree, and capping them would keep arbitrary ones"""
+    if PATHFINDER_NODE_DEGREES is None:
+        return 0
+    return PATHFINDER_MAX_FAN_OUT
+
+
 def _get_query_config(
     start_curie: str,
     end_curie: str,
     intermediate_types: Optional[list[str]],
     intermediate_ids: Optional[list[str]],
+    max_fan_out: Optional[str] = None,
+    max_node_degree: Optional[str] = None,
 ) -> tuple[QueryGraph, PathfinderConfig]:
+    max_fan_out = _get_request_limit('max_fan_out', max_fan_out, _get_configured_fan_out())
+    max_node_degree = _get_request_limit('max_node_degree', max_node_degree, PATHFINDER_MAX_NODE_DEGREE)
     query_graph = _get_pf_query_graph(start_curie, end_curie)
     spoke_nodes = validate_normalize_qnodes(query_graph.nodes)
     intermediate_curies = _get_pf_intermediate_curies(intermediate_ids)
@@ -442,41 +383,49 @@ def _get_query_config(
         undesired_edges=DEFAULT_EXCLUDE_EDGES,
         intermediate_ids=intermediate_curies,
         intermediate_labels=intermediate_labels,
+        max_fan_out=max_fan_out,
+        max_node_degree=max_node_degree,
     )
 
 
-def _run_query(tx, cypher, **kwargs):
-    result = tx.run(cypher, **kwargs)
-    values = []
-    for record in result:
-        values.append(record.values())
-    return values
-
-
-def _iter_query(
-    session: neo4j.Session,
+def _start_search(
+    graph: Neo4jPathGraph,
     config: PathfinderConfig,
-):
-    results = []
-    for n_hop in (2, 3, 4):
-        cypher = _get_cypher(
-            config,
-            n_hop,
+) -> PathSearch:
+    """Returns a search for paths between the start and end nodes of
+    `config`"""
+    start_nodes, end_nodes = [
+        graph.get_nodes(
+            name,
+            cyph_make_qnode_filter_clause(name, qnode),
+            {f'{name}_identifiers': _get_spoke_identifiers(qnode)},
         )
-        start_spoke_ids = _get_spoke_identifiers(config.start_qnode)
-        end_spoke_ids = _get_spoke_identifiers(config.end_qnode)
-        values = session.read_transaction(
-            _run_query,
-            cypher,
-            undesired_edges=config.undesired_edges,
-            start_identifiers=start_spoke_ids,
-            end_identifiers=end_spoke_ids,
+        for name, qnode in (('start', config.start_qnode), ('end', config.end_qnode))
+    ]
+    return PathSearch(
+        start_nodes,
+        end_nodes,
+        config.undesired_edges,
+        config.intermediate_labels,
+        config.intermediate_ids,
+        max_hops=PATHFINDER_MAX_HOPS,
+        batch_size=PATHFINDER_EXPANSION_BATCH_SIZE,
+        node_degrees=PATHFINDER_NODE_DEGREES,
+        max_fan_out=config.max_fan_out,
+        max_node_degree=config.max_node_degree,
+    )
+
+
+def _load_cursor(cursor: str, start_curie: str, end_curie: str) -> dict:
+    state = PATH_CURSOR_STORE.load(cursor)
+    if state is None:
+        raise BadRequest('cursor is unknown or has expired')
+    request = state['request']
+    if (request['start_curie'], request['end_curie']) != (start_curie, end_curie):
+        raise BadRequest(
+            f'cursor is for paths from {request["start_curie"]} to {request["end_curie"]}'
         )
-        if not values:
-            continue
-        results = [v[0] for v in values]
-        break
-    return results
+    return state
 
 
 def _do_pathfinder(
@@ -485,22 +434,65 @@ def _do_pathfinder(
     end_curie: str,
     intermediate_types: Optional[list[str]],
     intermediate_ids: Optional[list[str]],
+    max_fan_out: Optional[str] = None,
+    max_node_degree: Optional[str] = None,
+    page_size: Optional[str] = None,
+    cursor: Optional[str] = None,
 ):
+    # later pages continue the search, with the parameters, of the first
+    state = None
+    if cursor:
+        state = _load_cursor(cursor, start_curie, end_curie)
+        request = state['request']
+        intermediate_types = request['intermediate_types']
+        intermediate_ids = request['intermediate_ids']
+        max_fan_out = request['max_fan_out']
+        max_node_degree = request['max_node_degree']
+        page_size = request['page_size']
+    if page_size is not None:
+        page_size = _get_request_limit('page_size', page_size, PATHFINDER_MAX_PATHS)
+
     query_graph, config = _get_query_config(
         start_curie,
         end_curie,
         intermediate_types,
         intermediate_ids,
+        max_fan_out,
+        max_node_degree,
     )
-    raw_results = _iter_query(session, config)
-    if not raw_results:
+    graph = Neo4jPathGraph(session)
+    if state is None:
+        search = _start_search(graph, config)
+        normalized_curies = {}
+    else:
+        search = PathSearch.from_dict(state['search'], PATHFINDER_NODE_DEGREES)
+        # as pairs, since SPOKE identifiers may be ints
+        normalized_curies = dict(state['normalized_curies'])
+
+    found = search.next_paths(graph, page_size or PATHFINDER_MAX_PATHS)
+    if not found:
         raise NoResultsError('Could not find any paths for input parameters')
-    knowledge_graph, results, aux_graphs = _consume_results(
-        raw_results,
-        config.start_qnode,
-        config.end_qnode,
+    knowledge_graph, results, aux_graphs, normalized_curies = _consume_results(
+        graph.get_paths(found),
+        normalized_curies,
     )
-    return query_graph, knowledge_graph, results, aux_graphs
+
+    next_cursor = None
+    if page_size and not search.exhausted:
+        next_cursor = PATH_CURSOR_STORE.save({
+            'request': {
+                'start_curie': start_curie,
+                'end_curie': end_curie,
+                'intermediate_types': intermediate_types,
+                'intermediate_ids': intermediate_ids,
+                'max_fan_out': config.max_fan_out,
+                'max_node_degree': config.max_node_degree,
+                'page_size': page_size,
+            },
+            'search': search.to_dict(),
+            'normalized_curies': list(normalized_curies.items()),
+        })
+    return query_graph, knowledge_graph, results, aux_graphs, next_cursor
 
 
 def try_pathfinder(
@@ -509,14 +501,26 @@ def try_pathfinder(
     end_curie: str,
     intermediate_types: Optional[list[str]],
     intermediate_ids: Optional[list[str]],
+    max_fan_out: Optional[str] = None,
+    max_node_degree: Optional[str] = None,
+    page_size: Optional[str] = None,
+    cursor: Optional[str] = None,
 ):
+    """Returns the TRAPI Response of a pathfinder search, its HTTP status
+    code, and, if `page_size` or `cursor` is given and more paths may
+    remain, the cursor of the next page, else None"""
+    next_cursor = None
     try:
-        q_graph, k_graph, results, aux_graphs = _do_pathfinder(
+        q_graph, k_graph, results, aux_graphs, next_cursor = _do_pathfinder(
             session,
             start_curie,
             end_curie,
             intermediate_types,
             intermediate_ids,
+            max_fan_out,
+            max_node_degree,
+            page_size,
+            cursor,
         )
         message = Message(
             results,
@@ -531,7 +535,7 @@ def try_pathfinder(
             schema_version=app_config.TRAPI_VERSION,
             biolink_version=app_config.BIOLINK_VERSION,
             logs=[],
-        ), 200
+        ), 200, next_cursor
     except NoResultsError as e:
         return Response(
             message=Message(),
@@ -540,7 +544,7 @@ def try_pathfinder(
             schema_version=app_config.TRAPI_VERSION,
             biolink_version=app_config.BIOLINK_VERSION,
             logs=[],
-        ), 200
+        ), 200, None
     except (
         AmbiguousPredicateMappingError,
         BadRequest,
@@ -556,7 +560,7 @@ def try_pathfinder(
             schema_version=app_config.TRAPI_VERSION,
             biolink_version=app_config.BIOLINK_VERSION,
             logs=[],
-        ), 400
+        ), 400, None
     except (
         NonLinearQueryError,
         UnmatchedIdentifierError,
@@ -570,7 +574,7 @@ def try_pathfinder(
             schema_version=app_config.TRAPI_VERSION,
             biolink_version=app_config.BIOLINK_VERSION,
             logs=[],
-        ), 200
+        ), 200, None
     except (NotImplemented, UnsupportedSetInterpretation) as e:
         return Response(
             message=Message(),
@@ -579,7 +583,7 @@ def try_pathfinder(
             schema_version=app_config.TRAPI_VERSION,
             biolink_version=app_config.BIOLINK_VERSION,
             logs=[],
-        ), NotImplemented.code
+        ), NotImplemented.code, None
     except Exception as e:
         _logger.exception(str(e))
         timestamp = datetime.now().isoformat()
@@ -596,7 +600,7 @@ def try_pathfinder(
             schema_version=app_config.TRAPI_VERSION,
             biolink_version=app_config.BIOLINK_VERSION,
             logs=[],
-        ), 500
+        ), 500, None
 
 
 
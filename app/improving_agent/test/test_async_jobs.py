@@ -0,0 +1,179 @@
+"""This module provides tests for the async query job engine"""
+import json
+import os
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from improving_agent.models import Message, Response
+from improving_agent.src.async_jobs import (
+    JOB_STATUS_COMPLETED,
+    JOB_STATUS_FAILED,
+    JOB_STATUS_QUEUED,
+    JOB_STATUS_RUNNING,
+    AsyncQueryEngine,
+    AsyncQueueFullError,
+    SqliteJobStore,
+)
+
+
+class _StubCallbackHandler(BaseHTTPRequestHandler):
+    """Records the bodies POSTed to it, failing the first
+    `server.n_failures` requests with a 500"""
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with self.server.lock:
+            self.server.n_requests += 1
+            fail = self.server.n_requests <= self.server.n_failures
+            if not fail:
+                self.server.bodies.append(body)
+        self.send_response(500 if fail else 200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def _run_query(raw_json):
+    if raw_json.get('fail'):
+        return Response(message=Message(), status='Bad Request', description='bad query'), 400
+    return Response(message=Message(results=[]), description='Success'), 200
+
+
+class TestAsyncQueryEngine():
+    @classmethod
+    def setup_class(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _StubCallbackHandler)
+        cls.server.lock = threading.Lock()
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.server_thread.start()
+        cls.callback = f'http://127.0.0.1:{cls.server.server_port}/callback'
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setup_method(self):
+        self.server.n_requests = 0
+        self.server.n_failures = 0
+        self.server.bodies = []
+
+    def _make_engine(self, tmp_path, run_query=_run_query, **kwargs):
+        store = SqliteJobStore(str(tmp_path / 'jobs.sqlite3'))
+        return AsyncQueryEngine(
+            store, run_query, callback_backoff=0, session=requests.Session(), **kwargs
+        )
+
+    def test_job_posts_response_to_callback(self, tmp_path):
+        engine = self._make_engine(tmp_path)
+        job_id = engine.submit({'message': {}}, self.callback)
+        engine.join()
+
+        job = engine.store.get(job_id)
+        assert job['status'] == JOB_STATUS_COMPLETED
+        assert [log['message'] for log in job['logs']] == [
+            'Query has been queued',
+            'Query started',
+            'Query finished with 0 results',
+            'Callback returned 200',
+        ]
+        assert self.server.bodies == [{'message': {'results': []}, 'description': 'Success'}]
+
+    def test_callback_is_retried(self, tmp_path):
+        self.server.n_failures = 2
+        engine = self._make_engine(tmp_path, callback_retries=2)
+        job_id = engine.submit({'message': {}}, self.callback)
+        engine.join()
+
+        job = engine.store.get(job_id)
+        assert job['status'] == JOB_STATUS_COMPLETED
+        assert self.server.n_requests == 3
+        assert len(self.server.bodies) == 1
+
+    def test_callback_gives_up(self, tmp_path):
+        self.server.n_failures = 10
+        engine = self._make_engine(tmp_path, callback_retries=1)
+        job_id = engine.submit({'message': {}}, self.callback)
+        engine.join()
+
+        job = engine.store.get(job_id)
+        assert job['status'] == JOB_STATUS_FAILED
+        assert job['description'] == 'Callback URL returned 500'
+        assert self.server.n_requests == 2
+
+    def test_failed_query_is_still_sent(self, tmp_path):
+        engine = self._make_engine(tmp_path)
+        job_id = engine.submit({'message': {}, 'fail': True}, self.callback)
+        engine.join()
+
+        job = engine.store.get(job_id)
+        assert job['status'] == JOB_STATUS_FAILED
+        assert job['description'] == 'bad query'
+        assert self.server.bodies[0]['status'] == 'Bad Request'
+
+    def test_queue_is_bounded(self, tmp_path):
+        release = threading.Event()
+
+        def blocking_run_query(raw_json):
+            release.wait(5)
+            return _run_query(raw_json)
+
+        engine = self._make_engine(tmp_path, blocking_run_query, max_workers=1, max_queued_jobs=1)
+        first_job_id = engine.submit({'message': {}}, self.callback)
+        # wait for the worker to take the first job off the queue
+        while engine.store.get(first_job_id)['status'] == JOB_STATUS_QUEUED:
+            release.wait(0.01)
+        engine.submit({'message': {}}, self.callback)
+        with pytest.raises(AsyncQueueFullError):
+            engine.submit({'message': {}}, self.callback)
+        release.set()
+        engine.join()
+        assert len(self.server.bodies) == 2
+
+    def test_store_is_shared_across_connections(self, tmp_path):
+        path = str(tmp_path / 'jobs.sqlite3')
+        SqliteJobStore(path).create('job', self.callback, 'Query has been queued')
+        assert SqliteJobStore(path).get('job')['status'] == JOB_STATUS_QUEUED
+        assert SqliteJobStore(path).get('missing') is None
+
+    def test_concurrent_log_appends_are_kept(self, tmp_path):
+        path = str(tmp_path / 'jobs.sqlite3')
+        SqliteJobStore(path).create('job', self.callback, 'Query has been queued')
+
+        def append_logs(i):
+            store = SqliteJobStore(path)
+            for j in range(20):
+                store.update('job', log_entry={'message': f'{i}-{j}'})
+
+        threads = [threading.Thread(target=append_logs, args=(i,)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(SqliteJobStore(path).get('job')['logs']) == 81
+
+    def test_jobs_of_exited_processes_are_failed(self, tmp_path):
+        path = str(tmp_path / 'jobs.sqlite3')
+        store = SqliteJobStore(path)
+        for job_id in ('exited', 'own', 'other_host'):
+            store.create(job_id, self.callback, 'Query has been queued')
+        store.update('own', JOB_STATUS_RUNNING)
+        connection = store._get_connection()
+        # pids are below 2 ** 22 on linux
+        for job_id, owner in (
+            ('exited', f'{socket.gethostname()}:{2 ** 22 + 1}'),
+            ('other_host', f'not-{socket.gethostname()}:{os.getpid()}'),
+        ):
+            connection.execute('UPDATE jobs SET owner = ? WHERE job_id = ?', (owner, job_id))
+
+        assert store.get('exited')['status'] == JOB_STATUS_FAILED
+        assert store.get('own')['status'] == JOB_STATUS_RUNNING
+        # on startup, jobs recorded for the new process's own pid are stale
+        assert store.fail_abandoned_jobs(include_own=True) == ['own']
+        assert store.get('own')['logs'][-1]['level'] == 'ERROR'
+        assert store.get('other_host')['status'] == JOB_STATUS_QUEUED
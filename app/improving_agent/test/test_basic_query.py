@@ -0,0 +1,210 @@
+"""This module provides tests for BasicQuery"""
+from unittest.mock import Mock, patch
+
+import pytest
+from neo4j.graph import Graph
+
+from improving_agent import models
+from improving_agent.models import QEdge, QNode
+from improving_agent.src.basic_query import (
+    BasicQuery,
+    DecodedEdge,
+    DecodedNode,
+    get_cypher_identifier_values,
+    make_qnode_filter_clause,
+)
+
+
+def _make_qnode(qnode_id, categories, spoke_labels, spoke_identifiers):
+    qnode = QNode(categories=categories, constraints=[])
+    setattr(qnode, 'qnode_id', qnode_id)
+    setattr(qnode, 'spoke_labels', spoke_labels)
+    setattr(qnode, 'spoke_identifiers', spoke_identifiers)
+    return qnode
+
+
+def _make_qedge(qedge_id, subject, object_, spoke_edge_types):
+    qedge = QEdge(subject=subject, object=object_, attribute_constraints=[])
+    setattr(qedge, 'qedge_id', qedge_id)
+    setattr(qedge, 'spoke_edge_types', spoke_edge_types)
+    return qedge
+
+
+def _make_one_hop_query(disease_ids, n_results=200, parameterize_cypher=True):
+    qnodes = {
+        'n0': _make_qnode(
+            'n0',
+            ['biolink:Disease'],
+            ['Disease'],
+            {f"'{_id}'": _id for _id in disease_ids},
+        ),
+        'n1': _make_qnode('n1', ['biolink:Gene'], ['Gene'], {}),
+    }
+    qedges = {'e0': _make_qedge('e0', 'n0', 'n1', {'ASSOCIATES_DaG'})}
+    query = BasicQuery(qnodes, qedges, n_results=n_results, parameterize_cypher=parameterize_cypher)
+    query.make_query_order()
+    return query
+
+
+class TestCypherCompilation():
+    def test_get_cypher_identifier_values(self):
+        values = get_cypher_identifier_values(["'DOID:9352'", '3845', "'CHEMBL25'", 'WP314'])
+        assert values == ['DOID:9352', 3845, 'CHEMBL25', 'WP314']
+
+    def test_qnode_filter_clause_inline(self):
+        qnode = _make_qnode('n0', ['biolink:Disease'], ['Disease'], {"'DOID:9352'": 'DOID:9352'})
+        clause = make_qnode_filter_clause('a', qnode)
+        assert clause == "((a:Disease) AND a.identifier IN ['DOID:9352'])"
+
+    def test_qnode_filter_clause_parameterized(self):
+        qnode = _make_qnode('n0', ['biolink:Disease'], ['Disease'], {"'DOID:9352'": 'DOID:9352'})
+        parameters = {}
+        clause = make_qnode_filter_clause('a', qnode, parameters)
+        assert clause == '((a:Disease) AND a.identifier IN $a_identifiers)'
+        assert parameters == {'a_identifiers': ['DOID:9352']}
+
+    def test_qnode_filter_clause_parameterized_compound(self):
+        qnode = _make_qnode(
+            'n0',
+            ['biolink:SmallMolecule'],
+            ['Compound'],
+            {"'CHEMBL25'": 'CHEMBL.COMPOUND:CHEMBL25'},
+        )
+        parameters = {}
+        clause = make_qnode_filter_clause('c', qnode, parameters)
+        assert '(c.identifier IN $c_identifiers OR c.chembl_id IN $c_identifiers)' in clause
+        assert parameters == {'c_identifiers': ['CHEMBL25']}
+
+    def test_cypher_query_string_is_shared_across_identifiers(self):
+        query_1 = _make_one_hop_query(['DOID:9352'], n_results=100)
+        query_2 = _make_one_hop_query(['DOID:1612', 'DOID:10652'], n_results=500)
+
+        assert query_1.make_cypher_query_string() == query_2.make_cypher_query_string()
+        assert query_1.query_parameters == {'a_identifiers': ['DOID:9352'], 'n_results': 100}
+        assert query_2.query_parameters == {'a_identifiers': ['DOID:1612', 'DOID:10652'], 'n_results': 500}
+
+    def test_cypher_query_string_inline(self):
+        query = _make_one_hop_query(['DOID:9352'], n_results=100, parameterize_cypher=False)
+        query_string = query.make_cypher_query_string()
+        assert "IN ['DOID:9352']" in query_string
+        assert query_string.endswith('RETURN * limit 100;')
+        assert query.query_parameters == {}
+
+
+def _make_n4j_records(n_records):
+    graph = Graph()
+    hydrator = Graph.Hydrator(graph)
+    disease = hydrator.hydrate_node(1, ['Disease'], {'identifier': 'DOID:9352', 'name': 'type 2 diabetes mellitus'})
+    records = []
+    for i in range(n_records):
+        gene = hydrator.hydrate_node(100 + i, ['Gene'], {'identifier': 1000 + i, 'name': f'GENE{i}'})
+        rel = hydrator.hydrate_relationship(10_000 + i, 1, 100 + i, 'ASSOCIATES_DaG', {'sources': ['DISEASES']})
+        record = Mock()
+        record.values.return_value = (disease, rel, gene)
+        records.append(record)
+    return records
+
+
+class TestStreamingExtraction():
+    def test_run_query_decodes_records(self):
+        query = _make_one_hop_query(['DOID:9352'])
+        query.make_cypher_query_string()
+        tx = Mock()
+        tx.run.return_value = iter(_make_n4j_records(2))
+
+        decoded_records = query.run_query(tx, 'MATCH ...', {'n_results': 2})
+
+        tx.run.assert_called_once_with('MATCH ...', {'n_results': 2})
+        assert query.results == []
+        assert decoded_records[0] == (
+            DecodedNode('DOID:9352', ('Disease',), {'identifier': 'DOID:9352', 'name': 'type 2 diabetes mellitus'}),
+            DecodedEdge('10000', 'ASSOCIATES_DaG', 'DOID:9352', 1000, {'sources': ['DISEASES']}),
+            DecodedNode(1000, ('Gene',), {'identifier': 1000, 'name': 'GENE0'}),
+        )
+
+    def test_extract_result_from_decoded_record(self):
+        query = _make_one_hop_query(['DOID:9352'])
+        query.make_cypher_query_string()
+        tx = Mock()
+        tx.run.return_value = iter(_make_n4j_records(1))
+        decoded_record = query.run_query(tx, 'MATCH ...')[0]
+
+        result = query.extract_result(decoded_record)
+
+        assert result.node_bindings['n0'].id == 'DOID:9352'
+        assert result.node_bindings['n1'].id == 1000
+        assert result.analyses[0].edge_bindings['e0'][0].id == '10000'
+        assert query.knowledge_graph['edges']['10000'].subject == 'DOID:9352'
+        assert query.knowledge_graph['nodes'][1000].name == 'GENE0'
+
+    def test_extract_result_reuses_built_objects(self):
+        query = _make_one_hop_query(['DOID:9352'])
+        query.make_cypher_query_string()
+        tx = Mock()
+        tx.run.return_value = iter(_make_n4j_records(3))
+        decoded_records = query.run_query(tx, 'MATCH ...')
+        decoded_records.append(decoded_records[0])
+
+        results = [query.extract_result(record) for record in decoded_records]
+
+        assert len(results) == 4
+        assert len(query.knowledge_graph['nodes']) == 4
+        assert len(query.knowledge_graph['edges']) == 3
+        assert query.build_cache_stats == {
+            'node_hits': 4, 'node_misses': 4, 'edge_hits': 1, 'edge_misses': 3
+        }
+        assert query.get_build_cache_hit_rates() == {'nodes': 0.5, 'edges': 0.25}
+
+
+def _make_scored_query(n_results, psev_context):
+    query = _make_one_hop_query(['DOID:9352'])
+    query.query_options = {'psev_context': psev_context}
+    query.knowledge_graph['nodes']['DOID:9352'] = models.Node(attributes=[
+        models.Attribute(original_attribute_name='identifier', value='DOID:9352'),
+    ])
+    results = []
+    for i in range(n_results):
+        query.knowledge_graph['nodes'][f'NCBIGene:{i}'] = models.Node(attributes=[
+            models.Attribute(original_attribute_name='identifier', value=i),
+            models.Attribute(original_attribute_name='name', value=f'GENE{i}'),
+        ])
+        query.knowledge_graph['edges'][str(i)] = models.Edge(attributes=[
+            models.Attribute(original_attribute_name='spearman_correlation', value=i / n_results),
+        ])
+        node_bindings = {
+            'n0': [models.NodeBinding(id='DOID:9352')],
+            'n1': [models.NodeBinding(id=f'NCBIGene:{i}')],
+        }
+        analysis = models.Analysis(edge_bindings={'e0': [models.EdgeBinding(id=str(i))]})
+        results.append(models.Result(node_bindings, [analysis]))
+    return query, results
+
+
+class TestScoring():
+    psev_scores = {
+        'DOID:9352': {'DOID:9352': 1e-4, 0: 2e-4, 2: 5e-5},
+        'DOID:1612': {1: 3e-4, 2: 5e-5},
+    }
+
+    def test_vectorized_scores_with_psev(self):
+        query, results = _make_scored_query(4, ['DOID:9352', 'DOID:1612'])
+
+        scores = query.get_result_scores(results, self.psev_scores)
+
+        # PSEVs summed across concepts, times 10000, of DOID:9352 (1) and
+        # each gene (2, 3, 1, 0), plus the edges' correlations
+        assert scores.tolist() == pytest.approx([3.0, 4.25, 2.5, 1.75])
+
+    def test_vectorized_scores_without_psev(self):
+        query, results = _make_scored_query(4, None)
+
+        scores = query.get_result_scores(results, self.psev_scores)
+
+        assert scores.tolist() == pytest.approx([0, 0.25, 0.5, 0.75])
+
+    def test_normalized_scores(self):
+        query, results = _make_scored_query(3, None)
+        with patch.object(BasicQuery, '_get_psev_scores', return_value={}):
+            query.score_results(results, norm_scores=True)
+
+        assert [result.analyses[0].score for result in results] == [0.01, 0.505, 1.0]
@@ -0,0 +1,163 @@
+"""This module provides tests for batched query execution"""
+from unittest.mock import MagicMock, patch
+
+import pytest
+from neo4j.graph import Graph
+
+import improving_agent.__main__  # noqa: F401 - core imports get_db from it
+from improving_agent.models import Response
+from improving_agent.src import batch_query
+from improving_agent.src.basic_query import BATCH_QUERY_INDEX
+from improving_agent.src.caching import LruTtlCache
+from improving_agent.src.normalization import node_normalization
+from improving_agent.src.normalization.sri_node_normalizer import SriNodeNormalizer
+from improving_agent.src.psev import PSEV_SCORE_CACHE, PsevClient, prefetch_psev_scores
+from improving_agent.test.test_basic_query import _make_one_hop_query
+
+
+def _make_raw_query(disease_id, max_results=10):
+    return {
+        'message': {
+            'query_graph': {
+                'nodes': {
+                    'n0': {'ids': [disease_id], 'categories': ['biolink:Disease']},
+                    'n1': {'categories': ['biolink:Gene']},
+                },
+                'edges': {'e0': {'subject': 'n0', 'object': 'n1', 'predicates': ['biolink:associated_with']}},
+            }
+        },
+        'max_results': max_results,
+        'bypass_cache': True,
+    }
+
+
+class FakeSession:
+    """Answers batch queries with two genes associated with each
+    disease of the batch"""
+    def __init__(self):
+        self.transactions = []
+        self.hydrator = Graph.Hydrator(Graph())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def _make_records(self, parameters):
+        records = []
+        for row in parameters['batch']:
+            batch_index = row[BATCH_QUERY_INDEX]
+            disease_id = row['a_identifiers'][0]
+            disease = self.hydrator.hydrate_node(batch_index, ['Disease'], {'identifier': disease_id})
+            for i in range(2):
+                gene_id = 1000 * (batch_index + 1) + i
+                gene = self.hydrator.hydrate_node(gene_id, ['Gene'], {'identifier': gene_id})
+                rel = self.hydrator.hydrate_relationship(
+                    gene_id, batch_index, gene_id, 'ASSOCIATES_DaG', {'sources': ['DISEASES']}
+                )
+                record = MagicMock()
+                record.__getitem__.side_effect = {BATCH_QUERY_INDEX: batch_index}.__getitem__
+                record.values.return_value = (disease, rel, gene)
+                records.append(record)
+        return records
+
+    def read_transaction(self, fn, query_string, parameters, *args):
+        self.transactions.append((query_string, parameters))
+        tx = MagicMock()
+        tx.run.return_value = iter(self._make_records(parameters))
+        return fn(tx, query_string, parameters, *args)
+
+
+class TestBatchCypher():
+    def test_batch_query_string_is_shared_across_identifiers(self):
+        query_1 = _make_one_hop_query(['DOID:9352'], n_results=100)
+        query_2 = _make_one_hop_query(['DOID:1612', 'DOID:10652'], n_results=100)
+
+        query_string = query_1.make_batch_cypher_query_string()
+        assert query_string == query_2.make_batch_cypher_query_string()
+        assert query_string.startswith('UNWIND $batch AS batch_query CALL { WITH batch_query MATCH')
+        assert 'a.identifier IN batch_query.a_identifiers' in query_string
+        assert query_string.endswith('RETURN a, b, c LIMIT $n_results } RETURN batch_query.batch_index AS batch_index, a, b, c;')
+        assert query_2.query_parameters == {'a_identifiers': ['DOID:1612', 'DOID:10652']}
+
+    def test_group_batch_queriers(self):
+        queriers = {
+            0: _make_one_hop_query(['DOID:9352'], n_results=100),
+            1: _make_one_hop_query(['DOID:1612'], n_results=100),
+            2: _make_one_hop_query(['DOID:10652'], n_results=50),
+        }
+        groups = batch_query.group_batch_queriers(queriers)
+        assert sorted(groups.values()) == [[0, 1], [2]]
+
+        parameters = batch_query.make_batch_parameters(queriers, [0, 1], 100)
+        assert parameters == {
+            'batch': [
+                {'a_identifiers': ['DOID:9352'], 'batch_index': 0},
+                {'a_identifiers': ['DOID:1612'], 'batch_index': 1},
+            ],
+            'n_results': 100,
+        }
+
+
+class TestProcessBatchQuery():
+    def test_queries_share_normalization_and_db_work(self):
+        session = FakeSession()
+        raw_queries = [_make_raw_query(disease_id) for disease_id in ('DOID:9352', 'DOID:1612', 'DOID:10652')]
+        raw_queries.append({'message': {}})
+        PSEV_SCORE_CACHE.clear()
+
+        def get_psev_scores_by_concept(self, identifiers_by_concept):
+            return {
+                concept: {identifier: 0.5 for identifier in identifiers}
+                for concept, identifiers in identifiers_by_concept.items()
+            }
+
+        sri_session = MagicMock()
+        sri_session.post.return_value.status_code = 404  # nothing normalizes
+        normalizer = SriNodeNormalizer(LruTtlCache(), session=sri_session)
+
+        with patch.object(batch_query, 'get_db', return_value=session), \
+                patch.object(node_normalization, 'SRI_NODE_NORMALIZER', normalizer), \
+                patch.object(PsevClient, 'get_psev_scores_by_concept', get_psev_scores_by_concept), \
+                patch.object(PsevClient, 'get_psev_scores') as get_psev_scores:
+            responses = batch_query.process_batch_query(raw_queries)
+
+        # one neo4j transaction and one search for the result nodes
+        assert len(session.transactions) == 1
+        assert len(session.transactions[0][1]['batch']) == 3
+        sri_session.post.assert_called_once()
+        # queries are scored from the prefetched PSEVs
+        get_psev_scores.assert_not_called()
+
+        for batch_index, response in enumerate(responses[:3]):
+            assert isinstance(response, Response)
+            assert len(response.message.results) == 2
+            assert {
+                result.node_bindings['n1'][0].id for result in response.message.results
+            } == {f'NCBIGene:{1000 * (batch_index + 1) + i}' for i in range(2)}
+        error_response, status_code = responses[3]
+        assert status_code == 400
+        assert error_response.status == 'Bad Request'
+
+
+class TestPrefetchPsevScores():
+    def test_fetches_missing_scores_once_per_concept(self):
+        PSEV_SCORE_CACHE.clear()
+        PSEV_SCORE_CACHE.set_identifier_scores({'DOID:9352': {'1': 0.1}})
+
+        with patch.object(PsevClient, 'get_psev_scores_by_concept', return_value={
+            'DOID:9352': {'2': 0.2},
+            'DOID:1612': {'1': 0.3, '2': 0.4},
+        }) as get_psev_scores_by_concept:
+            prefetch_psev_scores({'DOID:9352': {1, 2}, 'DOID:1612': [1, 2]})
+
+        get_psev_scores_by_concept.assert_called_once_with({
+            'DOID:9352': ['2'],
+            'DOID:1612': ['1', '2'],
+        })
+        cached, missing = PSEV_SCORE_CACHE.get_identifier_scores(['DOID:9352', 'DOID:1612'], ['1', '2'])
+        assert not missing
+        assert cached['DOID:9352'] == pytest.approx({'1': 0.1, '2': 0.2})
+        assert cached['DOID:1612'] == pytest.approx({'1': 0.3, '2': 0.4})
+        PSEV_SCORE_CACHE.clear()
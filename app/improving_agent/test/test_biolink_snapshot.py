@@ -0,0 +1,82 @@
+"""This module provides tests for the biolink model snapshot"""
+from types import SimpleNamespace
+
+import pytest
+
+from improving_agent.src.biolink import biolink
+from improving_agent.src.biolink.snapshot import BiolinkSnapshot, build_biolink_snapshot
+
+
+class FakeToolkit:
+    """The parts of bmt.Toolkit used to build a snapshot"""
+    elements = {
+        'named thing': SimpleNamespace(name='named thing', class_uri='biolink:NamedThing'),
+        'gene': SimpleNamespace(name='gene', class_uri='biolink:Gene'),
+        'RNA product': SimpleNamespace(name='RNA product', class_uri='biolink:RNAProduct'),
+        'treats': SimpleNamespace(name='treats', slot_uri='biolink:treats', inverse='treated by'),
+        'treated by': SimpleNamespace(name='treated by', slot_uri='biolink:treated_by', inverse='treats'),
+    }
+    children = {'named thing': ['gene', 'RNA product']}
+
+    def get_all_elements(self):
+        return list(self.elements)
+
+    def get_element(self, name):
+        for element in self.elements.values():
+            if name in (element.name, element.name.replace(' ', '_'), f'biolink:{element.name.replace(" ", "_")}'):
+                return element
+            if name in (getattr(element, 'class_uri', None), getattr(element, 'slot_uri', None)):
+                return element
+        return None
+
+    def get_descendants(self, name):
+        return [name] + self.children.get(name, [])
+
+
+class TestBiolinkSnapshot():
+    def test_lookup_and_descendants(self):
+        snapshot = build_biolink_snapshot(FakeToolkit(), '4.1.4')
+        assert snapshot.get_descendants('biolink:NamedThing') == ['named thing', 'gene', 'RNA product']
+        assert snapshot.get_element_name('biolink:RNAProduct') == 'RNA product'
+        # as the toolkit does, other spellings are compared normalized
+        assert snapshot.get_element_name('biolink:RnaProduct') == 'RNA product'
+        assert snapshot.get_inverse('biolink:treats') == 'treated by'
+        assert snapshot.get_inverse('biolink:Gene') is None
+        with pytest.raises(ValueError):
+            snapshot.get_descendants('biolink:Nutrient')
+
+    def test_file_round_trip(self, tmp_path):
+        path = str(tmp_path / 'snapshot' / 'biolink.json')
+        snapshot = build_biolink_snapshot(FakeToolkit(), '4.1.4')
+        snapshot.write(path)
+
+        loaded = BiolinkSnapshot.from_file(path, '4.1.4')
+        assert loaded.to_dict() == snapshot.to_dict()
+        assert BiolinkSnapshot.from_file(path, '4.2.0') is None
+        assert BiolinkSnapshot.from_file(str(tmp_path / 'missing.json'), '4.1.4') is None
+
+
+class TestLoadBiolinkSnapshot():
+    def test_builds_and_caches_when_missing(self, monkeypatch, tmp_path):
+        cache_path = str(tmp_path / 'biolink_snapshot.json')
+        monkeypatch.setattr(biolink.app_config, 'BIOLINK_SNAPSHOT_CACHE_PATH', cache_path)
+        monkeypatch.setattr(biolink, 'get_vendored_snapshot_path', lambda version: str(tmp_path / 'vendored.json'))
+        toolkits = []
+        monkeypatch.setattr(biolink, 'make_toolkit', lambda version: toolkits.append(version) or FakeToolkit())
+
+        snapshot = biolink._load_biolink_snapshot()
+        assert snapshot.get_descendants('biolink:Gene') == ['gene']
+        assert len(toolkits) == 1
+
+        # later workers read the cached snapshot without the toolkit
+        assert biolink._load_biolink_snapshot().to_dict() == snapshot.to_dict()
+        assert len(toolkits) == 1
+
+    def test_mapped_descendants_are_precomputed(self):
+        cached = biolink._get_entity_descendents.cache_info().currsize
+        assert cached >= len([
+            entity
+            for mappings in biolink.BIOLINK_SPOKE_MAPPINGS.values()
+            for entity in mappings
+            if entity in biolink.BIOLINK_SNAPSHOT.lookup
+        ])
@@ -0,0 +1,87 @@
+"""This module provides tests for the cache backends"""
+from unittest.mock import patch
+
+from improving_agent.src.caching import LruTtlCache, SqliteCache, TieredCache
+
+
+class TestLruTtlCache():
+    def test_lru_eviction(self):
+        cache = LruTtlCache(max_size=2)
+        cache.set_many({'a': 1, 'b': 2})
+        cache.get_many(['a'])
+        cache.set_many({'c': 3})
+
+        assert cache.get_many(['a', 'b', 'c']) == {'a': 1, 'c': 3}
+        assert cache.stats['evictions'] == 1
+
+    def test_negative_ttl(self):
+        cache = LruTtlCache(negative_ttl=10)
+        with patch('improving_agent.src.caching.time.monotonic', return_value=100):
+            cache.set_many({'found': {'id': 1}, 'not_found': None})
+        with patch('improving_agent.src.caching.time.monotonic', return_value=105):
+            assert cache.get_many(['found', 'not_found']) == {'found': {'id': 1}, 'not_found': None}
+        with patch('improving_agent.src.caching.time.monotonic', return_value=111):
+            assert cache.get_many(['found', 'not_found']) == {'found': {'id': 1}}
+
+
+class TestSqliteCache():
+    def test_shared_between_instances(self, tmp_path):
+        path = str(tmp_path / 'cache' / 'test.sqlite3')
+        SqliteCache(path).set_many({'a': {'id': 'A'}, 'b': None})
+
+        assert SqliteCache(path).get_many(['a', 'b', 'c']) == {'a': {'id': 'A'}, 'b': None}
+
+    def test_negative_ttl(self, tmp_path):
+        cache = SqliteCache(str(tmp_path / 'test.sqlite3'), negative_ttl=-1)
+        cache.set_many({'a': {'id': 'A'}, 'b': None})
+
+        assert cache.get_many(['a', 'b']) == {'a': {'id': 'A'}}
+
+    def test_raw_values_are_stored_as_they_are(self, tmp_path):
+        path = str(tmp_path / 'test.sqlite3')
+        SqliteCache(path, raw=True).set_many({'a': '{"id":"A"}'})
+
+        assert SqliteCache(path, raw=True).get_many(['a']) == {'a': '{"id":"A"}'}
+        assert SqliteCache(path).get_many(['a']) == {'a': {'id': 'A'}}
+
+    def test_purge_deletes_expired_and_oldest_rows(self, tmp_path):
+        cache = SqliteCache(str(tmp_path / 'test.sqlite3'), negative_ttl=-1, max_rows=2, purge_interval=3600)
+        cache.set_many({'a': 1, 'b': None})
+        cache.set_many({'c': 3, 'd': 4})
+        cache.set_many({'a': 1})
+        cache.purge()
+
+        connection = cache._get_connection()
+        assert sorted(key for key, in connection.execute('SELECT key FROM cache')) == ['a', 'd']
+        assert cache.stats['purged'] == 2
+
+    def test_writes_purge_at_most_every_interval(self, tmp_path):
+        cache = SqliteCache(str(tmp_path / 'test.sqlite3'), max_rows=1, purge_interval=3600)
+        cache.set_many({'a': 1})
+        cache.set_many({'b': 2})
+
+        assert cache.get_many(['a', 'b']) == {'a': 1, 'b': 2}
+        cache.purge_interval = 0
+        cache.set_many({'c': 3})
+        assert cache.get_many(['a', 'b', 'c']) == {'c': 3}
+
+    def test_tiered_backfill(self, tmp_path):
+        memory_cache = LruTtlCache()
+        shared_cache = SqliteCache(str(tmp_path / 'test.sqlite3'))
+        shared_cache.set_many({'a': 1})
+        cache = TieredCache(memory_cache, shared_cache)
+
+        assert cache.get_many(['a', 'b']) == {'a': 1}
+        assert memory_cache.get_many(['a']) == {'a': 1}
+
+    def test_tiered_backfill_keeps_the_remaining_lifetime(self, tmp_path):
+        memory_cache = LruTtlCache(ttl=3600, negative_ttl=3600)
+        shared_cache = SqliteCache(str(tmp_path / 'test.sqlite3'), ttl=10, negative_ttl=5)
+        shared_cache.set_many({'a': 1, 'b': None})
+        cache = TieredCache(memory_cache, shared_cache)
+
+        assert cache.get_many(['a', 'b']) == {'a': 1, 'b': None}
+        found, ttls = memory_cache.get_many_with_ttls(['a', 'b'])
+        assert found == {'a': 1, 'b': None}
+        assert 0 < ttls['a'] <= 10
+        assert 0 < ttls['b'] <= 5
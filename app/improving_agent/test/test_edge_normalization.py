@@ -0,0 +1,61 @@
+"""This module provides tests for qedge predicate and qualifier
+resolution"""
+import pytest
+
+from improving_agent.exceptions import UnsupportedQualifier, UnsupportedTypeError
+from improving_agent.models import QEdge
+from improving_agent.src.normalization import edge_normalization
+from improving_agent.src.normalization.edge_normalization import _get_compatible_spoke_edges
+
+
+def _make_qedge(predicates, qualifiers=None):
+    qualifier_constraints = None
+    if qualifiers is not None:
+        qualifier_constraints = [{'qualifier_set': [
+            {'qualifier_type_id': qualifier_type, 'qualifier_value': value}
+            for qualifier_type, value in qualifiers
+        ]}]
+    return QEdge(subject='n0', object='n1', predicates=predicates, qualifier_constraints=qualifier_constraints)
+
+
+class TestCompatibleSpokeEdges():
+    def test_qualifiers(self):
+        qualifiers = [
+            ('biolink:object_aspect_qualifier', 'expression'),
+            ('biolink:object_direction_qualifier', 'decreased'),
+        ]
+        assert sorted(_get_compatible_spoke_edges(_make_qedge(['biolink:affects'], qualifiers))) == [
+            'DOWNREGULATES_AdG', 'DOWNREGULATES_CdG',
+        ]
+        # qualifier order doesn't matter
+        assert sorted(_get_compatible_spoke_edges(_make_qedge(['biolink:affects'], qualifiers[::-1]))) == [
+            'DOWNREGULATES_AdG', 'DOWNREGULATES_CdG',
+        ]
+
+    def test_qualifier_values_match_parts_of_spoke_values(self):
+        # SPOKE's activity_or_abundance edges match queries for either
+        qualifiers = [
+            ('biolink:object_aspect_qualifier', 'activity'),
+            ('biolink:object_direction_qualifier', 'increased'),
+        ]
+        assert sorted(_get_compatible_spoke_edges(_make_qedge(['biolink:affects'], qualifiers))) == [
+            'UPREGULATES_GPuG', 'UPREGULATES_OGuG',
+        ]
+
+    def test_without_qualifiers_is_memoized(self):
+        edge_normalization._resolve_spoke_edge_types.cache_clear()
+        spoke_edges = _get_compatible_spoke_edges(_make_qedge(['biolink:regulates']))
+        assert sorted(spoke_edges) == [
+            'DOWNREGULATES_GPdG', 'DOWNREGULATES_OGdG', 'UPREGULATES_GPuG', 'UPREGULATES_OGuG',
+        ]
+        assert _get_compatible_spoke_edges(_make_qedge(['biolink:regulates'])) == spoke_edges
+        assert edge_normalization._resolve_spoke_edge_types.cache_info().hits == 1
+
+    @pytest.mark.parametrize('qualifiers, error', [
+        ([('biolink:subject_aspect_qualifier', 'expression')], UnsupportedQualifier),
+        ([('biolink:object_direction_qualifier', 'decreased')], UnsupportedQualifier),
+        ([('biolink:object_aspect_qualifier', 'stability')], UnsupportedTypeError),
+    ])
+    def test_unsupported_qualifiers(self, qualifiers, error):
+        with pytest.raises(error):
+            _get_compatible_spoke_edges(_make_qedge(['biolink:affects'], qualifiers))
@@ -0,0 +1,87 @@
+"""This module provides tests for TRAPI response serialization"""
+import json
+from datetime import datetime
+
+import pytest
+
+from improving_agent import encoder, models
+from improving_agent.encoder import JSONEncoder
+
+
+def _make_response():
+    attribute = models.Attribute(
+        attribute_type_id='biolink:p_value',
+        value=0.01,
+        original_attribute_name='p_value',
+        attributes=[models.Attribute(attribute_type_id='biolink:publications', value=['PMID:1'])],
+    )
+    source = models.RetrievalSource(resource_id='infores:spoke', resource_role='primary_knowledge_source')
+    edge = models.Edge(
+        subject='DOID:9352',
+        object='NCBIGene:3630',
+        predicate='biolink:genetically_associated_with',
+        attributes=[attribute],
+        sources=[source],
+    )
+    node = models.Node(name='INS', categories=['biolink:Gene'], attributes=[])
+    message = models.Message(
+        results=[models.Result(
+            node_bindings={'n0': [models.NodeBinding(id='DOID:9352')]},
+            analyses=[models.Analysis(resource_id='infores:improving-agent', score=0.5)],
+        )],
+        knowledge_graph={'nodes': {'NCBIGene:3630': node}, 'edges': {'e0': edge}},
+    )
+    return models.Response(message=message, description='Success', logs=[])
+
+
+class TestEncoder():
+    def test_matches_per_attribute_encoding(self):
+        def encode_model(o):
+            return {
+                o.attribute_map[attr]: getattr(o, attr)
+                for attr in o.openapi_types
+                if getattr(o, attr) is not None
+            }
+
+        response = _make_response()
+        expected = json.loads(json.dumps(response, default=encode_model))
+
+        assert json.loads(encoder.dumps(response)) == expected
+
+    def test_json_encoder_uses_generated_encoders(self):
+        response = _make_response()
+        assert json.loads(json.dumps(response, cls=JSONEncoder)) == json.loads(encoder.dumps(response))
+
+    def test_nulls_are_skipped_only_on_models(self):
+        node = models.Node(name=None, categories=['biolink:Gene'], attributes=[{'value': None}])
+        assert json.loads(encoder.dumps(node)) == {'categories': ['biolink:Gene'], 'attributes': [{'value': None}]}
+
+    def test_non_json_values(self):
+        value = {'timestamp': datetime(2020, 9, 3, 18, 13, 49), 'ids': ('a',)}
+        assert json.loads(encoder.dumps(value)) == {'timestamp': '2020-09-03T18:13:49', 'ids': ['a']}
+        with pytest.raises(TypeError):
+            encoder.dumps({'value': object()})
+
+
+class TestIterDumps():
+    def test_chunks_join_to_dumps(self):
+        response = _make_response()
+        response.message.auxiliary_graphs = {'a0': models.AuxiliaryGraph(edges=['e0'])}
+        for chunk_size in (1, 64, encoder.STREAM_CHUNK_SIZE):
+            chunks = list(encoder.iter_dumps(response, chunk_size=chunk_size))
+            assert b''.join(chunks) == encoder.dumps(response)
+
+    def test_chunks_are_bounded(self):
+        response = _make_response()
+        nodes = response.message.knowledge_graph['nodes']
+        for i in range(200):
+            nodes[f'NCBIGene:{i}'] = models.Node(name=f'GENE{i}', categories=['biolink:Gene'])
+        chunks = list(encoder.iter_dumps(response, chunk_size=256))
+        assert len(chunks) > 1
+        # a chunk overshoots by at most one item, e.g. an edge
+        assert max(len(chunk) for chunk in chunks) < 4 * 256
+        assert json.loads(b''.join(chunks)) == json.loads(encoder.dumps(response))
+
+    def test_empty_and_non_str_keys(self):
+        value = {'results': [], 'kg': {}, 'flags': {True: 1, 2: None}, 'score': 0}
+        assert b''.join(encoder.iter_dumps(value)) == encoder.dumps(value)
@@ -0,0 +1,39 @@
+"""This module provides tests for the shared outbound HTTP sessions"""
+from unittest.mock import Mock, patch
+
+from improving_agent.src.http_sessions import (
+    SERVICE_COHD,
+    SERVICE_HTTP_CONFIGS,
+    SERVICE_PSEV,
+    get_session,
+    make_session,
+    set_session,
+)
+from improving_agent.src.psev.psev_client import PsevClient
+
+
+class TestHttpSessions():
+    def test_sessions_are_shared(self):
+        assert get_session(SERVICE_COHD) is get_session(SERVICE_COHD)
+        assert get_session(SERVICE_COHD) is not get_session(SERVICE_PSEV)
+
+    def test_default_timeout(self):
+        session = make_session(SERVICE_HTTP_CONFIGS[SERVICE_COHD])
+        with patch('requests.Session.request') as mock_request:
+            session.get('http://cohd.example.org')
+            session.get('http://cohd.example.org', timeout=1)
+
+        assert mock_request.call_args_list[0].kwargs['timeout'] == SERVICE_HTTP_CONFIGS[SERVICE_COHD].timeout
+        assert mock_request.call_args_list[1].kwargs['timeout'] == 1
+
+    def test_injected_session(self):
+        session = Mock()
+        session.post.return_value.json.return_value = {'DOID:9352': {'1': 0.5}, 'more_available': False}
+        set_session(SERVICE_PSEV, session)
+        try:
+            scores = PsevClient('key', 'http://psev').get_psev_scores(['DOID:9352'], ['1'])
+        finally:
+            set_session(SERVICE_PSEV, None)
+
+        assert scores == {'DOID:9352': {'1': 0.5}}
+        assert session.post.call_args.args[0] == 'http://psev/psev/DOID:9352'
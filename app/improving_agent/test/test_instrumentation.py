@@ -0,0 +1,72 @@
+"""This module provides tests for query pipeline instrumentation"""
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+
+from improving_agent.models import LogLevel
+from improving_agent.src.http_sessions import ServiceSession
+from improving_agent.src.instrumentation import (
+    COUNT_RECORDS,
+    STAGE_CYPHER,
+    STAGE_TOTAL,
+    MetricsRegistry,
+    count,
+    in_current_trace,
+    span,
+    trace_query,
+)
+
+
+class TestQueryTrace():
+    def test_spans_and_counts_are_recorded(self):
+        with trace_query() as trace:
+            with span(STAGE_CYPHER):
+                pass
+            count(COUNT_RECORDS, 3)
+            count(COUNT_RECORDS, 2)
+
+        assert [stage for stage, _, _ in trace.spans] == [STAGE_CYPHER, STAGE_TOTAL]
+        assert trace.counts == {COUNT_RECORDS: 5}
+
+    def test_trace_is_followed_into_executor_threads(self):
+        def work(_):
+            with span('outbound'):
+                count('calls')
+
+        with trace_query() as trace:
+            with ThreadPoolExecutor(2) as executor:
+                list(executor.map(in_current_trace(work), range(4)))
+
+        assert trace.counts == {'calls': 4}
+        assert sum(1 for stage, _, _ in trace.spans if stage == 'outbound') == 4
+
+    def test_outbound_requests_are_counted(self):
+        session = ServiceSession(timeout=1, service='psev')
+        session.send = Mock()
+        with trace_query() as trace:
+            session.get('http://localhost/concepts')
+        assert trace.counts == {'http_requests.psev': 1}
+
+    def test_log_entries(self):
+        with trace_query() as trace:
+            count(COUNT_RECORDS)
+        log_entries = trace.to_log_entries()
+        assert [log_entry.code for log_entry in log_entries] == ['StageTiming', 'QueryCounts']
+        assert log_entries[0].level == LogLevel.DEBUG
+        assert log_entries[1].message == 'records=1'
+
+
+class TestMetricsRegistry():
+    def test_render(self):
+        metrics = MetricsRegistry(buckets=(0.1, 1))
+        metrics.observe_stage(STAGE_CYPHER, 0.5)
+        metrics.observe_stage(STAGE_CYPHER, 2)
+        metrics.increment('queries', status=200)
+
+        rendered = metrics.render().splitlines()
+
+        assert 'improving_agent_stage_duration_seconds_bucket{stage="cypher",le="0.1"} 0' in rendered
+        assert 'improving_agent_stage_duration_seconds_bucket{stage="cypher",le="1"} 1' in rendered
+        assert 'improving_agent_stage_duration_seconds_bucket{stage="cypher",le="+Inf"} 2' in rendered
+        assert 'improving_agent_stage_duration_seconds_sum{stage="cypher"} 2.5' in rendered
+        assert 'improving_agent_stage_duration_seconds_count{stage="cypher"} 2' in rendered
+        assert 'improving_agent_queries_total{status="200"} 1' in rendered
@@ -0,0 +1,55 @@
+"""This module provides tests for the slotted knowledge graph models"""
+import copy
+import pickle
+
+import pytest
+
+from improving_agent import models
+
+
+def _make_edge():
+    return models.Edge(
+        subject='DOID:9352',
+        object='NCBIGene:3630',
+        predicate='biolink:genetically_associated_with',
+        attributes=[models.Attribute(
+            attribute_type_id='biolink:p_value',
+            value=0.01,
+            attributes=[models.Attribute(attribute_type_id='biolink:publications', value=['PMID:1'])],
+        )],
+        sources=[models.RetrievalSource(resource_id='infores:spoke', resource_role='primary_knowledge_source')],
+    )
+
+
+class TestSlottedModels():
+    @pytest.mark.parametrize('model', [models.Node, models.Edge, models.Attribute, models.RetrievalSource])
+    def test_instances_share_type_maps(self, model):
+        instance = model()
+        assert not hasattr(instance, '__dict__')
+        assert instance.openapi_types is model().openapi_types
+        with pytest.raises(AttributeError):
+            instance.unexpected = 'value'
+
+    def test_equality_and_copies(self):
+        edge = _make_edge()
+        assert edge == _make_edge()
+        assert edge == copy.deepcopy(edge)
+        assert edge == pickle.loads(pickle.dumps(edge))
+        other = _make_edge()
+        other.attributes[0].value = 0.02
+        assert edge != other
+        assert edge != models.Node()
+
+    def test_from_dict_round_trip(self):
+        edge = models.Edge(
+            subject='DOID:9352',
+            object='NCBIGene:3630',
+            predicate='biolink:genetically_associated_with',
+            sources=[models.RetrievalSource(
+                resource_id='infores:spoke',
+                resource_role='aggregator_knowledge_source',
+                upstream_resource_ids=['infores:a'],
+            )],
+        )
+        assert models.Edge.from_dict(edge.to_dict()) == edge
+        assert models.Attribute.openapi_types['attributes'].__args__ == (models.Attribute,)
@@ -1,10 +1,17 @@
 """This module provides tests for the SriNodeNormalizer client"""
+import json
 import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import Mock, patch
 
 import pytest
 from requests.exceptions import HTTPError
 
+from improving_agent.src.caching import LruTtlCache
+from improving_agent.src.normalization import SearchNode
+from improving_agent.src.normalization.node_normalization import normalize_spoke_nodes_for_translator
 from improving_agent.src.normalization.sri_node_normalizer import SriNodeNormalizer
 from improving_agent.test.test_config import RUN_REAL_API
 from improving_agent.test.client_test_data.node_normalization_data import (
@@ -164,3 +171,80 @@ class TestSriNodeNormalizerReal():
         # unpacking happens inside the function, so the call should fail
         # if the structure of the data changes
         assert all([isinstance(semantic_type, str) for semantic_type in response])
+
+
+class TestSriNodeNormalizerCache():
+    def test_cached_curies_are_not_searched(self):
+        session = Mock()
+        mock_post = session.post
+        mock_post.return_value = Mock(status_code=200)
+        mock_post.return_value.json.return_value = {'NCIT:C00000': None, **NORMALIZED_WATER_NODE}
+
+        nn = SriNodeNormalizer(LruTtlCache(negative_ttl=3600), session=session)
+        nn.get_normalized_nodes(['MESH:D014867', 'NCIT:C00000'])
+        response = nn.get_normalized_nodes(['MESH:D014867', 'NCIT:C00000'])
+
+        assert mock_post.call_count == 1
+        assert response == NORMALIZED_WATER_NODE
+
+
+STUB_SRI_DELAY = 0.2
+
+
+class _StubSriHandler(BaseHTTPRequestHandler):
+    """Answers get_normalized_nodes after a fixed delay, normalizing
+    every curie to itself with an 'SRI:' prefix"""
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        time.sleep(STUB_SRI_DELAY)
+        response = json.dumps({
+            curie: {'id': {'identifier': f'SRI:{curie}'}} for curie in body['curies']
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestConcurrentNormalization():
+    @classmethod
+    def setup_class(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _StubSriHandler)
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.server_thread.start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}/'
+
+    @classmethod
+    def teardown_class(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def _normalize(self, n_chunks, chunk_size=10):
+        search_nodes = [
+            SearchNode('biolink:Disease', f'DOID:{i}') for i in range(n_chunks * chunk_size)
+        ]
+        normalizer = SriNodeNormalizer(base_url=self.base_url)
+        module = 'improving_agent.src.normalization.node_normalization'
+        with patch(f'{module}.SRI_NODE_NORMALIZER', normalizer), \
+                patch(f'{module}.SRI_NN_CHUNK_SIZE', chunk_size):
+            start = time.perf_counter()
+            result_map = normalize_spoke_nodes_for_translator(search_nodes)
+            elapsed = time.perf_counter() - start
+        return result_map, elapsed
+
+    def test_chunks_are_merged(self):
+        result_map, _ = self._normalize(n_chunks=3)
+        assert len(result_map) == 30
+        assert result_map['DOID:29'] == 'SRI:DOID:29'
+
+    def test_wall_clock_scales_with_concurrency(self):
+        # 4 chunks with 4 concurrent requests should take about as long
+        # as a single chunk, rather than 4x as long
+        _, elapsed_one = self._normalize(n_chunks=1)
+        _, elapsed_four = self._normalize(n_chunks=4)
+        assert elapsed_four < 4 * STUB_SRI_DELAY * 0.75
+        assert elapsed_four < elapsed_one * 2.5
@@ -0,0 +1,384 @@
+"""This module provides tests for the bidirectional pathfinder search"""
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+from neo4j.graph import Graph
+from werkzeug.exceptions import BadRequest
+
+from improving_agent.models import QNode, QueryGraph
+from improving_agent.src.caching import LruTtlCache, SqliteCache
+from improving_agent.src.template_queries import pathfinder
+from improving_agent.src.template_queries.node_degrees import NodeDegrees
+from improving_agent.src.template_queries.path_cursors import PathCursorStore
+from improving_agent.src.template_queries.path_search import (
+    FoundPath,
+    Neo4jPathGraph,
+    PathNode,
+    PathSearch,
+    _join_frontiers,
+    search_paths,
+)
+
+
+class InMemoryGraph:
+    """Expands nodes of a small undirected multigraph given as
+    {rel id: (node id, type, node id)} and {node id: PathNode}"""
+    def __init__(self, nodes, relationships):
+        self.nodes = nodes
+        self.relationships = relationships
+        self.expansions = []
+
+    def expand(self, node_ids, undesired_edges, targets=None):
+        self.expansions.append((list(node_ids), targets))
+        rows = []
+        for rel_id, (a, rel_type, b) in self.relationships.items():
+            if rel_type in undesired_edges:
+                continue
+            for node_id, neighbor_id in ((a, b), (b, a)):
+                if node_id in node_ids and (targets is None or neighbor_id in targets):
+                    rows.append((node_id, rel_id, self.nodes[neighbor_id]))
+        return rows
+
+
+def _make_graph(labels, relationships):
+    nodes = {
+        node_id: PathNode(node_id, (label,), f'id:{node_id}')
+        for node_id, label in labels.items()
+    }
+    return InMemoryGraph(nodes, relationships)
+
+
+def _search(graph, start=0, end=9, **kwargs):
+    return search_paths(graph, [graph.nodes[start]], [graph.nodes[end]], ['EXCLUDED'], **kwargs)
+
+
+class TestSearchPaths():
+    def test_finds_shortest_paths_first(self):
+        # 0 - 1 - 9 and 0 - 2 - 3 - 9
+        graph = _make_graph(
+            {0: 'Disease', 1: 'Gene', 2: 'Gene', 3: 'Compound', 9: 'Disease'},
+            {10: (0, 'A', 1), 11: (1, 'A', 9), 12: (0, 'A', 2), 13: (2, 'A', 3), 14: (3, 'A', 9)},
+        )
+        assert _search(graph) == [((0, 1, 9), (10, 11))]
+
+    def test_excluded_edges_are_not_traversed(self):
+        graph = _make_graph(
+            {0: 'Disease', 1: 'Gene', 2: 'Gene', 3: 'Compound', 9: 'Disease'},
+            {10: (0, 'A', 1), 11: (1, 'EXCLUDED', 9), 12: (0, 'A', 2), 13: (2, 'A', 3), 14: (3, 'A', 9)},
+        )
+        assert _search(graph) == [((0, 2, 3, 9), (12, 13, 14))]
+
+    def test_intermediate_constraints_include_path_ends(self):
+        graph = _make_graph(
+            {0: 'Disease', 1: 'Gene', 2: 'Gene', 3: 'Compound', 9: 'Disease'},
+            {10: (0, 'A', 1), 11: (1, 'A', 9), 12: (0, 'A', 2), 13: (2, 'A', 3), 14: (3, 'A', 9)},
+        )
+        assert _search(graph, intermediate_labels=['Compound']) == [((0, 2, 3, 9), (12, 13, 14))]
+        assert _search(graph, intermediate_labels=['Disease']) == [((0, 1, 9), (10, 11))]
+        assert _search(graph, intermediate_ids=['id:2']) == [((0, 2, 3, 9), (12, 13, 14))]
+        assert _search(graph, intermediate_labels=['Gene'], intermediate_ids=['id:3']) == [
+            ((0, 2, 3, 9), (12, 13, 14))
+        ]
+        assert _search(graph, intermediate_labels=['Anatomy']) == []
+
+    def test_relationships_are_unique_per_path(self):
+        # the only 2-hop walk from 0 to 9 reuses relationship 10
+        graph = _make_graph({0: 'Disease', 1: 'Gene', 9: 'Gene'}, {10: (0, 'A', 9), 11: (9, 'A', 1)})
+        assert _search(graph, max_hops=2) == []
+        assert _search(graph, max_hops=3) == []
+
+    def test_last_hop_is_restricted_to_the_other_side(self):
+        graph = _make_graph(
+            {0: 'Disease', 1: 'Gene', 2: 'Gene', 9: 'Disease'},
+            {10: (0, 'A', 1), 11: (1, 'A', 9), 12: (0, 'A', 2)},
+        )
+        assert _search(graph, max_hops=2, batch_size=1) == [((0, 1, 9), (10, 11))]
+        # one side was expanded in full, the other only towards it
+        assert graph.expansions == [([0], None), ([9], [1, 2])]
+
+    def test_limit(self):
+        graph = _make_graph(
+            {0: 'Disease', 1: 'Gene', 2: 'Gene', 3: 'Gene', 9: 'Disease'},
+            {10: (0, 'A', 1), 11: (1, 'A', 9), 12: (0, 'A', 2), 13: (2, 'A', 9), 14: (0, 'A', 3), 15: (3, 'A', 9)},
+        )
+        assert len(_search(graph)) == 3
+        assert len(_search(graph, limit=2)) == 2
+
+
+class TestHubPruning():
+    @staticmethod
+    def _make_hub_graph():
+        # 0 - 1 - 9 through a hub, and 0 - 2 - 9, 0 - 3 - 9 otherwise
+        return _make_graph(
+            {0: 'Disease', 1: 'Gene', 2: 'Gene', 3: 'Gene', 4: 'Gene', 9: 'Disease'},
+            {
+                10: (0, 'A', 1), 11: (1, 'A', 9), 12: (0, 'A', 2), 13: (2, 'A', 9),
+                14: (0, 'A', 3), 15: (3, 'A', 9), 16: (0, 'A', 4),
+            },
+        )
+
+    def test_hubs_are_not_traversed(self):
+        graph = self._make_hub_graph()
+        node_degrees = NodeDegrees({'Gene': {'id:1': 5000, 'id:2': 200}}, min_degree=100)
+        paths = _search(graph, node_degrees=node_degrees, max_node_degree=1000)
+        assert sorted(paths) == [((0, 2, 9), (12, 13)), ((0, 3, 9), (14, 15))]
+
+    def test_path_ends_are_never_pruned(self):
+        graph = self._make_hub_graph()
+        node_degrees = NodeDegrees({'Disease': {'id:0': 5000, 'id:9': 5000}}, min_degree=100)
+        assert len(_search(graph, node_degrees=node_degrees, max_node_degree=1000)) == 3
+
+    def test_fan_out_keeps_lowest_degree_neighbors(self):
+        graph = self._make_hub_graph()
+        node_degrees = NodeDegrees({'Gene': {'id:1': 5000, 'id:2': 200, 'id:4': 150}}, min_degree=100)
+        paths = _search(graph, max_hops=3, node_degrees=node_degrees, max_fan_out=2)
+        # 0 expands to its two lowest-degree neighbors, 3 and 4
+        assert paths == [((0, 3, 9), (14, 15))]
+
+    def test_node_degrees_round_trip(self, tmp_path):
+        path = str(tmp_path / 'degrees.json')
+        NodeDegrees({'Gene': {'3630': 250}}, min_degree=100, spoke_version='v5').write(path)
+        node_degrees = NodeDegrees.from_file(path)
+        assert node_degrees.get_degree(PathNode(1, ('Gene',), 3630)) == 250
+        assert node_degrees.get_degree(PathNode(2, ('Gene',), 1)) == 0
+        assert NodeDegrees.from_file(str(tmp_path / 'missing.json')) is None
+
+
+class TestExpansionLimits():
+    def test_requests_can_lower_but_not_raise_limits(self):
+        assert pathfinder._get_request_limit('max_fan_out', None, 500) == 500
+        assert pathfinder._get_request_limit('max_fan_out', '50', 500) == 50
+        assert pathfinder._get_request_limit('max_fan_out', '5000', 500) == 500
+        assert pathfinder._get_request_limit('max_fan_out', '5000', 0) == 5000
+        assert pathfinder._get_request_limit('max_fan_out', None, 0) is None
+        for value in ('0', '-1', 'many'):
+            with pytest.raises(BadRequest):
+                pathfinder._get_request_limit('max_fan_out', value, 500)
+
+    def test_configured_fan_out_requires_node_degrees(self):
+        node_degrees = NodeDegrees({'Gene': {'3630': 250}}, min_degree=100, spoke_version='v5')
+        with patch.object(pathfinder, 'PATHFINDER_MAX_FAN_OUT', 500):
+            with patch.object(pathfinder, 'PATHFINDER_NODE_DEGREES', None):
+                assert pathfinder._get_configured_fan_out() == 0
+            with patch.object(pathfinder, 'PATHFINDER_NODE_DEGREES', node_degrees):
+                assert pathfinder._get_configured_fan_out() == 500
+
+
+class TestPathSearchPages():
+    def test_resumed_search_continues_without_repeating_hops(self):
+        # three 2-hop paths, 0 - g - 9, and one of 3 hops, 0 - 4 - 5 - 9
+        graph = _make_graph(
+            {0: 'Disease', 1: 'Gene', 2: 'Gene', 3: 'Gene', 4: 'Gene', 5: 'Compound', 9: 'Disease'},
+            {
+                10: (0, 'A', 1), 11: (1, 'A', 9), 12: (0, 'A', 2), 13: (2, 'A', 9),
+                14: (0, 'A', 3), 15: (3, 'A', 9), 16: (0, 'A', 4), 17: (4, 'A', 5), 18: (5, 'A', 9),
+            },
+        )
+        search = PathSearch([graph.nodes[0]], [graph.nodes[9]], ['EXCLUDED'], max_hops=3)
+        pages = []
+        while not search.exhausted:
+            pages.append(search.next_paths(graph, 2))
+            # as saved between the requests for each page
+            search = PathSearch.from_dict(json.loads(json.dumps(search.to_dict())))
+
+        # each hop was expanded once
+        assert len(graph.expansions) == 3
+        assert [len(page) for page in pages] == [2, 1, 1]
+        assert {path for page in pages[:2] for path in page} == set(_search(graph, max_hops=2))
+        assert pages[2] == [((0, 4, 5, 9), (16, 17, 18))]
+
+    def test_joins_continue_from_the_last_page(self):
+        # 0 - g - 9 through genes 1 to 3, with two relationships to 1
+        graph = _make_graph(
+            {0: 'Disease', 1: 'Gene', 2: 'Gene', 3: 'Gene', 9: 'Disease'},
+            {
+                10: (0, 'A', 1), 11: (0, 'B', 1), 12: (1, 'A', 9),
+                13: (0, 'A', 2), 14: (2, 'A', 9), 15: (0, 'A', 3), 16: (3, 'A', 9),
+            },
+        )
+        search = PathSearch([graph.nodes[0]], [graph.nodes[9]], ['EXCLUDED'], max_hops=2)
+        search._expand(graph)
+        search._expand(graph)
+        forward, backward = search.forward, search.backward
+        all_paths, position = _join_frontiers(forward, backward, search.constraints, 10)
+        assert len(all_paths) == 4
+        assert position is None
+
+        pages, position = [], None
+        while True:
+            page, position = _join_frontiers(forward, backward, search.constraints, 1, position)
+            pages.extend(page)
+            if position is None:
+                break
+        assert pages == all_paths
+
+        # the last page only walks back from the last gene
+        _, position = _join_frontiers(forward, backward, search.constraints, 3)
+        with patch.object(forward, 'get_walks', wraps=forward.get_walks) as get_walks:
+            page, position = _join_frontiers(forward, backward, search.constraints, 3, position)
+        assert page == all_paths[3:]
+        assert position is None
+        walked = [call.args[0][0] for call in get_walks.call_args_list if len(call.args) == 1]
+        assert walked == [3]
+
+
+def _make_disease_gene_paths():
+    hydrator = Graph.Hydrator(Graph())
+    nodes = {
+        0: hydrator.hydrate_node(0, ['Disease'], {'identifier': 'DOID:1', 'name': 'a'}),
+        9: hydrator.hydrate_node(9, ['Disease'], {'identifier': 'DOID:2', 'name': 'b'}),
+    }
+    relationships = {}
+    for gene in (1, 2, 3):
+        nodes[gene] = hydrator.hydrate_node(gene, ['Gene'], {'identifier': gene, 'name': f'gene {gene}'})
+        for rel_id, disease in ((10 * gene, 0), (10 * gene + 1, 9)):
+            relationships[rel_id] = hydrator.hydrate_relationship(
+                rel_id, disease, gene, 'ASSOCIATES_DaG', {'sources': ['DISEASES']}
+            )
+    return nodes, relationships
+
+
+class FakePathGraph:
+    """Stands in for Neo4jPathGraph with 2-hop paths from a Disease,
+    0, to another, 9, through genes 1 to 3"""
+    nodes, relationships = _make_disease_gene_paths()
+
+    def __init__(self, session):
+        pass
+
+    def _get_path_node(self, node_id):
+        node = self.nodes[node_id]
+        return PathNode(node_id, tuple(node.labels), node['identifier'])
+
+    def get_nodes(self, name, filter_clause, parameters):
+        return [self._get_path_node(0 if name == 'start' else 9)]
+
+    def expand(self, node_ids, undesired_edges, targets=None):
+        rows = []
+        for rel_id, rel in self.relationships.items():
+            for node, neighbor in ((rel.start_node, rel.end_node), (rel.end_node, rel.start_node)):
+                if node.id in node_ids and (targets is None or neighbor.id in targets):
+                    rows.append((node.id, rel_id, self._get_path_node(neighbor.id)))
+        return rows
+
+    def get_paths(self, paths):
+        return [
+            FoundPath([self.nodes[i] for i in node_ids], [self.relationships[i] for i in rel_ids])
+            for node_ids, rel_ids in paths
+        ]
+
+
+class TestPagedPathfinder():
+    @staticmethod
+    def _get_query_config(start_curie, end_curie, *args):
+        qnodes = {}
+        for name, curie in (('start', start_curie), ('end', end_curie)):
+            qnode = QNode(ids=[curie], categories=['biolink:Disease'])
+            setattr(qnode, 'spoke_identifiers', {curie: curie})
+            setattr(qnode, 'spoke_labels', ['Disease'])
+            qnodes[name] = qnode
+        config = pathfinder.PathfinderConfig(qnodes['start'], qnodes['end'], pathfinder.DEFAULT_EXCLUDE_EDGES)
+        return QueryGraph(nodes=qnodes, edges={}), config
+
+    def test_pages_normalize_only_new_nodes(self):
+        normalized_searches = []
+
+        def normalize_spoke_nodes(search_nodes):
+            normalized_searches.append({search_node.curie for search_node in search_nodes})
+            return {search_node.curie: f'N:{search_node.curie}' for search_node in search_nodes}
+
+        with patch.object(pathfinder, '_get_query_config', self._get_query_config), \
+                patch.object(pathfinder, 'Neo4jPathGraph', FakePathGraph), \
+                patch.object(pathfinder, 'normalize_spoke_nodes_for_translator', normalize_spoke_nodes), \
+                patch.object(pathfinder, 'PATH_CURSOR_STORE', PathCursorStore(LruTtlCache())):
+            response, code, cursor = pathfinder.try_pathfinder(
+                None, 'DOID:1', 'DOID:2', [], [], page_size='2',
+            )
+            assert code == 200
+            assert len(response.message.results) == 2
+            assert cursor
+
+            next_response, code, _ = pathfinder.try_pathfinder(None, 'DOID:1', 'DOID:2', [], [], cursor=cursor)
+            assert code == 200
+            assert len(next_response.message.results) == 1
+            # only the new gene was normalized, but the page's knowledge
+            # graph has all of its nodes
+            assert len(normalized_searches) == 2
+            new_gene, = normalized_searches[1]
+            assert set(next_response.message.knowledge_graph['nodes']) == {
+                'N:DOID:1', 'N:DOID:2', f'N:{new_gene}'
+            }
+
+            response, code, _ = pathfinder.try_pathfinder(None, 'DOID:9', 'DOID:2', [], [], cursor=cursor)
+            assert code == 400
+            response, code, _ = pathfinder.try_pathfinder(None, 'DOID:1', 'DOID:2', [], [], cursor='expired')
+            assert code == 400
+
+        assert normalized_searches[0] | normalized_searches[1] == {'DOID:1', 'DOID:2', 1, 2, 3}
+
+    def test_cursor_store_keeps_the_latest_states(self, tmp_path):
+        disk_cache = SqliteCache(str(tmp_path / 'cursors.sqlite3'), ttl=60, max_rows=2, purge_interval=0)
+        store = PathCursorStore(LruTtlCache(max_size=1), disk_cache)
+        cursors = [store.save({'page': page}) for page in range(4)]
+        assert store.load(cursors[0]) is None
+        assert store.load(cursors[1]) is None
+        assert store.load(cursors[2]) == {'page': 2}
+        assert store.load(cursors[3]) == {'page': 3}
+
+
+class TestConsumeResults():
+    def test_shared_nodes_and_relationships_are_decoded_once(self):
+        paths = FakePathGraph(None).get_paths([
+            ((0, gene, 9), (10 * gene, 10 * gene + 1)) for gene in (1, 2, 3, 1)
+        ])
+        make_result_node = MagicMock(wraps=pathfinder.make_result_node)
+        make_result_edge = MagicMock(wraps=pathfinder.make_result_edge)
+        with patch.object(pathfinder, 'make_result_node', make_result_node), \
+                patch.object(pathfinder, 'make_result_edge', make_result_edge), \
+                patch.object(
+                    pathfinder,
+                    'normalize_spoke_nodes_for_translator',
+                    lambda search_nodes: {search_node.curie: f'N:{search_node.curie}' for search_node in search_nodes},
+                ):
+            knowledge_graph, results, aux_graphs, _ = pathfinder._consume_results(paths, {'DOID:2': 'DOID:2'})
+
+        assert make_result_node.call_count == 5
+        assert make_result_edge.call_count == 6
+        assert set(knowledge_graph['nodes']) == {'N:DOID:1', 'DOID:2', 'N:1', 'N:2', 'N:3'}
+        assert len(results) == len(aux_graphs) == 4
+        for result, path in zip(results, paths):
+            start, = result.node_bindings['start']
+            end, = result.node_bindings['end']
+            assert (start.id, start.query_id) == ('N:DOID:1', 'DOID:1')
+            assert (end.id, end.query_id) == ('DOID:2', None)
+            edge_binding, = result.analyses[0].edge_bindings['path']
+            related_to = knowledge_graph['edges'][edge_binding.id]
+            aux_graph_id, = related_to.attributes[0].value
+            assert aux_graphs[aux_graph_id].edges == [str(rel.id) for rel in path.relationships]
+            assert all(edge_id in knowledge_graph['edges'] for edge_id in aux_graphs[aux_graph_id].edges)
+
+
+class TestNeo4jPathGraph():
+    def test_get_paths_orders_nodes_from_the_start(self):
+        hydrator = Graph.Hydrator(Graph())
+        start = hydrator.hydrate_node(0, ['Disease'], {'identifier': 'DOID:9352'})
+        middle = hydrator.hydrate_node(1, ['Gene'], {'identifier': 3630})
+        end = hydrator.hydrate_node(9, ['Compound'], {'identifier': 'CHEMBL1431'})
+        records = [
+            MagicMock(**{'values.return_value': values})
+            for values in (
+                (middle, hydrator.hydrate_relationship(10, 1, 0, 'ASSOCIATES_DaG', {}), start),
+                (end, hydrator.hydrate_relationship(11, 9, 1, 'UPREGULATES_CuG', {}), middle),
+            )
+        ]
+        session = MagicMock()
+        session.read_transaction.side_effect = lambda fn, *args: fn(
+            MagicMock(**{'run.return_value': iter(records)}), *args
+        )
+
+        paths = Neo4jPathGraph(session).get_paths([((0, 1, 9), (10, 11))])
+        assert len(paths) == 1
+        assert isinstance(paths[0], FoundPath)
+        assert [node.id for node in paths[0].nodes] == [0, 1, 9]
+        assert [rel.id for rel in paths[0].relationships] == [10, 11]
@@ -0,0 +1,143 @@
+"""This module provides tests for the PSEV client"""
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+import requests
+
+from improving_agent.src.psev import PSEV_SCORE_CACHE, get_psev_scores
+from improving_agent.src.psev.cache import PsevScoreCache
+from improving_agent.src.psev.psev_client import PsevClient
+
+
+class _StubPsevSession:
+    """Serves `n_pages` pages of one score per concept after `delay`
+    seconds, recording the peak number of concurrent requests"""
+    def __init__(self, n_pages=1, delay=0.05, missing_concepts=()):
+        self.n_pages = n_pages
+        self.delay = delay
+        self.missing_concepts = missing_concepts
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+    def post(self, url, headers, params, json):
+        concept = url.rsplit('/', 1)[-1]
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+
+        response = Mock()
+        if concept in self.missing_concepts:
+            response.status_code = 404
+            response.raise_for_status.side_effect = requests.exceptions.HTTPError('Not found')
+            return response
+        page = params['page']
+        response.json.return_value = {
+            concept: {f'node_{page}': float(page)},
+            'more_available': page < self.n_pages - 1,
+        }
+        return response
+
+
+class TestPsevClient():
+    def test_pages_are_collected(self):
+        session = _StubPsevSession(n_pages=3)
+        client = PsevClient('key', 'http://psev', session=session)
+
+        scores = client.get_psev_scores(['DOID:9352'], node_type='Compound')
+
+        assert scores == {'DOID:9352': {'node_0': 0.0, 'node_1': 1.0, 'node_2': 2.0}}
+
+    def test_concepts_are_fetched_concurrently(self):
+        session = _StubPsevSession(delay=0.1, missing_concepts=['DOID:0'])
+        client = PsevClient('key', 'http://psev', session=session)
+        concepts = ['DOID:0', 'DOID:1', 'DOID:2', 'DOID:3']
+
+        start = time.perf_counter()
+        scores = client.get_psev_scores(concepts, node_type='Compound')
+        elapsed = time.perf_counter() - start
+
+        assert list(scores) == concepts
+        assert scores['DOID:0'] == {}
+        assert scores['DOID:3'] == {'node_0': 0.0}
+        assert session.peak_in_flight > 1
+        assert elapsed < len(concepts) * session.delay
+
+
+class TestPsevScoreCache():
+    def test_identifier_scores(self):
+        cache = PsevScoreCache()
+        cache.set_identifier_scores({'DOID:1': {'a': 0.5, 'b': 0.25}})
+
+        cached, missing = cache.get_identifier_scores(['DOID:1', 'DOID:2'], ['a', 'c'])
+
+        assert cached == {'DOID:1': {'a': 0.5}, 'DOID:2': {}}
+        assert missing == {'DOID:1': ['c'], 'DOID:2': ['a', 'c']}
+        assert cache.get_hit_rates()['identifier'] == 0.25
+
+    def test_identifiers_without_scores_are_cached_as_absent(self):
+        cache = PsevScoreCache(negative_ttl=10)
+        with patch('improving_agent.src.psev.cache.time.monotonic', return_value=100):
+            cache.set_identifier_scores({'DOID:1': {'a': 0.5}}, {'DOID:1': ['a', 'b'], 'DOID:2': ['a']})
+        with patch('improving_agent.src.psev.cache.time.monotonic', return_value=105):
+            assert cache.get_identifier_scores(['DOID:1', 'DOID:2'], ['a', 'b']) == (
+                {'DOID:1': {'a': 0.5}, 'DOID:2': {}}, {'DOID:2': ['b']}
+            )
+        with patch('improving_agent.src.psev.cache.time.monotonic', return_value=111):
+            assert cache.get_identifier_scores(['DOID:1'], ['a', 'b'])[1] == {'DOID:1': ['b']}
+        # the expired absent identifier of DOID:2 is only dropped when looked up
+        assert cache.n_scores == 2
+
+    def test_lru_eviction_by_score_count(self):
+        cache = PsevScoreCache(max_scores=3)
+        cache.set_concept_vector('DOID:1', 'Compound', {'a': 0.5, 'b': 0.25})
+        cache.set_identifier_scores({'DOID:2': {'a': 0.5}})
+        cache.get_concept_vector('DOID:1', 'Compound')
+        cache.set_identifier_scores({'DOID:3': {'a': 0.5}})
+
+        assert cache.get_concept_vector('DOID:1', 'Compound') == {'a': 0.5, 'b': 0.25}
+        assert cache.get_identifier_scores(['DOID:2'], ['a'])[1] == {'DOID:2': ['a']}
+        assert cache.n_scores == 3
+
+    def test_ttl(self):
+        cache = PsevScoreCache(ttl=10)
+        with patch('improving_agent.src.psev.cache.time.monotonic', return_value=100):
+            cache.set_concept_vector('DOID:1', 'Compound', {'a': 0.5})
+        with patch('improving_agent.src.psev.cache.time.monotonic', return_value=111):
+            assert cache.get_concept_vector('DOID:1', 'Compound') is None
+        assert cache.n_scores == 0
+
+
+class TestGetPsevScoresCaching():
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        PSEV_SCORE_CACHE.clear()
+        yield
+        PSEV_SCORE_CACHE.clear()
+
+    @patch('improving_agent.src.psev.PsevClient')
+    def test_only_missing_identifiers_are_fetched(self, mock_client_class):
+        mock_client = mock_client_class.return_value
+        mock_client.get_psev_scores.side_effect = lambda concepts, ids, node_type: {
+            concept: {i: 0.5 for i in ids} for concept in concepts
+        }
+
+        get_psev_scores(['DOID:1'], ['CHEMBL1', 2])
+        scores = get_psev_scores(['DOID:1'], ['CHEMBL1', 2, 3])
+
+        assert mock_client.get_psev_scores.call_args_list[1].args == (['DOID:1'], ['3'], None)
+        assert scores == {'DOID:1': {'CHEMBL1': 0.5, 2: 0.5, 3: 0.5}}
+
+    @patch('improving_agent.src.psev.PsevClient')
+    def test_identifiers_without_scores_score_0_and_are_not_fetched_again(self, mock_client_class):
+        mock_client = mock_client_class.return_value
+        mock_client.get_psev_scores.return_value = {'DOID:1': {'CHEMBL1': 0.5}}
+
+        assert get_psev_scores(['DOID:1'], ['CHEMBL1', 2]) == {'DOID:1': {'CHEMBL1': 0.5, 2: 0.0}}
+        assert get_psev_scores(['DOID:1'], ['CHEMBL1', 2]) == {'DOID:1': {'CHEMBL1': 0.5, 2: 0.0}}
+        assert mock_client.get_psev_scores.call_count == 1
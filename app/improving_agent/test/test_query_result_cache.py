@@ -0,0 +1,91 @@
+"""This module provides tests for the query result cache"""
+from improving_agent.models import Message, QEdge, QNode, Result
+from improving_agent.src.caching import LruTtlCache, SqliteCache
+from improving_agent.src.query_result_cache import QueryResultCache, make_query_fingerprint
+
+
+def _make_query_graph(ids, predicates, spoke_identifiers):
+    qnode = QNode(ids=ids, categories=['biolink:Disease'], constraints=[])
+    setattr(qnode, 'spoke_labels', ['Disease'])
+    setattr(qnode, 'spoke_identifiers', spoke_identifiers)
+    gene_qnode = QNode(categories=['biolink:Gene'], constraints=[])
+    setattr(gene_qnode, 'spoke_labels', ['Gene'])
+    setattr(gene_qnode, 'spoke_identifiers', {})
+    qedge = QEdge(subject='n0', object='n1', predicates=predicates, attribute_constraints=[])
+    setattr(qedge, 'spoke_edge_types', {'ASSOCIATES_DaG'})
+    return {'n0': qnode, 'n1': gene_qnode}, {'e0': qedge}
+
+
+class TestQueryFingerprint():
+    def test_equal_for_reordered_sets(self):
+        qnodes_1, qedges_1 = _make_query_graph(
+            ['DOID:9352', 'DOID:1612'],
+            ['biolink:related_to', 'biolink:genetically_associated_with'],
+            {"'DOID:9352'": 'DOID:9352', "'DOID:1612'": 'DOID:1612'},
+        )
+        qnodes_2, qedges_2 = _make_query_graph(
+            ['DOID:1612', 'DOID:9352'],
+            ['biolink:genetically_associated_with', 'biolink:related_to'],
+            {"'DOID:1612'": 'DOID:1612', "'DOID:9352'": 'DOID:9352'},
+        )
+        assert (
+            make_query_fingerprint(qnodes_1, qedges_1, 100, None, None)
+            == make_query_fingerprint(qnodes_2, qedges_2, 100, None, None)
+        )
+
+    def test_differs_for_options_and_namespace(self):
+        qnodes, qedges = _make_query_graph(['DOID:9352'], None, {"'DOID:9352'": 'DOID:9352'})
+        fingerprint = make_query_fingerprint(qnodes, qedges, 100, None, None)
+        assert fingerprint != make_query_fingerprint(qnodes, qedges, 200, None, None)
+        assert fingerprint != make_query_fingerprint(qnodes, qedges, 100, ['DOID:9352'], None)
+        assert fingerprint != make_query_fingerprint(qnodes, qedges, 100, None, True)
+        assert fingerprint != make_query_fingerprint(qnodes, qedges, 100, None, None, 'v2')
+
+    def test_differs_for_normalized_identifiers(self):
+        qnodes_1, qedges_1 = _make_query_graph(['DOID:9352'], None, {"'DOID:9352'": 'DOID:9352'})
+        qnodes_2, qedges_2 = _make_query_graph(['DOID:9352'], None, {})
+        assert (
+            make_query_fingerprint(qnodes_1, qedges_1, 100, None, None)
+            != make_query_fingerprint(qnodes_2, qedges_2, 100, None, None)
+        )
+
+    def test_differs_for_submitted_ids(self):
+        qnodes_1, qedges_1 = _make_query_graph(['MONDO:0005015'], None, {"'DOID:9352'": 'DOID:9352'})
+        qnodes_2, qedges_2 = _make_query_graph(['DOID:9352'], None, {"'DOID:9352'": 'DOID:9352'})
+        assert (
+            make_query_fingerprint(qnodes_1, qedges_1, 100, None, None)
+            != make_query_fingerprint(qnodes_2, qedges_2, 100, None, None)
+        )
+
+
+class TestQueryResultCache():
+    message = Message(results=[Result(node_bindings={'n0': []}, analyses=[])])
+
+    def test_memory_tier(self):
+        cache = QueryResultCache(LruTtlCache(max_size=2))
+        cache.set('key', self.message)
+        assert cache.get('key') == {'results': [{'node_bindings': {'n0': []}, 'analyses': []}]}
+        assert cache.get('missing') is None
+
+    def test_lookups_return_copies(self):
+        cache = QueryResultCache(LruTtlCache())
+        cache.set('key', self.message)
+        cache.get('key')['results'].append({})
+        assert len(cache.get('key')['results']) == 1
+
+    def test_disk_tier_is_shared(self, tmp_path):
+        path = str(tmp_path / 'query_results.sqlite3')
+        QueryResultCache(LruTtlCache(), SqliteCache(path, raw=True), 'v1').set('key', self.message)
+        cache = QueryResultCache(LruTtlCache(), SqliteCache(path, raw=True), 'v1')
+        assert cache.get('key') == {'results': [{'node_bindings': {'n0': []}, 'analyses': []}]}
+        # messages are serialized once, as JSON objects
+        assert SqliteCache(path).get_many(['key'])['key']['results'] == [
+            {'node_bindings': {'n0': []}, 'analyses': []}
+        ]
+
+    def test_disk_tier_is_invalidated_by_version(self, tmp_path):
+        path = str(tmp_path / 'query_results.sqlite3')
+        QueryResultCache(LruTtlCache(), SqliteCache(path, raw=True), 'v1').set('key', self.message)
+        cache = QueryResultCache(LruTtlCache(), SqliteCache(path, raw=True), 'v2')
+        assert cache.get('key') is None
+        assert SqliteCache(path, raw=True).get_many(['key']) == {}
@@ -0,0 +1,33 @@
+"""This module provides tests for request-level back-pressure"""
+import threading
+
+from improving_agent.src.request_limits import ConcurrencyLimiter, is_limited_path
+
+
+class TestConcurrencyLimiter():
+    def test_rejects_when_saturated(self):
+        limiter = ConcurrencyLimiter(2)
+        assert limiter.try_acquire()
+        assert limiter.try_acquire()
+        assert not limiter.try_acquire()
+        assert limiter.in_flight == 2
+        assert limiter.n_rejected == 1
+
+        limiter.release()
+        assert limiter.try_acquire()
+
+    def test_waits_for_a_slot(self):
+        limiter = ConcurrencyLimiter(1, acquire_timeout=5)
+        assert limiter.try_acquire()
+        threading.Timer(0.05, limiter.release).start()
+        assert limiter.try_acquire()
+        assert limiter.n_rejected == 0
+
+    def test_limited_paths(self):
+        assert is_limited_path('/api/v1.5/query')
+        assert is_limited_path('/api/batch-query')
+        assert is_limited_path('/api/paths/DOID:9352/CHEBI:6801')
+        assert is_limited_path('/text-search/diabetes')
+        assert not is_limited_path('/api/v1.5/asyncquery')
+        assert not is_limited_path('/api/v1.5/asyncquery_status/abc')
+        assert not is_limited_path('/api/hello')
@@ -0,0 +1,65 @@
+"""This module provides tests for result_handling"""
+from unittest.mock import Mock
+
+from improving_agent.src.biolink.spoke_biolink_constants import (
+    BIOLINK_SLOT_MAX_RESEARCH_PHASE,
+    PHASE_BL_CT_PHASE_ENUM_MAP,
+    SPOKE_BIOLINK_EDGE_ATTRIBUTE_MAPPINGS,
+)
+from improving_agent.src.result_handling import (
+    ATTRIBUTE_TRANSFORMERS,
+    SPOKE_GRAPH_TYPE_EDGE,
+    UNMAPPED_ATTRIBUTE_WARNINGS,
+    make_result_attribute,
+)
+from improving_agent.util import AggregatedWarningLogger
+
+
+def _find_edge_property(biolink_type):
+    for edge_type, properties in SPOKE_BIOLINK_EDGE_ATTRIBUTE_MAPPINGS.items():
+        for property_type, mapping in properties.items():
+            if mapping.biolink_type == biolink_type:
+                return edge_type, property_type
+
+
+class TestMakeResultAttribute():
+    def test_special_attribute_is_transformed(self):
+        edge_type, property_type = _find_edge_property(BIOLINK_SLOT_MAX_RESEARCH_PHASE)
+        phase, phase_enum = next(iter(PHASE_BL_CT_PHASE_ENUM_MAP.items()))
+        assert (SPOKE_GRAPH_TYPE_EDGE, edge_type, property_type) in ATTRIBUTE_TRANSFORMERS
+
+        attribute = make_result_attribute(property_type, phase, SPOKE_GRAPH_TYPE_EDGE, edge_type)
+
+        assert attribute.attribute_type_id == BIOLINK_SLOT_MAX_RESEARCH_PHASE
+        assert attribute.original_attribute_name == property_type
+        assert attribute.value == phase_enum
+
+    def test_unmapped_attribute_is_aggregated(self):
+        UNMAPPED_ATTRIBUTE_WARNINGS.flush()
+        for _ in range(3):
+            assert make_result_attribute('not_a_property', 1, SPOKE_GRAPH_TYPE_EDGE, 'NOT_AN_EDGE_TYPE') is None
+        assert sum(UNMAPPED_ATTRIBUTE_WARNINGS.counts.values()) == 3
+        UNMAPPED_ATTRIBUTE_WARNINGS.flush()
+
+
+class TestAggregatedWarningLogger():
+    def test_warnings_are_rate_limited(self):
+        logger = Mock()
+        warnings = AggregatedWarningLogger(logger, 'Missing', interval=3600)
+        for key in ['a', 'b', 'b', 'c']:
+            warnings.record(key)
+
+        logger.warning.assert_called_once_with('Missing: a (x1)')
+        warnings.flush()
+        assert logger.warning.call_args.args[0] == 'Missing: b (x2), c (x1)'
+
+    def test_held_back_warnings_are_logged_when_the_interval_elapses(self):
+        logger = Mock()
+        warnings = AggregatedWarningLogger(logger, 'Missing', interval=0.05)
+        warnings.record('a')
+        warnings.record('b')
+        logger.warning.assert_called_once_with('Missing: a (x1)')
+
+        warnings._timer.join()
+        assert logger.warning.call_args.args[0] == 'Missing: b (x1)'
+        assert warnings._timer is None
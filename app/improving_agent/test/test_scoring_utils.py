@@ -0,0 +1,44 @@
+"""This module provides tests for the scoring utilities"""
+import random
+
+from improving_agent import models
+from improving_agent.src.scoring.scoring_utils import (
+    rank_results,
+    top_k_indices,
+    top_k_items,
+)
+
+
+def _make_result(score):
+    return models.Result(node_bindings={}, analyses=[models.Analysis(score=score)])
+
+
+class TestTopK():
+    def test_top_k_indices(self):
+        assert top_k_indices([0.1, 0.5, 0.3, 0.9], 2).tolist() == [3, 1]
+
+    def test_top_k_indices_ties_keep_input_order(self):
+        scores = [0.2, 0.7, 0.7, 0.1, 0.7]
+        assert top_k_indices(scores, 2).tolist() == [1, 2]
+        assert top_k_indices(scores).tolist() == [1, 2, 4, 0, 3]
+
+    def test_top_k_indices_bounds(self):
+        assert top_k_indices([0.1, 0.5], 0).tolist() == []
+        assert top_k_indices([0.1, 0.5], 10).tolist() == [1, 0]
+        assert top_k_indices([], 3).tolist() == []
+
+    def test_top_k_matches_full_sort(self):
+        rng = random.Random(0)
+        scores = [rng.randint(0, 50) / 10 for _ in range(1000)]
+        expected = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:25]
+        assert top_k_indices(scores, 25).tolist() == expected
+
+    def test_rank_results(self):
+        results = [_make_result(score) for score in (0.2, None, 0.9, 0.2)]
+        ranked = rank_results(results, 3)
+        assert ranked == [results[2], results[0], results[3]]
+
+    def test_top_k_items(self):
+        scores = {'CHEMBL1': 1e-4, 'CHEMBL2': 3e-4, 'CHEMBL3': 2e-4}
+        top = top_k_items(scores, 2)
+        assert list(top.items()) == [('CHEMBL2', 3e-4), ('CHEMBL3', 2e-4)]
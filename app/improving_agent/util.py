@@ -1,6 +1,10 @@
+import atexit
 import datetime
 import logging
 import os
+import threading
+import time
+from collections import Counter
 
 import six
 
@@ -179,3 +183,49 @@ def create_file_handler(log_path):
     file_handler = logging.FileHandler(filename=log_path, mode="a")
     file_handler.setFormatter(formatter)
     return file_handler
+
+
+class AggregatedWarningLogger:
+    """Collects repeated warnings by key and logs them as a single
+    summary at most once every `interval` seconds, so that per-record
+    warnings in hot loops don't flood the log
+
+    Warnings held back by the interval are logged by a timer once it
+    has elapsed, and at exit, even if no further warnings are recorded
+    """
+    def __init__(self, logger, message, interval=60.0):
+        self.logger = logger
+        self.message = message
+        self.interval = interval
+        self.counts = Counter()
+        self._last_emitted = float('-inf')
+        self._timer = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def record(self, key):
+        """Counts an occurrence of `key` and emits the summary if the
+        interval has elapsed since the last one, or otherwise schedules
+        it for when the interval elapses"""
+        with self._lock:
+            self.counts[key] += 1
+            remaining = self.interval - (time.monotonic() - self._last_emitted)
+            if remaining > 0:
+                if self._timer is None:
+                    self._timer = threading.Timer(remaining, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+        self.flush()
+
+    def flush(self):
+        """Emits the summary of all keys recorded since the last one"""
+        with self._lock:
+            counts, self.counts = self.counts, Counter()
+            self._last_emitted = time.monotonic()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if counts:
+            summary = ', '.join(f'{key} (x{n})' for key, n in counts.most_common())
+            self.logger.warning(f'{self.message}: {summary}')
@@ -31,8 +31,8 @@ setup(
     url="",
     keywords=["OpenAPI", "imProving Agent"],
     install_requires=REQUIRES,
-    packages=find_packages(),
-    package_data={'': ['openapi/openapi.yaml']},
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
+    package_data={'': ['openapi/openapi.yaml', 'src/biolink/data/*.json']},
     include_package_data=True,
     entry_points={
         'console_scripts': ['improving_agent=improving_agent.__main__:main']},